@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Keystroke latency comparison between injection backends.
+
+Opens a small Tk window with an Entry as the injection target and times
+activate + inject for every backend. Meant to run under Xvfb:
+
+    xvfb-run -a python benchmarks/bench_backends.py
+    python benchmarks/bench_backends.py --keys 500 --json results.json
+
+If DISPLAY is unset and Xvfb is installed, a private Xvfb server is started.
+"""
+
+import argparse
+import json
+import shutil
+import time
+import tkinter as tk
+
+from bench_common import start_xvfb, summarize
+from injection import BACKENDS, InjectionError
+
+
+def bench_backend(backend, root, entry, target, keys):
+    """Time activate + type/key round trips into the target Entry"""
+    entry.delete(0, 'end')
+    root.update()
+    samples = []
+    for i in range(keys):
+        start = time.perf_counter()
+        backend.activate(target)
+        if i % 10 == 9:
+            backend.key('BackSpace')
+        else:
+            backend.type_text('a')
+        backend.sync()
+        samples.append(time.perf_counter() - start)
+        root.update()
+    # Let the last events drain before checking what arrived
+    for _ in range(20):
+        root.update()
+        time.sleep(0.005)
+    expected = keys - 2 * (keys // 10)
+    result = summarize(samples)
+    result['delivered'] = len(entry.get())
+    result['expected'] = expected
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--keys', type=int, default=200, help="keystrokes per backend")
+    parser.add_argument('--backend', action='append', choices=sorted(BACKENDS),
+                        help="backend to measure (repeatable, default: xtest and xdotool)")
+    parser.add_argument('--json', help="write results to this file")
+    args = parser.parse_args()
+
+    xvfb = start_xvfb()
+    try:
+        root = tk.Tk()
+        root.title("Injection Benchmark Target")
+        root.geometry("400x60+50+50")
+        entry = tk.Entry(root)
+        entry.pack(fill='both', expand=True)
+        root.update()
+        entry.focus_force()
+        root.update()
+        target = int(root.wm_frame(), 16)
+
+        results = {}
+        for name in args.backend or ['xtest', 'xdotool']:
+            if name == 'xdotool' and not shutil.which('xdotool'):
+                print(f"{name:8s} skipped: xdotool not installed")
+                continue
+            try:
+                backend = BACKENDS[name]()
+            except (InjectionError, OSError) as e:
+                print(f"{name:8s} skipped: {e}")
+                continue
+            try:
+                results[name] = bench_backend(backend, root, entry, target, args.keys)
+            finally:
+                backend.close()
+            r = results[name]
+            print(f"{name:8s} p50 {r['p50_ms']:8.3f} ms  p95 {r['p95_ms']:8.3f} ms  "
+                  f"p99 {r['p99_ms']:8.3f} ms  delivered {r['delivered']}/{r['expected']}")
+
+        if 'xtest' in results and 'xdotool' in results:
+            speedup = results['xdotool']['p50_ms'] / max(results['xtest']['p50_ms'], 1e-6)
+            print(f"xtest p50 speedup over xdotool: {speedup:.1f}x")
+
+        if args.json:
+            with open(args.json, 'w') as f:
+                json.dump(results, f, indent=2)
+        root.destroy()
+    finally:
+        if xvfb:
+            xvfb.terminate()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Shared helpers for the benchmark scripts: Xvfb startup, latency summaries,
+a recording xdotool stub and baseline comparison.
+"""
+
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+REPO_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+if REPO_DIR not in sys.path:
+    sys.path.insert(0, REPO_DIR)
+
+
+def start_xvfb(display=':97'):
+    """Start a private Xvfb server if no display is available"""
+    if os.environ.get('DISPLAY'):
+        return None
+    if not shutil.which('Xvfb'):
+        sys.exit("No DISPLAY and Xvfb not found. Run under xvfb-run or install xvfb.")
+    proc = subprocess.Popen(['Xvfb', display, '-screen', '0', '1280x800x24', '-nolisten', 'tcp'],
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    os.environ['DISPLAY'] = display
+    time.sleep(0.5)
+    return proc
+
+
+def summarize(samples):
+    """Latency summary in milliseconds for a list of durations in seconds"""
+    ms = sorted(s * 1000.0 for s in samples)
+    cuts = statistics.quantiles(ms, n=100) if len(ms) > 1 else ms * 99
+    return {
+        'count': len(ms),
+        'mean_ms': round(statistics.fmean(ms), 3),
+        'p50_ms': round(cuts[49], 3),
+        'p95_ms': round(cuts[94], 3),
+        'p99_ms': round(cuts[98], 3),
+        'max_ms': round(ms[-1], 3),
+    }
+
+
+def install_xdotool_stub():
+    """Put a recording xdotool stub first on PATH, returns the path of its call log"""
+    stub_dir = tempfile.mkdtemp(prefix='xdotool-stub-')
+    log_path = os.path.join(stub_dir, 'calls.log')
+    stub_path = os.path.join(stub_dir, 'xdotool')
+    with open(stub_path, 'w') as f:
+        f.write('#!/bin/sh\n')
+        f.write(f'echo "$@" >> "{log_path}"\n')
+    os.chmod(stub_path, 0o755)
+    os.environ['PATH'] = stub_dir + os.pathsep + os.environ.get('PATH', '')
+    return log_path
+
+
+def metric(value, unit, better='lower'):
+    """One benchmark result; better says whether lower or higher values are good"""
+    return {'value': round(value, 4), 'unit': unit, 'better': better}
+
+
+def compare_to_baseline(results, baseline, tolerance):
+    """Return a list of (name, baseline, current) for metrics that regressed"""
+    regressions = []
+    for name, current in results.items():
+        base = baseline.get(name)
+        if not base or not base.get('value'):
+            continue
+        if current['better'] == 'lower':
+            regressed = current['value'] > base['value'] * (1 + tolerance)
+        else:
+            regressed = current['value'] < base['value'] * (1 - tolerance)
+        if regressed:
+            regressions.append((name, base['value'], current['value']))
+    return regressions
+
+
+def load_baseline(path):
+    try:
+        with open(path) as f:
+            return json.load(f).get('metrics', {})
+    except FileNotFoundError:
+        return None
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Cold start vs warm toggle benchmark for the keyboard daemon.
+
+Starts `floating_keyboard.py --daemon` under Xvfb (with a recording
+xdotool stub on PATH) and measures:
+
+    cold start      spawning the daemon until its socket answers
+    warm toggle     --toggle round trips over the socket, in-process
+    client process  running `floating_keyboard.py --toggle` as a new process
+
+and checks that the client process never imports tkinter:
+
+    xvfb-run -a python benchmarks/bench_daemon.py --toggles 50
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from bench_common import REPO_DIR, install_xdotool_stub, metric, start_xvfb, summarize
+from daemon import send_command
+
+KEYBOARD = os.path.join(REPO_DIR, 'floating_keyboard.py')
+
+
+def wait_for_daemon(path, proc, timeout=30.0):
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        if proc.poll() is not None:
+            sys.exit(f"daemon exited with status {proc.returncode}")
+        try:
+            return send_command('status', path, timeout=0.5)
+        except (OSError, ValueError):
+            time.sleep(0.005)
+    sys.exit("daemon did not answer in time")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--toggles', type=int, default=50, help="toggles to time")
+    parser.add_argument('--json', help="write results to this file")
+    args = parser.parse_args()
+
+    xvfb = start_xvfb()
+    install_xdotool_stub()
+    path = os.path.join(tempfile.mkdtemp(prefix='bench-daemon-'), 'keyboard.sock')
+    daemon = None
+    try:
+        start = time.perf_counter()
+        daemon = subprocess.Popen([sys.executable, KEYBOARD, '--daemon', '--socket', path,
+                                   '--backend', 'xdotool', '--no-window-tracking'])
+        status = wait_for_daemon(path, daemon)
+        cold_ms = (time.perf_counter() - start) * 1000
+
+        toggles = []
+        for _ in range(args.toggles):
+            start = time.perf_counter()
+            send_command('toggle', path)
+            toggles.append(time.perf_counter() - start)
+
+        clients = []
+        for _ in range(max(1, args.toggles // 5)):
+            start = time.perf_counter()
+            subprocess.run([sys.executable, KEYBOARD, '--toggle', '--socket', path], check=True)
+            clients.append(time.perf_counter() - start)
+
+        importtime = subprocess.run([sys.executable, '-X', 'importtime', KEYBOARD, '--toggle',
+                                     '--socket', path], capture_output=True, text=True)
+        client_tkinter = any(line.rstrip().endswith(' tkinter')
+                             for line in importtime.stderr.splitlines())
+
+        status = send_command('status', path)
+        send_command('quit', path)
+        daemon.wait(timeout=5)
+    finally:
+        if daemon is not None and daemon.poll() is None:
+            daemon.kill()
+        if xvfb:
+            xvfb.terminate()
+
+    toggle = summarize(toggles)
+    client = summarize(clients)
+    results = {
+        'cold_start_ms': metric(cold_ms, 'ms'),
+        'daemon_startup_ms': metric(status.get('startup_ms') or 0, 'ms'),
+        'warm_toggle_p50_ms': metric(toggle['p50_ms'], 'ms'),
+        'warm_toggle_p95_ms': metric(toggle['p95_ms'], 'ms'),
+        'client_process_p50_ms': metric(client['p50_ms'], 'ms'),
+        'client_imports_tkinter': metric(int(client_tkinter), 'bool'),
+    }
+    for name, r in results.items():
+        print(f"{name:32s} {r['value']:12.3f} {r['unit']}")
+    print(f"Warm toggle is {cold_ms / max(toggle['p50_ms'], 1e-3):.0f}x faster than a cold start")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'metrics': results, 'daemon_commands': status.get('commands')}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
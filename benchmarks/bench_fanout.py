@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+Benchmark for fan-out mode (fanout.py).
+
+Broadcasts a stream of keystrokes to N targets through FanoutDispatcher,
+using recording backends with an artificial per-call delay in place of
+real windows, and compares it with delivering to the same targets one
+after another on a single worker. Checks that every target received every
+key in order and that a target whose window is destroyed mid-run is
+dropped without stalling the others:
+
+    python benchmarks/bench_fanout.py
+    python benchmarks/bench_fanout.py --targets 8 --delay-ms 2 --json out.json
+
+No display is needed.
+"""
+
+import argparse
+import json
+import queue
+import time
+
+from bench_common import metric
+from dispatch import KeyJob
+from fanout import FanoutDispatcher
+from injection import StubBackend
+
+
+def run_fanout(targets, jobs, delay, kill=None):
+    """Broadcast jobs to targets; returns (seconds, backends by window, dispatcher)"""
+    dead = set()
+    backends = {}
+    finished = queue.Queue()
+    dropped = queue.Queue()
+
+    def factory():
+        backend = StubBackend(delay=delay)
+        backend.dead_windows = dead
+        return backend
+
+    fanout = FanoutDispatcher(factory, lambda job, error: finished.put(job), on_dead=dropped.put,
+                              maxsize=len(jobs))
+    for window in targets:
+        fanout.add_target(window)
+        backends[window] = fanout.workers[window].backend
+
+    start = time.perf_counter()
+    for i, job in enumerate(jobs):
+        if kill is not None and i == len(jobs) // 2:
+            dead.add(kill)
+        fanout.submit(job)
+    for _ in jobs:
+        finished.get()
+    elapsed = time.perf_counter() - start
+    while not dropped.empty():
+        fanout.remove_target(dropped.get())
+    fanout.stop()
+    return elapsed, backends, fanout
+
+
+def run_serial(targets, jobs, delay):
+    """The same deliveries, one target after another on one backend"""
+    backend = StubBackend(delay=delay, keep_log=False)
+    start = time.perf_counter()
+    for job in jobs:
+        for window in targets:
+            backend.deliver(window, job.kind, job.payload, job.count)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--targets', type=int, default=4, help="number of target windows")
+    parser.add_argument('--keys', type=int, default=500, help="keystrokes to broadcast")
+    parser.add_argument('--delay-ms', type=float, default=1.0,
+                        help="simulated injection time per call and target")
+    parser.add_argument('--json', help="write results to this file")
+    args = parser.parse_args()
+
+    targets = [str(0x1000000 + i) for i in range(args.targets)]
+    jobs = [KeyJob(None, 'key', 'BackSpace') if i % 10 == 9 else KeyJob(None, 'type', chr(97 + i % 26))
+            for i in range(args.keys)]
+    expected = [('deliver', targets[0], job.kind, job.payload, 1) for job in jobs]
+    delay = args.delay_ms / 1000.0
+
+    serial = run_serial(targets, jobs, delay)
+    elapsed, backends, fanout = run_fanout(targets, jobs, delay)
+    in_order = all([entry[2:] for entry in backends[w].log] == [entry[2:] for entry in expected]
+                   for w in targets)
+    stats = fanout.stats()
+
+    # Destroy one window halfway through
+    killed = targets[-1]
+    _, _, killed_fanout = run_fanout(targets, jobs, delay, kill=killed)
+    killed_stats = killed_fanout.stats()['targets']
+
+    results = {
+        'serial_ms': metric(serial * 1000, 'ms'),
+        'fanout_ms': metric(elapsed * 1000, 'ms'),
+        'speedup': metric(serial / elapsed, 'x', better='higher'),
+        'keys_per_s': metric(args.keys / elapsed, 'keys/s', better='higher'),
+        'target_p95_ms': metric(max(t['p95_ms'] for t in stats['targets'].values()), 'ms'),
+    }
+    report = {
+        'targets': args.targets,
+        'keys': args.keys,
+        'delay_ms': args.delay_ms,
+        'metrics': results,
+        'per_target': stats['targets'],
+        'in_order': in_order,
+        'dead_target_dropped': killed not in killed_fanout.workers,
+        'dead_target_failures': killed_stats[killed]['failures'],
+        'others_complete': all(killed_stats[w]['sent'] == args.keys for w in targets[:-1]),
+    }
+    print(json.dumps(report, indent=2))
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+Benchmark for idle hibernation (hibernation.py).
+
+Builds FloatingKeyboard under Xvfb with the stub backend, shows every layer
+once, minimizes it and measures RSS, widget count and process wakeups over
+--seconds of idling, first minimized with everything built and then
+hibernated. Then restores and re-hibernates --cycles times, timing how long
+each restore takes to rebuild the keys and checking the rebuilt layer has
+every key:
+
+    xvfb-run -a python benchmarks/bench_hibernate.py
+    python benchmarks/bench_hibernate.py --renderer canvas --json out.json
+
+Exits with status 1 if a restore takes longer than --budget-ms.
+"""
+
+import argparse
+import json
+import platform
+import sys
+import time
+
+from bench_common import metric, start_xvfb, summarize
+from hibernation import count_widgets
+from latency import process_wakeups, resident_memory_kb
+
+
+def idle(kb, seconds):
+    """Run the mainloop for seconds; (RSS KiB, widgets, wakeups per minute)"""
+    before = process_wakeups()
+    kb.root.after(int(seconds * 1000), kb.root.quit)
+    kb.root.mainloop()
+    wakeups = process_wakeups() - before
+    return resident_memory_kb(), count_widgets(kb.root), wakeups * 60 / seconds
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--renderer', choices=['buttons', 'canvas'], default='buttons')
+    parser.add_argument('--seconds', type=float, default=10, help="idle time measured per state")
+    parser.add_argument('--cycles', type=int, default=50, help="restore/hibernate cycles timed")
+    parser.add_argument('--budget-ms', type=float, default=50, help="allowed restore time")
+    parser.add_argument('--json', help="write results to this file")
+    args = parser.parse_args()
+
+    xvfb = start_xvfb()
+    try:
+        from floating_keyboard import FloatingKeyboard
+        from injection import StubBackend
+
+        # Hibernation is driven by hand here, not by the idle timer
+        kb = FloatingKeyboard(backend=StubBackend(keep_log=False), renderer=args.renderer,
+                              idle_hibernate_s=0)
+        kb.target_window = '1'
+        kb.root.update()
+        tracking = kb.start_window_tracker()
+        default = kb.layout.default_layer
+        for name in kb.layout.layers:
+            kb.show_layer(name)
+            kb.root.update()
+        kb.show_layer(default)
+        keys = len(kb.buttons)
+        kb.toggle_minimize()
+        kb.root.update()
+
+        active = idle(kb, args.seconds)
+        kb.hibernate()
+        hibernated = idle(kb, args.seconds)
+
+        samples = []
+        complete = True
+        for _ in range(args.cycles):
+            start = time.perf_counter()
+            kb.toggle_minimize()
+            samples.append(time.perf_counter() - start)
+            complete = complete and kb.active_layer == default and len(kb.buttons) == keys
+            kb.root.update()
+            kb.toggle_minimize()
+            kb.hibernate()
+            kb.root.update()
+        stats = kb.hibernation_stats()
+        if kb.window_tracker is not None:
+            kb.window_tracker.stop()
+        kb.dispatcher.stop()
+        kb.fanout.stop()
+        kb.root.destroy()
+    finally:
+        if xvfb:
+            xvfb.terminate()
+
+    restore = summarize(samples)
+    results = {
+        'active_rss_kb': metric(active[0], 'KiB'),
+        'hibernated_rss_kb': metric(hibernated[0], 'KiB'),
+        'active_widgets': metric(active[1], 'widgets'),
+        'hibernated_widgets': metric(hibernated[1], 'widgets'),
+        'active_wakeups_per_min': metric(active[2], '/min'),
+        'hibernated_wakeups_per_min': metric(hibernated[2], '/min'),
+        'restore_p50_ms': metric(restore['p50_ms'], 'ms'),
+        'restore_max_ms': metric(restore['max_ms'], 'ms'),
+        'rebuild_max_ms': metric(stats['rebuild_ms']['max'], 'ms'),
+    }
+    for name, r in results.items():
+        print(f"{name:32s} {r['value']:12.3f} {r['unit']}")
+    print(f"window tracker {'suspended while hibernated' if tracking else 'not available'}")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'python': platform.python_version(), 'machine': platform.machine(),
+                       'renderer': args.renderer, 'metrics': results, 'hibernation': stats},
+                      f, indent=2)
+
+    if not complete:
+        print("FAIL: a restore did not rebuild every key of the layer that was showing")
+        sys.exit(1)
+    if restore['max_ms'] > args.budget_ms:
+        print(f"FAIL: restore took {restore['max_ms']:.1f} ms (budget {args.budget_ms:g} ms)")
+        sys.exit(1)
+    print(f"Every restore rebuilt {keys} keys within {args.budget_ms:g} ms")
+
+
+if __name__ == "__main__":
+    main()
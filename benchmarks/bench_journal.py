@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+Benchmark for the keystroke journal (journal.py).
+
+Measures what recording costs per key press (the time added to
+on_key_press), the bytes per record and the read-back speed for the JSONL
+and binary formats, with and without redaction:
+
+    python benchmarks/bench_journal.py
+    python benchmarks/bench_journal.py --records 200000 --json out.json
+
+No display is needed. To measure replay throughput and latency through
+the keyboard itself, use floating_keyboard.py --replay.
+"""
+
+import argparse
+import json
+import os
+import random
+import tempfile
+import time
+
+from bench_common import metric, summarize
+from journal import JournalWriter, read_journal
+
+KEYS = [(c, c) for c in 'etaoinshrdlu'] + [('space', 'Space'), ('BackSpace', 'Backspace'),
+                                          ('Shift_L', 'Shift'), ('Control_L', 'Ctrl')]
+STATES = [(False, False, ()), (True, False, ()), (False, False, (('Control_L', 'latched'),))]
+
+
+def bench_format(fmt, records, redact, directory):
+    path = os.path.join(directory, f'journal-{fmt}{"-redacted" if redact else ""}')
+    rng = random.Random(1)
+    presses = [(rng.choice(KEYS), rng.choice(STATES)) for _ in range(records)]
+    writer = JournalWriter(path, fmt, max_bytes=1 << 40, redact=redact)
+    samples = []
+    for (keycode, display), state in presses:
+        start = time.perf_counter()
+        writer.record(keycode, display, state)
+        samples.append(time.perf_counter() - start)
+    writer.close()
+    size = os.path.getsize(path)
+
+    start = time.perf_counter()
+    entries = read_journal(path)
+    read_s = time.perf_counter() - start
+    assert len(entries) == records
+    return {
+        'record': summarize(samples),
+        'bytes_per_record': round(size / records, 2),
+        'read_us_per_record': round(read_s * 1e6 / records, 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--records', type=int, default=100_000, help="presses to record per format")
+    parser.add_argument('--json', help="write results to this file")
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp(prefix='bench-journal-')
+    report = {}
+    metrics = {}
+    for fmt in ('jsonl', 'binary'):
+        for redact in (False, True):
+            name = fmt + ('_redacted' if redact else '')
+            result = bench_format(fmt, args.records, redact, directory)
+            report[name] = result
+            metrics[f'{name}_record_p50_us'] = metric(result['record']['p50_ms'] * 1000, 'us')
+            metrics[f'{name}_bytes_per_record'] = metric(result['bytes_per_record'], 'B')
+    report = {'records': args.records, 'metrics': metrics, 'formats': report}
+    print(json.dumps(report, indent=2))
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
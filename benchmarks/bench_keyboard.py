@@ -0,0 +1,331 @@
+#!/usr/bin/env python3
+"""
+Headless benchmark suite for floating_keyboard.py.
+
+Builds FloatingKeyboard under Xvfb with a recording backend instead of real
+injection and measures startup, construction and per-event UI costs:
+
+    xvfb-run -a python benchmarks/bench_keyboard.py
+    python benchmarks/bench_keyboard.py --json out.json
+    python benchmarks/bench_keyboard.py --update-baseline
+
+Results are compared against benchmarks/baseline.json and the script exits
+with status 1 when a metric regresses by more than --tolerance. Timings
+depend on the machine, so no baseline is committed: record one with
+--update-baseline first. Without it the results are printed, nothing is
+compared and the exit status is 0.
+Use --xdotool-stub to drive the real xdotool backend against a recording
+xdotool script on PATH instead of the in-process stub.
+"""
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+
+from bench_common import (compare_to_baseline, install_xdotool_stub, load_baseline, metric,
+                          start_xvfb)
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+
+# Key presses used for the throughput run: mostly letters, some BackSpace
+PRESS_SEQUENCE = [(c, c) for c in 'asdfjklqwe'] + [('BackSpace', 'Backspace')]
+
+
+class FakeEvent:
+    """Just enough of a Tk event for the drag/resize handlers"""
+
+    def __init__(self, x=0, y=0, x_root=0, y_root=0):
+        self.x = x
+        self.y = y
+        self.x_root = x_root
+        self.y_root = y_root
+
+
+def startup_child(renderer):
+    """Child process: build the keyboard and report when mainloop first goes idle"""
+    t0 = time.perf_counter()
+    from floating_keyboard import FloatingKeyboard
+    from injection import StubBackend
+    t_import = time.perf_counter()
+    kb = FloatingKeyboard(backend=StubBackend(), renderer=renderer)
+    t_built = time.perf_counter()
+
+    def idle():
+        print(json.dumps({'import_ms': (t_import - t0) * 1000, 'construct_ms': (t_built - t_import) * 1000}))
+        sys.stdout.flush()
+        kb.root.quit()
+
+    kb.root.after_idle(idle)
+    kb.root.mainloop()
+
+
+def bench_startup(runs, renderer):
+    """Cold start: spawn a fresh interpreter until its mainloop goes idle"""
+    wall, construct = [], []
+    for _ in range(runs):
+        start = time.perf_counter()
+        out = subprocess.run([sys.executable, os.path.abspath(__file__), '--startup-child',
+                              '--renderer', renderer],
+                             capture_output=True, text=True, check=True).stdout
+        wall.append((time.perf_counter() - start) * 1000)
+        construct.append(json.loads(out.strip().splitlines()[-1])['construct_ms'])
+    return {
+        'startup_to_idle_ms': metric(statistics.median(wall), 'ms'),
+        'startup_construct_ms': metric(statistics.median(construct), 'ms'),
+    }
+
+
+def timed(fn, repeat):
+    """Median wall time of fn() in milliseconds"""
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+
+def bench_create_keyboard(kb, repeat):
+    def rebuild():
+        kb.destroy_layers()
+        kb.create_keyboard()
+        kb.root.update_idletasks()
+
+    return {'create_keyboard_ms': metric(timed(rebuild, repeat), 'ms')}
+
+
+def bench_layers(kb, repeat):
+    """First show of every extra layer (build) and switching between built layers"""
+    root = kb.root
+    default = kb.layout.default_layer
+    others = [name for name in kb.layout.layers if name != default]
+    if not others:
+        return {}
+
+    build = []
+    for name in others:
+        start = time.perf_counter()
+        kb.show_layer(name)
+        root.update_idletasks()
+        build.append((time.perf_counter() - start) * 1000)
+        kb.show_layer(default)
+
+    def switch():
+        kb.show_layer(others[0])
+        root.update_idletasks()
+        kb.show_layer(default)
+        root.update_idletasks()
+
+    stats = kb.layer_stats()
+    return {
+        'layer_first_show_ms': metric(statistics.median(build), 'ms'),
+        'layer_switch_ms': metric(timed(switch, repeat) / 2, 'ms'),
+        'hidden_layer_widgets': metric(stats['hidden_widgets'], 'widgets'),
+        'hidden_layer_rss_kb': metric(stats['hidden_rss_kb'], 'KiB'),
+    }
+
+
+def bench_toggles(kb, repeat):
+    root = kb.root
+
+    def shift():
+        kb.on_key_press('Shift_L', 'Shift')
+        root.update_idletasks()
+
+    def caps():
+        kb.on_key_press('Caps_Lock', 'Caps')
+        root.update_idletasks()
+
+    def theme():
+        kb.toggle_theme()
+        root.update_idletasks()
+
+    results = {
+        'shift_toggle_ms': metric(timed(shift, repeat), 'ms'),
+        'caps_toggle_ms': metric(timed(caps, repeat), 'ms'),
+        'apply_theme_ms': metric(timed(theme, repeat), 'ms'),
+    }
+
+    # Widget configure calls for a single transition of each kind
+    shift()
+    results['shift_toggle_configures'] = metric(kb.last_repaint_configures, 'calls')
+    shift()
+    caps()
+    results['caps_toggle_configures'] = metric(kb.last_repaint_configures, 'calls')
+    caps()
+    theme()
+    results['apply_theme_configures'] = metric(kb.last_repaint_configures, 'calls')
+    theme()
+    return results
+
+
+def bench_motion(kb, events):
+    """Per-event cost of do_resize and do_drag, each followed by event processing
+
+    Geometry is applied on a frame timer, so the loop runs root.update() after
+    every event and the per-frame apply cost is amortized over the events.
+    """
+    root = kb.root
+    root.geometry("920x250+100+300")
+    root.update()
+
+    kb.start_resize(FakeEvent(x_root=1000, y_root=500))
+    start = time.perf_counter()
+    for i in range(events):
+        dx = (i % 200) - 100
+        kb.do_resize(FakeEvent(x_root=1000 + dx, y_root=500 + dx // 4))
+        root.update()
+    resize_us = (time.perf_counter() - start) * 1e6 / events
+
+    kb.start_drag(FakeEvent(x=50, y=10, x_root=150, y_root=310))
+    start = time.perf_counter()
+    for i in range(events):
+        dx = (i % 100) - 50
+        kb.do_drag(FakeEvent(x=50 + dx, y=10 + dx // 4, x_root=150 + dx, y_root=310 + dx // 4))
+        root.update()
+    drag_us = (time.perf_counter() - start) * 1e6 / events
+    root.update()
+
+    return {
+        'do_resize_event_us': metric(resize_us, 'us'),
+        'do_drag_event_us': metric(drag_us, 'us'),
+    }
+
+
+def bench_keypress(kb, backend, presses, stub_log=None):
+    """Keypress throughput through on_key_press until every key reached the backend"""
+    root = kb.root
+    sequence = [PRESS_SEQUENCE[i % len(PRESS_SEQUENCE)] for i in range(presses)]
+
+    def delivered():
+        if stub_log is not None:
+            if not os.path.exists(stub_log):
+                return 0
+            with open(stub_log) as f:
+                lines = [line.split() for line in f if not line.startswith('windowactivate')]
+            # xdotool type --clearmodifiers -- <text> / xdotool key --clearmodifiers <keysym>
+            return sum(len(line[-1]) if line[0] == 'type' else 1 for line in lines)
+        return backend.chars + backend.keys
+
+    # Caps toggles from earlier runs already reached the backend
+    already = delivered()
+    start = time.perf_counter()
+    for keycode, display in sequence:
+        kb.on_key_press(keycode, display)
+    ui_done = time.perf_counter()
+
+    deadline = start + 30
+    while (delivered() - already < presses or kb.dispatcher.depth()) and time.perf_counter() < deadline:
+        root.update()
+    elapsed = time.perf_counter() - start
+
+    return {
+        'keypress_ui_us': metric((ui_done - start) * 1e6 / presses, 'us'),
+        'keypress_throughput_kps': metric(presses / elapsed, 'keys/s', better='higher'),
+        'keypress_chars_per_injection': metric(kb.coalescer.stats()['chars_per_injection'], 'chars',
+                                               better='higher'),
+    }
+
+
+def run_suite(args, results):
+    from floating_keyboard import FloatingKeyboard
+    from injection import StubBackend, XdotoolBackend
+
+    stub_log = None
+    if args.xdotool_stub:
+        stub_log = install_xdotool_stub()
+        backend = XdotoolBackend()
+    else:
+        backend = StubBackend(keep_log=False)
+
+    kb = FloatingKeyboard(backend=backend, queue_size=max(64, args.presses + 1), renderer=args.renderer)
+    kb.target_window = '1'
+
+    def suite():
+        try:
+            kb.root.update()
+            results.update(bench_create_keyboard(kb, args.repeat))
+            results.update(bench_toggles(kb, args.repeat))
+            results.update(bench_layers(kb, args.repeat))
+            results.update(bench_motion(kb, args.events))
+            results.update(bench_keypress(kb, backend, args.presses, stub_log))
+        finally:
+            kb.root.quit()
+
+    # Keypress delivery is marshalled back through root.after, which needs the mainloop
+    kb.root.after_idle(suite)
+    kb.root.mainloop()
+    kb.dispatcher.stop()
+    kb.root.destroy()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--json', help="write results to this file")
+    parser.add_argument('--baseline', default=BASELINE_PATH, help="baseline file to compare against")
+    parser.add_argument('--update-baseline', action='store_true', help="store these results as the baseline")
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help="allowed relative slowdown before a metric counts as a regression")
+    parser.add_argument('--repeat', type=int, default=20, help="repetitions for toggle/construct timings")
+    parser.add_argument('--events', type=int, default=300, help="motion events for drag/resize")
+    parser.add_argument('--presses', type=int, default=500, help="key presses for the throughput run")
+    parser.add_argument('--startup-runs', type=int, default=5, help="cold starts to measure")
+    parser.add_argument('--xdotool-stub', action='store_true',
+                        help="use the xdotool backend with a recording stub on PATH")
+    parser.add_argument('--renderer', choices=['buttons', 'canvas'], default='buttons',
+                        help="key renderer to benchmark")
+    parser.add_argument('--startup-child', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.startup_child:
+        startup_child(args.renderer)
+        return
+
+    xvfb = start_xvfb()
+    try:
+        results = {}
+        results.update(bench_startup(args.startup_runs, args.renderer))
+        run_suite(args, results)
+    finally:
+        if xvfb:
+            xvfb.terminate()
+
+    report = {
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'backend': 'xdotool-stub' if args.xdotool_stub else 'stub',
+        'renderer': args.renderer,
+        'metrics': results,
+    }
+    for name, r in results.items():
+        print(f"{name:32s} {r['value']:12.3f} {r['unit']}")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    if args.update_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"Baseline written to {args.baseline}")
+        return
+
+    baseline = load_baseline(args.baseline)
+    if baseline is None:
+        print("No baseline found, run with --update-baseline to create one")
+        return
+    regressions = compare_to_baseline(results, baseline, args.tolerance)
+    for name, base, current in regressions:
+        print(f"REGRESSION {name}: {base} -> {current}")
+    if regressions:
+        sys.exit(1)
+    print("No regressions against baseline")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+"""
+Stress test for sticky modifiers (modifiers.py).
+
+Builds the keyboard under Xvfb and fires a long random stream of key
+presses through on_key_press as fast as possible: letters and named keys
+mixed with Ctrl/Alt/Win taps (latching, locking and unlocking them), Shift
+and the occasional hide/show. Everything the backend received is compared
+with an independent model of the latch/lock rules, and the keyboard must
+end with no latched modifier and no modifier key drawn as active:
+
+    xvfb-run -a python benchmarks/bench_modifiers.py
+    xvfb-run -a python benchmarks/bench_modifiers.py --presses 50000 --backend xtest
+
+With --backend xtest the chords are really injected, and the X server's
+keymap is queried afterwards to confirm no modifier key is left pressed.
+Exits with status 1 if any check fails.
+"""
+
+import argparse
+import ctypes
+import json
+import random
+import sys
+import time
+
+from bench_common import start_xvfb
+
+STICKY = ['Control_L', 'Control_R', 'Alt_L', 'Super_L']
+ORDER = {'Control': 0, 'Alt': 1, 'Meta': 2, 'Super': 3, 'Shift': 4}
+PLAIN = [(c, c) for c in 'asdfjklqwertzxcv'] + [('Return', 'Enter'), ('BackSpace', 'Backspace')]
+MODIFIER_KEYSYMS = ['Control_L', 'Control_R', 'Alt_L', 'Alt_R', 'Super_L', 'Super_R',
+                    'Shift_L', 'Shift_R', 'Meta_L', 'Meta_R']
+
+
+def random_stream(presses, seed):
+    """Presses as (keycode, display) or ('hide', None); about a third are modifiers"""
+    rng = random.Random(seed)
+    stream = []
+    for _ in range(presses):
+        roll = rng.random()
+        if roll < 0.30:
+            keysym = rng.choice(STICKY)
+            stream.append((keysym, keysym.split('_')[0]))
+        elif roll < 0.35:
+            stream.append(('Shift_L', 'Shift'))
+        elif roll < 0.36:
+            stream.append(('hide', None))
+        else:
+            stream.append(rng.choice(PLAIN))
+    return stream
+
+
+def expected_keys(stream):
+    """What the backend should receive, from a separate model of the latch/lock rules"""
+    state = {}
+    shift = False
+    sent = []
+    for keycode, display in stream:
+        if keycode == 'hide':
+            state = {k: v for k, v in state.items() if v == 'locked'}
+        elif keycode == 'Shift_L':
+            shift = not shift
+        elif keycode in STICKY:
+            current = state.get(keycode)
+            if current is None:
+                state[keycode] = 'latched'
+            elif current == 'latched':
+                state[keycode] = 'locked'
+            else:
+                del state[keycode]
+        elif state:
+            held = sorted(state, key=lambda k: (ORDER[k.split('_')[0]], k))
+            sent.append(tuple(held + (['Shift_L'] if shift else []) + [keycode]))
+            state = {k: v for k, v in state.items() if v == 'locked'}
+            shift = False
+        else:
+            if len(display) == 1:
+                sent.append(keycode.upper() if shift else keycode)
+            else:
+                sent.append(keycode)
+            shift = False
+    return sent, state
+
+
+def received_keys(log):
+    """Flatten the stub backend log into one entry per key or chord"""
+    keys = []
+    for entry in log:
+        if entry[0] == 'type':
+            keys.extend(entry[1])
+        elif entry[0] == 'key':
+            keys.extend([entry[1]] * (entry[2] if len(entry) > 2 else 1))
+        elif entry[0] == 'chord':
+            keys.append(tuple(entry[1]))
+    return keys
+
+
+def pressed_modifiers(display_name=None):
+    """Modifier keysyms whose keys the X server reports as held down"""
+    from x11 import XConnection
+    conn = XConnection(display_name)
+    try:
+        keymap = (ctypes.c_char * 32)()
+        conn.xlib.XQueryKeymap.argtypes = [ctypes.c_void_p, ctypes.c_char * 32]
+        conn.xlib.XQueryKeymap(conn.display, keymap)
+        bits = bytes(keymap)
+        held = []
+        for name in MODIFIER_KEYSYMS:
+            keycode = conn.xlib.XKeysymToKeycode(conn.display, conn.xlib.XStringToKeysym(name.encode()))
+            if keycode and bits[keycode // 8] & (1 << (keycode % 8)):
+                held.append(name)
+        return held
+    finally:
+        conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--presses', type=int, default=20000, help="key presses to fire")
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--backend', choices=['stub', 'xtest'], default='stub')
+    parser.add_argument('--json', help="write results to this file")
+    args = parser.parse_args()
+
+    xvfb = start_xvfb()
+    try:
+        from floating_keyboard import FloatingKeyboard
+        from injection import StubBackend, XTestBackend
+
+        backend = StubBackend() if args.backend == 'stub' else XTestBackend()
+        # A queue as long as the run: this checks correctness, not backpressure
+        kb = FloatingKeyboard(backend=backend, queue_size=args.presses, track_active_window=False,
+                              repeat_rate=0)
+        kb.root.update()
+        kb.target_window = str(kb.root.winfo_id())
+        # Keep the target across hide/show instead of asking xdotool for one
+        kb.get_target_window = lambda: None
+        stream = random_stream(args.presses, args.seed)
+
+        start = time.perf_counter()
+        for i, (keycode, display) in enumerate(stream):
+            if keycode == 'hide':
+                kb.hide_keyboard()
+                kb.show_keyboard()
+            else:
+                kb.on_key_press(keycode, display)
+            if i % 64 == 0:
+                kb.root.update()
+        kb.coalescer.flush('exit')
+        while kb.queue_depth():
+            kb.root.update()
+            time.sleep(0.001)
+        elapsed = time.perf_counter() - start
+        kb.root.update()
+
+        expected, final_state = expected_keys(stream)
+        checks = {
+            'final_state_matches': dict(kb.modifiers.state) == final_state,
+            'no_latched_left': all(state != 'latched' for state in kb.modifiers.state.values()),
+            'nothing_dropped': kb.dispatcher.dropped == 0,
+        }
+        # Modifier keys must be drawn exactly as their state says
+        idle = kb.key_options('Ctrl', 'Control_L', kb.shift_active, kb.caps_active, kb.current_theme)
+        for key, applied in kb.applied_options.items():
+            if key[1] in STICKY and key[1] not in kb.modifiers.state:
+                checks.setdefault('modifier_keys_drawn_idle', True)
+                if applied.get('bg') != idle['bg'] or applied.get('relief') != idle['relief']:
+                    checks['modifier_keys_drawn_idle'] = False
+        if args.backend == 'stub':
+            received = received_keys(backend.log)
+            checks['injections_match_model'] = received == expected
+            checks['no_bare_modifier_taps'] = not any(k in MODIFIER_KEYSYMS for k in received)
+        else:
+            # Let the server process everything before looking at the keymap
+            backend.sync()
+            checks['no_modifier_held'] = not pressed_modifiers()
+
+        chords = sum(1 for k in expected if isinstance(k, tuple))
+        report = {
+            'backend': args.backend,
+            'presses': args.presses,
+            'chords': chords,
+            'presses_per_s': round(args.presses / elapsed),
+            'modifiers': kb.modifiers.stats(),
+            'checks': checks,
+        }
+        print(json.dumps(report, indent=2))
+        if args.json:
+            with open(args.json, 'w') as f:
+                json.dump(report, f, indent=2)
+        kb.dispatcher.stop()
+        kb.root.destroy()
+        sys.exit(0 if all(checks.values()) else 1)
+    finally:
+        if xvfb is not None:
+            xvfb.terminate()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+Benchmark for the word prediction index (prediction.py).
+
+Builds a synthetic frequency-weighted lexicon (Zipf-like weights, 100k
+words by default) or reads a real word list, then measures index build,
+save and mmap load times and top-k completion latency for 1-4 letter
+prefixes, for the in-memory and the memory-mapped index:
+
+    python benchmarks/bench_prediction.py
+    python benchmarks/bench_prediction.py --words /usr/share/dict/words --json out.json
+
+No display is needed.
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import tempfile
+import time
+
+from bench_common import metric, summarize
+from prediction import WordIndex, read_word_list
+
+# Rough English letter frequencies, so prefix ranges are as uneven as real ones
+LETTERS = 'etaoinshrdlcumwfgypbvkjxqz'
+LETTER_WEIGHTS = [12.7, 9.1, 8.2, 7.5, 7.0, 6.7, 6.3, 6.1, 6.0, 4.3, 4.0, 2.8, 2.8,
+                  2.4, 2.4, 2.2, 2.0, 2.0, 1.9, 1.5, 1.0, 0.8, 0.2, 0.2, 0.1, 0.1]
+
+
+def synthetic_lexicon(size, seed=1):
+    """size distinct words with Zipf-like frequencies"""
+    rng = random.Random(seed)
+    weights = {}
+    while len(weights) < size:
+        word = ''.join(rng.choices(LETTERS, LETTER_WEIGHTS, k=rng.randint(2, 12)))
+        if word not in weights:
+            weights[word] = int(10_000_000 / (len(weights) + 1)) + 1
+    return weights
+
+
+def bench_queries(index, prefixes, k):
+    samples = []
+    for prefix in prefixes:
+        start = time.perf_counter()
+        index.complete(prefix, k)
+        samples.append(time.perf_counter() - start)
+    return summarize(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--words', help="word list to index instead of a synthetic lexicon")
+    parser.add_argument('--size', type=int, default=100_000, help="synthetic lexicon size")
+    parser.add_argument('--queries', type=int, default=5000, help="prefix lookups to time")
+    parser.add_argument('--k', type=int, default=4, help="completions per lookup")
+    parser.add_argument('--json', help="write results to this file")
+    args = parser.parse_args()
+
+    weights = read_word_list(args.words) if args.words else synthetic_lexicon(args.size)
+
+    start = time.perf_counter()
+    index = WordIndex.build(weights)
+    build_ms = (time.perf_counter() - start) * 1000
+
+    index_path = os.path.join(tempfile.mkdtemp(prefix='bench-prediction-'), 'words.idx')
+    start = time.perf_counter()
+    index.save(index_path)
+    save_ms = (time.perf_counter() - start) * 1000
+
+    start = time.perf_counter()
+    mapped = WordIndex.load(index_path)
+    load_ms = (time.perf_counter() - start) * 1000
+
+    # Prefixes of words weighted by frequency, like a user typing them
+    rng = random.Random(2)
+    words = list(weights)
+    picks = rng.choices(words, [weights[w] for w in words], k=args.queries)
+    prefixes = [w[:rng.randint(1, min(4, len(w)))] for w in picks]
+
+    memory = bench_queries(index, prefixes, args.k)
+    mmapped = bench_queries(mapped, prefixes, args.k)
+
+    results = {
+        'words': metric(len(index), 'words', better='higher'),
+        'hot_prefixes': metric(len(index.hot), 'prefixes'),
+        'build_ms': metric(build_ms, 'ms'),
+        'save_ms': metric(save_ms, 'ms'),
+        'mmap_load_ms': metric(load_ms, 'ms'),
+        'index_file_kb': metric(os.path.getsize(index_path) / 1024, 'KiB'),
+        'query_p50_us': metric(memory['p50_ms'] * 1000, 'us'),
+        'query_p99_us': metric(memory['p99_ms'] * 1000, 'us'),
+        'query_max_us': metric(memory['max_ms'] * 1000, 'us'),
+        'mmap_query_p50_us': metric(mmapped['p50_ms'] * 1000, 'us'),
+        'mmap_query_p99_us': metric(mmapped['p99_ms'] * 1000, 'us'),
+    }
+    mapped.close()
+    os.remove(index_path)
+
+    for name, r in results.items():
+        print(f"{name:32s} {r['value']:12.3f} {r['unit']}")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'python': platform.python_version(), 'machine': platform.machine(),
+                       'metrics': results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""
+Throughput benchmark for the JSON-lines scripting API (script_api.py).
+
+Builds the keyboard under Xvfb with the recording stub backend, enables
+the API on a private socket and streams requests from a pipelined client
+(a sender thread writes everything without waiting, a reader collects the
+acknowledgements). Reports requests per second, acknowledgement latency
+and how many requests each injection carried:
+
+    xvfb-run -a python benchmarks/bench_script_api.py --requests 20000
+    python benchmarks/bench_script_api.py --backend-delay 0.002   # slow backend
+"""
+
+import argparse
+import json
+import os
+import socket
+import tempfile
+import threading
+import time
+
+from bench_common import metric, start_xvfb, summarize
+
+
+def request_stream(count):
+    """Mostly short text, with key presses, repeats and a few chords mixed in"""
+    for i in range(count):
+        if i % 50 == 49:
+            yield {'id': i, 'key': 'BackSpace'}
+        elif i % 500 == 250:
+            yield {'id': i, 'chord': 'ctrl+z'}
+        elif i % 10 == 5:
+            yield {'id': i, 'key': 'a'}
+        else:
+            yield {'id': i, 'text': 'hello '}
+
+
+def run_client(path, count, results):
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.connect(path)
+    sent_at = [0.0] * count
+    latencies = []
+    errors = 0
+
+    def sender():
+        pending = []
+        for request in request_stream(count):
+            pending.append(json.dumps(request))
+            if len(pending) == 256:
+                sent_at[request['id'] - 255:request['id'] + 1] = [time.perf_counter()] * 256
+                sock.sendall(('\n'.join(pending) + '\n').encode())
+                pending = []
+        if pending:
+            now = time.perf_counter()
+            sent_at[count - len(pending):] = [now] * len(pending)
+            sock.sendall(('\n'.join(pending) + '\n').encode())
+
+    start = time.perf_counter()
+    thread = threading.Thread(target=sender, daemon=True)
+    thread.start()
+    buffer = b''
+    acked = 0
+    while acked < count:
+        data = sock.recv(65536)
+        if not data:
+            break
+        buffer += data
+        *lines, buffer = buffer.split(b'\n')
+        now = time.perf_counter()
+        for line in lines:
+            ack = json.loads(line)
+            acked += 1
+            if not ack['ok']:
+                errors += 1
+            latencies.append(now - sent_at[ack['id']])
+    results['elapsed'] = time.perf_counter() - start
+    results['acked'] = acked
+    results['errors'] = errors
+    results['latency'] = summarize(latencies) if latencies else None
+    sock.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--requests', type=int, default=20000, help="requests to stream")
+    parser.add_argument('--backend-delay', type=float, default=0.0,
+                        help="artificial seconds per backend call, to mimic a slow backend")
+    parser.add_argument('--json', help="write results to this file")
+    args = parser.parse_args()
+
+    xvfb = start_xvfb()
+    try:
+        from floating_keyboard import FloatingKeyboard
+        from injection import StubBackend
+        from script_api import ScriptServer
+
+        path = os.path.join(tempfile.mkdtemp(prefix='bench-api-'), 'api.sock')
+        backend = StubBackend(delay=args.backend_delay, keep_log=False)
+        kb = FloatingKeyboard(backend=backend)
+        kb.target_window = '1'
+        results = {}
+
+        # Start the server the way run() would, but without the window tracker
+        def start_client():
+            kb.script_server = ScriptServer(kb, path)
+            threading.Thread(target=run_client, args=(path, args.requests, results), daemon=True).start()
+            wait()
+
+        def wait():
+            if 'elapsed' in results:
+                kb.root.quit()
+            else:
+                kb.root.after(20, wait)
+
+        kb.root.after_idle(start_client)
+        kb.root.mainloop()
+        stats = kb.script_server.stats()
+        kb.script_server.close()
+        kb.dispatcher.stop()
+        kb.root.destroy()
+    finally:
+        if xvfb:
+            xvfb.terminate()
+
+    latency = results['latency'] or {'p50_ms': 0, 'p99_ms': 0}
+    report = {
+        'requests_per_s': metric(results['acked'] / results['elapsed'], 'req/s', better='higher'),
+        'ack_p50_ms': metric(latency['p50_ms'], 'ms'),
+        'ack_p99_ms': metric(latency['p99_ms'], 'ms'),
+        'injections': metric(stats['injections'], 'calls'),
+        'requests_per_injection': metric(stats['requests_per_injection'], 'req', better='higher'),
+        'backend_calls': metric(backend.injections, 'calls'),
+        'errors': metric(results['errors'], 'req'),
+    }
+    for name, r in report.items():
+        print(f"{name:32s} {r['value']:12.3f} {r['unit']}")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'metrics': report}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
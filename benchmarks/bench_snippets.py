@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+"""
+Benchmark for snippet expansion (snippets.py).
+
+Measures the abbreviation lookup cost per typed character and the reload
+time for a snippet file of --snippets entries, then the expansion latency
+of multi-kilobyte snippets through the KeyDispatcher: from submitting the
+expansion to the backend finishing it, as one 'type' injection (what the
+keyboard does) and, for comparison, one injection per character:
+
+    python benchmarks/bench_snippets.py
+    xvfb-run -a python benchmarks/bench_snippets.py --backend xtest --json out.json
+
+The stub backend (default) needs no display and shows the dispatch
+overhead alone. With xtest or xdotool the text is typed into a Tk Text
+widget under Xvfb and the number of characters that arrived is checked.
+"""
+
+import argparse
+import json
+import os
+import random
+import string
+import tempfile
+import threading
+import time
+
+from bench_common import metric, start_xvfb, summarize
+from dispatch import KeyDispatcher, KeyJob
+from injection import BACKENDS
+from snippets import SnippetStore
+
+SIZES = (256, 1024, 4096, 16384)
+
+
+def snippet_text(size, rng):
+    """size characters of words and spaces, with a line break about every 60"""
+    chars = []
+    while len(chars) < size:
+        word = ''.join(rng.choices(string.ascii_lowercase, k=rng.randint(2, 9)))
+        chars.extend(word)
+        chars.append('\n' if len(chars) % 60 < 10 else ' ')
+    return ''.join(chars[:size - 1]) + '.'
+
+
+def bench_lookup(count, chars, rng):
+    """Per-character feed() cost and reload time with count abbreviations"""
+    path = os.path.join(tempfile.mkdtemp(prefix='bench-snippets-'), 'snippets.json')
+    data = {';' + ''.join(rng.choices(string.ascii_lowercase, k=rng.randint(2, 6))): 'text'
+            for _ in range(count)}
+    with open(path, 'w') as f:
+        json.dump(data, f)
+    store = SnippetStore(path)
+
+    start = time.perf_counter()
+    store.refresh()
+    load_ms = (time.perf_counter() - start) * 1000
+
+    # Ordinary typing with the odd ';', so most characters match nothing
+    typed = rng.choices(string.ascii_lowercase + ' ;', k=chars)
+    samples = []
+    expansions = 0
+    for char in typed:
+        start = time.perf_counter()
+        expansions += store.feed(char) is not None
+        samples.append(time.perf_counter() - start)
+    return {'load_ms': load_ms, 'feed': summarize(samples), 'expansions': expansions}
+
+
+class Target:
+    """A Tk Text widget under Xvfb to type into, for the real backends"""
+
+    def __init__(self):
+        import tkinter as tk
+        self.root = tk.Tk()
+        self.root.geometry("600x300+50+50")
+        self.text = tk.Text(self.root)
+        self.text.pack(fill='both', expand=True)
+        self.root.update()
+        self.text.focus_force()
+        self.root.update()
+        self.window = int(self.root.wm_frame(), 16)
+
+    def clear(self):
+        self.text.delete('1.0', 'end')
+        self.root.update()
+
+    def received(self, expected, timeout=10.0):
+        """Characters that arrived, waiting until expected have or timeout"""
+        deadline = time.monotonic() + timeout
+        while True:
+            self.root.update()
+            count = len(self.text.get('1.0', 'end-1c'))
+            if count >= expected or time.monotonic() > deadline:
+                return count
+            time.sleep(0.005)
+
+
+def run_jobs(dispatcher, done, jobs):
+    """Submit jobs and wait for the last; seconds from first submit to last injected"""
+    done.clear()
+    start = time.perf_counter()
+    for job in jobs:
+        while not dispatcher.submit(job):
+            time.sleep(0.0005)
+    done.wait()
+    return time.perf_counter() - start
+
+
+def bench_expansion(backend, target, repeats, rng):
+    done = threading.Event()
+    remaining = [0]
+
+    def on_done(job, error):
+        if error is not None:
+            print(f"Error sending key: {error}")
+        remaining[0] -= 1
+        if remaining[0] == 0:
+            done.set()
+
+    dispatcher = KeyDispatcher(backend, on_done, maxsize=256)
+    window = target.window if target is not None else 1
+    results = {}
+    try:
+        for size in SIZES:
+            text = snippet_text(size, rng)
+            single = []
+            for _ in range(repeats):
+                if target is not None:
+                    target.clear()
+                remaining[0] = 1
+                single.append(run_jobs(dispatcher, done, [KeyJob(window, 'type', text)]))
+                if target is not None:
+                    arrived = target.received(size)
+            per_char_jobs = [KeyJob(window, 'type', char) for char in text]
+            if target is not None:
+                target.clear()
+            remaining[0] = len(per_char_jobs)
+            per_char = run_jobs(dispatcher, done, per_char_jobs)
+            result = {'single': summarize(single), 'per_char_ms': round(per_char * 1000, 3)}
+            if target is not None:
+                result['delivered'] = arrived
+                result['per_char_delivered'] = target.received(size)
+            results[size] = result
+    finally:
+        dispatcher.stop()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--backend', choices=sorted(BACKENDS), default='stub')
+    parser.add_argument('--snippets', type=int, default=1000, help="abbreviations in the store")
+    parser.add_argument('--chars', type=int, default=100_000, help="typed characters to look up")
+    parser.add_argument('--repeats', type=int, default=20, help="expansions timed per snippet size")
+    parser.add_argument('--json', help="write results to this file")
+    args = parser.parse_args()
+
+    rng = random.Random(1)
+    lookup = bench_lookup(args.snippets, args.chars, rng)
+
+    xvfb = None
+    target = None
+    try:
+        if args.backend != 'stub':
+            xvfb = start_xvfb()
+            target = Target()
+        backend = BACKENDS[args.backend]()
+        expansion = bench_expansion(backend, target, args.repeats, rng)
+        backend.close()
+    finally:
+        if xvfb is not None:
+            xvfb.terminate()
+
+    metrics = {
+        'load_ms': metric(lookup['load_ms'], 'ms'),
+        'feed_p50_us': metric(lookup['feed']['p50_ms'] * 1000, 'us'),
+        'feed_p99_us': metric(lookup['feed']['p99_ms'] * 1000, 'us'),
+    }
+    for size, result in expansion.items():
+        metrics[f'expand_{size}_p50_ms'] = metric(result['single']['p50_ms'], 'ms')
+        metrics[f'per_char_{size}_ms'] = metric(result['per_char_ms'], 'ms')
+    for name, r in metrics.items():
+        print(f"{name:32s} {r['value']:12.3f} {r['unit']}")
+    for size, result in expansion.items():
+        if 'delivered' in result:
+            print(f"{size:6d} chars delivered: single {result['delivered']}, "
+                  f"per char {result['per_char_delivered']}")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'backend': args.backend, 'snippets': args.snippets, 'metrics': metrics,
+                       'expansion': expansion}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
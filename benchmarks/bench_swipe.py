@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+Benchmark for swipe typing (swipe.py).
+
+Builds the word templates for the default layer of a layout over a
+synthetic frequency-weighted lexicon (50k words by default, as in
+bench_prediction.py) or a real word list, then decodes synthetic gestures
+and reports top-1 and top-k accuracy and the decode latency:
+
+    python benchmarks/bench_swipe.py
+    python benchmarks/bench_swipe.py --words /usr/share/dict/words --noise 0.3 --json out.json
+
+A synthetic gesture for a word runs through its key centres, each moved by
+Gaussian noise (--noise, in key widths), sampled at an uneven pointer speed
+with a little sideways wobble, the way a finger or mouse drifts. Words are
+picked by frequency, like a user typing them. No display is needed; NumPy
+is required.
+"""
+
+import argparse
+import json
+import math
+import platform
+import random
+import sys
+import time
+
+from bench_common import metric, summarize
+from bench_prediction import synthetic_lexicon
+from layout_engine import DEFAULT_LAYOUT, load_layout
+from prediction import WordIndex, read_word_list
+import swipe
+
+
+def synthetic_gesture(decoder, word, rng, noise):
+    """Pointer path (layout grid units) a user might draw for word"""
+    span = decoder.key_span
+    centres = {key.text.lower(): (key.col + key.span / 2, key.row + 0.5)
+               for key in decoder.layer.keys if swipe.is_letter_key(key)}
+    # Where the pointer actually passed each key, noise in key widths
+    vertices = []
+    for letter in word.replace("'", ''):
+        x, y = centres[letter]
+        vertices.append((x + rng.gauss(0, noise) * span, y + rng.gauss(0, noise) / swipe.ROW_ASPECT))
+
+    points = [vertices[0]]
+    for (x0, y0), (x1, y1) in zip(vertices, vertices[1:]):
+        distance = math.hypot((x1 - x0) / span, (y1 - y0) * swipe.ROW_ASPECT)
+        # 3-12 pointer events per key width travelled
+        steps = max(1, int(distance * rng.uniform(3, 12)))
+        wobble = rng.gauss(0, noise / 2)
+        for step in range(1, steps + 1):
+            t = step / steps
+            # Sideways drift that is largest mid-segment
+            bend = wobble * math.sin(math.pi * t)
+            points.append((x0 + (x1 - x0) * t + bend * span * 0.3,
+                           y0 + (y1 - y0) * t + bend / swipe.ROW_ASPECT))
+    if len(points) == 1:
+        points.append((points[0][0] + 0.01, points[0][1]))
+    return points
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--words', help="word list to decode against instead of a synthetic lexicon")
+    parser.add_argument('--size', type=int, default=50_000, help="synthetic lexicon size")
+    parser.add_argument('--layout', default=DEFAULT_LAYOUT)
+    parser.add_argument('--gestures', type=int, default=1000, help="gestures to decode")
+    parser.add_argument('--noise', type=float, default=0.25,
+                        help="standard deviation of where each key is passed, in key widths")
+    parser.add_argument('--k', type=int, default=4, help="alternates counted for top-k accuracy")
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--json', help="write results to this file")
+    args = parser.parse_args()
+
+    if not swipe.available():
+        sys.exit("NumPy is required for swipe typing (pip install numpy)")
+
+    weights = read_word_list(args.words) if args.words else synthetic_lexicon(args.size)
+    index = WordIndex.build(weights)
+    layout = load_layout(args.layout)
+    decoder = swipe.SwipeDecoder(layout.layers[layout.default_layer])
+    decoder.build(swipe.index_lexicon(index))
+
+    # Only words the layer can spell, more than one letter, picked by frequency
+    rng = random.Random(args.seed)
+    words = [w for w in decoder.words if len(w.replace("'", '')) > 1]
+    picks = rng.choices(words, [weights[w] for w in words], k=args.gestures)
+    gestures = [synthetic_gesture(decoder, word, rng, args.noise) for word in picks]
+
+    top1 = topk = 0
+    samples = []
+    for word, gesture in zip(picks, gestures):
+        start = time.perf_counter()
+        result = decoder.decode(gesture, args.k)
+        samples.append(time.perf_counter() - start)
+        # Words with the same key path (e.g. "lose"/"loose") can't be told apart
+        top1 += bool(result) and result[0] == word
+        topk += word in result
+    latency = summarize(samples)
+
+    results = {
+        'lexicon_words': metric(len(decoder.words), 'words', better='higher'),
+        'template_build_ms': metric(decoder.build_ms, 'ms'),
+        'template_kb': metric(decoder.templates.nbytes / 1024, 'KiB'),
+        'top1_accuracy': metric(100.0 * top1 / args.gestures, '%', better='higher'),
+        f'top{args.k}_accuracy': metric(100.0 * topk / args.gestures, '%', better='higher'),
+        'decode_p50_ms': metric(latency['p50_ms'], 'ms'),
+        'decode_p95_ms': metric(latency['p95_ms'], 'ms'),
+        'decode_max_ms': metric(latency['max_ms'], 'ms'),
+        'mean_candidates': metric(decoder.candidates / decoder.decodes, 'words'),
+    }
+    for name, r in results.items():
+        print(f"{name:32s} {r['value']:12.3f} {r['unit']}")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'python': platform.python_version(), 'machine': platform.machine(),
+                       'noise': args.noise, 'metrics': results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
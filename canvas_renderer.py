@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+"""
+Single-Canvas key renderer for the Floating On-Screen Keyboard.
+
+Instead of one tk.Button per key, a layer is drawn as rectangles and text
+items on one tk.Canvas. Key rectangles are precomputed from the compiled
+layout, presses are hit-tested through a per-row interval index, and a
+window resize is applied to every item with one canvas.scale() call.
+
+Each key is represented by a CanvasKey that accepts the same configure()
+options the keyboard uses for buttons (text, bg, fg, relief,
+activebackground), so the precomputed state tables and diff-only repaint
+in FloatingKeyboard drive both renderers unchanged.
+"""
+
+import tkinter as tk
+from bisect import bisect_right
+
+
+class CanvasKey:
+    """Canvas items for one key, configurable like a tk.Button"""
+
+    __slots__ = ('canvas', 'rect', 'label', 'options', 'command')
+
+    def __init__(self, canvas, rect, label, options, command):
+        self.canvas = canvas
+        self.rect = rect
+        self.label = label
+        self.options = options
+        self.command = command
+
+    def configure(self, **options):
+        self.options.update(options)
+        rect_options = {}
+        if 'bg' in options:
+            rect_options['fill'] = options['bg']
+        if 'relief' in options or ('fg' in options and self.options.get('relief') == 'sunken'):
+            # Sunken keys (active Shift/Caps) get an outline instead of a 3D border
+            sunken = self.options.get('relief') == 'sunken'
+            rect_options['outline'] = self.options.get('fg', '') if sunken else ''
+            rect_options['width'] = 2 if sunken else 0
+        if rect_options:
+            self.canvas.itemconfigure(self.rect, **rect_options)
+
+        text_options = {}
+        if 'text' in options:
+            text_options['text'] = options['text']
+        if 'fg' in options:
+            text_options['fill'] = options['fg']
+        if text_options:
+            self.canvas.itemconfigure(self.label, **text_options)
+
+    config = configure
+
+    def cget(self, name):
+        return self.options.get(name)
+
+    def set_pressed(self, pressed):
+        """Pressed-state feedback, same colors a tk.Button uses while held"""
+        fill = self.options.get('activebackground') if pressed else self.options.get('bg')
+        if fill:
+            self.canvas.itemconfigure(self.rect, fill=fill)
+
+    def destroy(self):
+        self.canvas.delete(self.rect, self.label)
+
+
+class CanvasLayer:
+    """Draws one compiled layout layer on a Canvas and dispatches presses"""
+
+    # Gap between keys in pixels at the initial size (like the buttons' padx/pady)
+    PAD = 1
+
+    def __init__(self, canvas, layer, font_for, on_key, width, height, on_hold=None,
+                 on_release=None):
+        self.canvas = canvas
+        self.layer = layer
+        # Optional press-and-hold hooks: on_hold(spec) on press, on_release() on release
+        self.on_hold = on_hold
+        self.on_release = on_release
+        self._specs = {}
+        self.width = max(1, width)
+        self.height = max(1, height)
+        self.keys = {}
+        self._pressed = None
+
+        # Spatial index: per row, key start columns (sorted) and the keys themselves
+        self._row_starts = [[] for _ in range(layer.rows)]
+        self._row_keys = [[] for _ in range(layer.rows)]
+
+        col_w = self.width / layer.columns
+        row_h = self.height / max(1, layer.rows)
+        for spec in sorted(layer.keys, key=lambda k: (k.row, k.col)):
+            x0 = spec.col * col_w + self.PAD
+            y0 = spec.row * row_h + self.PAD
+            x1 = (spec.col + spec.span) * col_w - self.PAD
+            y1 = (spec.row + 1) * row_h - self.PAD
+            rect = canvas.create_rectangle(x0, y0, x1, y1, fill='#f0f0f0', outline='', width=0)
+            label = canvas.create_text((x0 + x1) / 2, (y0 + y1) / 2, text=spec.label,
+                                       font=font_for(spec.font_size))
+            options = {'text': spec.label, 'bg': '#f0f0f0', 'activebackground': '#d0d0d0',
+                       'relief': 'raised'}
+            key = CanvasKey(canvas, rect, label, options, on_key(spec))
+            self.keys[(spec.text, spec.keysym)] = key
+            self._specs[key] = spec
+            self._row_starts[spec.row].append(spec.col)
+            self._row_keys[spec.row].append((spec.col + spec.span, key))
+
+        canvas.bind('<Configure>', self._on_configure)
+        canvas.bind('<ButtonPress-1>', self._on_press)
+        canvas.bind('<ButtonRelease-1>', self._on_release)
+
+    def key_at(self, x, y):
+        """Hit-test canvas coordinates against the key rectangles"""
+        row = int(y * self.layer.rows / self.height)
+        if not 0 <= row < self.layer.rows:
+            return None
+        col = x * self.layer.columns / self.width
+        index = bisect_right(self._row_starts[row], col) - 1
+        if index < 0:
+            return None
+        end, key = self._row_keys[row][index]
+        return key if col < end else None
+
+    def _on_configure(self, event):
+        # One scale of every item instead of re-laying out each key
+        if event.width <= 1 or event.height <= 1:
+            return
+        sx = event.width / self.width
+        sy = event.height / self.height
+        if sx != 1.0 or sy != 1.0:
+            self.canvas.scale('all', 0, 0, sx, sy)
+            self.width = event.width
+            self.height = event.height
+
+    def _on_press(self, event):
+        key = self.key_at(event.x, event.y)
+        self._pressed = key
+        if key is not None:
+            key.set_pressed(True)
+            if self.on_hold is not None:
+                self.on_hold(self._specs[key])
+
+    def _on_release(self, event):
+        key = self._pressed
+        self._pressed = None
+        if key is None:
+            return
+        key.set_pressed(False)
+        if self.on_release is not None:
+            self.on_release()
+        # Like a button, only fire if released over the key that was pressed
+        if self.key_at(event.x, event.y) is key:
+            key.command()
+
+
+def create_canvas(parent, bg):
+    """Canvas configured for key rendering"""
+    return tk.Canvas(parent, bg=bg, highlightthickness=0, bd=0)
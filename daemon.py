@@ -0,0 +1,257 @@
+#!/usr/bin/env python3
+"""
+Resident daemon mode for the Floating On-Screen Keyboard.
+
+`floating_keyboard.py --daemon` builds the keyboard once, keeps it
+withdrawn and listens on a Unix domain socket. The client side,
+`floating_keyboard.py --toggle` (or --show, --hide, --status, --quit),
+sends one JSON line and waits for a one-line JSON reply. The client path in
+this module imports only the standard library pieces it needs - never
+tkinter or the keyboard modules - so it returns in milliseconds.
+"""
+
+import json
+import os
+import socket
+import stat
+import time
+
+CLIENT_COMMANDS = ('toggle', 'show', 'hide', 'status', 'quit')
+
+# A control connection that has not sent its command line by then, or
+# sends more than MAX_COMMAND_BYTES without a newline, is dropped
+CLIENT_TIMEOUT_MS = 2000
+MAX_COMMAND_BYTES = 4096
+
+
+class DaemonError(Exception):
+    """Raised when the control socket can't be set up"""
+
+
+def socket_path(kind='control'):
+    """Per-user, per-display socket path ('control' for the daemon, 'api' for scripting)"""
+    runtime = os.environ.get('XDG_RUNTIME_DIR') or '/tmp'
+    display = os.environ.get('DISPLAY', '').replace(':', '').replace('/', '_') or 'default'
+    name = 'zorin-keyboard' if kind == 'control' else f'zorin-keyboard-{kind}'
+    return os.path.join(runtime, f'{name}-{os.getuid()}-{display}.sock')
+
+
+def claim_socket_path(path):
+    """Remove a stale socket left by a process that died; DaemonError if one is live"""
+    try:
+        mode = os.lstat(path).st_mode
+    except FileNotFoundError:
+        return
+    except OSError as e:
+        raise DaemonError(f"cannot use {path}: {e}") from e
+    # Never delete anything else a mistyped --socket/--api-socket points at
+    if not stat.S_ISSOCK(mode):
+        raise DaemonError(f"{path} exists and is not a socket")
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        try:
+            sock.connect(path)
+        except OSError:
+            os.unlink(path)
+            return
+    raise DaemonError(f"another keyboard is already listening on {path}")
+
+
+def listen_socket(path, backlog):
+    """Unix socket listening on path, connectable by this user only"""
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    # Created 0600 by bind() itself: a chmod afterwards would leave a window
+    # in which another user could connect (the path may be in /tmp)
+    umask = os.umask(0o177)
+    try:
+        sock.bind(path)
+        sock.listen(backlog)
+    except OSError:
+        sock.close()
+        raise
+    finally:
+        os.umask(umask)
+    return sock
+
+
+def send_command(command, path=None, timeout=2.0):
+    """Send one command to the running daemon and return its reply"""
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.settimeout(timeout)
+        sock.connect(path or socket_path())
+        sock.sendall(json.dumps({'command': command}).encode() + b'\n')
+        reply = b''
+        while not reply.endswith(b'\n'):
+            chunk = sock.recv(4096)
+            if not chunk:
+                break
+            reply += chunk
+    return json.loads(reply)
+
+
+def run_client_command(argv):
+    """Handle --toggle/--show/--hide/--status/--quit; None if argv has none of them"""
+    command = None
+    path = None
+    for i, arg in enumerate(argv):
+        if arg.startswith('--') and arg[2:] in CLIENT_COMMANDS:
+            command = arg[2:]
+        elif arg == '--socket' and i + 1 < len(argv):
+            path = argv[i + 1]
+        elif arg.startswith('--socket='):
+            path = arg.split('=', 1)[1]
+    if command is None:
+        return None
+
+    start = time.perf_counter()
+    try:
+        reply = send_command(command, path)
+    except (OSError, ValueError) as e:
+        print(f"Error contacting keyboard daemon: {e}")
+        print("Start it with: python floating_keyboard.py --daemon")
+        return 1
+    if command == 'status':
+        reply['client_roundtrip_ms'] = round((time.perf_counter() - start) * 1000, 3)
+        print(json.dumps(reply, indent=2))
+    elif not reply.get('ok'):
+        print(f"Error from keyboard daemon: {reply.get('error')}")
+    return 0 if reply.get('ok') else 1
+
+
+class _Client:
+    """One control connection and the part of its command line read so far"""
+
+    __slots__ = ('sock', 'inbuf', 'timer')
+
+    def __init__(self, sock):
+        self.sock = sock
+        self.inbuf = b''
+        self.timer = None
+
+
+class ControlServer:
+    """Answers control commands on the Tk mainloop through a file handler
+
+    handlers maps command names to callables returning a dict that is merged
+    into the reply. Each connection carries one command line; its socket is
+    read without blocking as data arrives, so a slow or stuck client never
+    holds the mainloop.
+    """
+
+    def __init__(self, root, handlers, path=None):
+        import tkinter
+
+        self.root = root
+        self.handlers = handlers
+        self.path = path or socket_path()
+        self.commands = 0
+        self.command_ms = {}
+        self.clients = {}
+
+        claim_socket_path(self.path)
+        try:
+            self.sock = listen_socket(self.path, 8)
+        except OSError as e:
+            raise DaemonError(f"cannot listen on {self.path}: {e}") from e
+        self.sock.setblocking(False)
+        root.tk.createfilehandler(self.sock, tkinter.READABLE, self._on_readable)
+
+    def _on_readable(self, sock, mask):
+        import tkinter
+
+        try:
+            conn, _ = self.sock.accept()
+        except BlockingIOError:
+            return
+        conn.setblocking(False)
+        client = _Client(conn)
+        client.timer = self.root.after(CLIENT_TIMEOUT_MS, self._drop, client)
+        self.clients[conn.fileno()] = client
+        self.root.tk.createfilehandler(conn, tkinter.READABLE,
+                                       lambda sock, mask: self._on_client(client))
+
+    def _on_client(self, client):
+        """Read what the client sent so far; answer once its line is complete"""
+        try:
+            data = client.sock.recv(MAX_COMMAND_BYTES)
+        except BlockingIOError:
+            return
+        except OSError:
+            data = b''
+        client.inbuf += data
+        if b'\n' in client.inbuf or not data:
+            line = client.inbuf.split(b'\n', 1)[0]
+            reply = self.encode(self.handle(line)) if line.strip() else None
+        elif len(client.inbuf) > MAX_COMMAND_BYTES:
+            reply = self.encode({'ok': False, 'error': "command line too long"})
+        else:
+            return
+        # A handler may have closed the server, and with it this connection
+        if reply is not None and client.sock is not None:
+            try:
+                # A one-line reply fits the socket buffer of a fresh connection
+                client.sock.send(reply)
+            except OSError:
+                pass
+        self._drop(client)
+
+    def _drop(self, client):
+        if client.sock is None:
+            return
+        try:
+            self.root.after_cancel(client.timer)
+            self.root.tk.deletefilehandler(client.sock)
+        except Exception:
+            # Tk may already be gone
+            pass
+        self.clients.pop(client.sock.fileno(), None)
+        client.sock.close()
+        client.sock = None
+
+    def handle(self, line):
+        """Run one JSON command line and build its reply"""
+        start = time.perf_counter()
+        try:
+            command = json.loads(line)['command']
+            handler = self.handlers[command]
+        except (ValueError, KeyError, TypeError, RecursionError):
+            return {'ok': False, 'error': f"unknown command: {line[:80]!r}"}
+        reply = {'ok': True}
+        try:
+            reply.update(handler() or {})
+        except Exception as e:
+            print(f"Error handling {command} command: {e}")
+            return {'ok': False, 'error': f"{command} failed: {e}"}
+        elapsed = (time.perf_counter() - start) * 1000.0
+        self.commands += 1
+        self.command_ms.setdefault(command, []).append(elapsed)
+        reply['ms'] = round(elapsed, 3)
+        return reply
+
+    def encode(self, reply):
+        """A reply as one JSON line; an error reply if it can't be encoded"""
+        try:
+            return json.dumps(reply).encode() + b'\n'
+        except (TypeError, ValueError) as e:
+            return json.dumps({'ok': False, 'error': f"reply not encodable: {e}"}).encode() + b'\n'
+
+    def stats(self):
+        """Per-command count and mean handling time in ms"""
+        return {name: {'count': len(ms), 'mean_ms': round(sum(ms) / len(ms), 3)}
+                for name, ms in self.command_ms.items()}
+
+    def close(self):
+        if self.sock is None:
+            return
+        for client in list(self.clients.values()):
+            self._drop(client)
+        try:
+            self.root.tk.deletefilehandler(self.sock)
+        except Exception:
+            # Tk may already be gone
+            pass
+        self.sock.close()
+        self.sock = None
+        try:
+            os.unlink(self.path)
+        except OSError:
+            pass
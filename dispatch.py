@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+"""
+Keystroke dispatch for the Floating On-Screen Keyboard.
+
+Injection (window activation plus the keystroke itself) can block for tens
+of milliseconds, so it runs on a dedicated worker thread instead of inside
+Tk button callbacks. The UI thread enqueues KeyJobs into a bounded FIFO and
+the worker injects them strictly in order, reporting each result through a
+callback that the keyboard marshals back onto the Tk mainloop.
+
+In front of the queue, a BurstCoalescer merges runs of printable characters
+typed in quick succession into a single 'type' job (one activation, one
+injection call).
+"""
+
+import queue
+import threading
+from collections import Counter
+
+from latency import stamp
+
+
+class KeyJob:
+    """One injection: activate the target window, then type text or tap a key"""
+
+    __slots__ = ('window', 'kind', 'payload', 'traces', 'count', 'callback')
+
+    def __init__(self, window, kind, payload, traces=None, count=1, callback=None):
+        self.window = window
+        self.kind = kind          # 'type' text, 'key' keysym, 'chord' tuple of keysyms
+        self.payload = payload
+        self.traces = traces      # KeyTraces to stamp, None when tracing is off
+        self.count = count        # 'key' taps, > 1 for batched auto-repeats
+        self.callback = callback  # called on the Tk thread as callback(job, error) when done
+
+    def __repr__(self):
+        return f"KeyJob({self.window!r}, {self.kind!r}, {self.payload!r})"
+
+
+class KeyDispatcher:
+    """Single worker thread that injects queued KeyJobs in strict FIFO order"""
+
+    def __init__(self, backend, on_done, maxsize=64, focus=None):
+        self.backend = backend
+        # Optional FocusCache; activation is skipped while the target keeps focus
+        self.focus = focus
+        # Called on the worker thread as on_done(job, error) after every job
+        self.on_done = on_done
+        self.jobs = queue.Queue(maxsize=maxsize)
+        self.dropped = 0
+        self._thread = threading.Thread(target=self._run, name='key-dispatcher', daemon=True)
+        self._thread.start()
+
+    def submit(self, job):
+        """Enqueue a job without blocking; returns False when the queue is full"""
+        try:
+            self.jobs.put_nowait(job)
+        except queue.Full:
+            self.dropped += 1
+            return False
+        return True
+
+    def depth(self):
+        """Number of jobs waiting to be injected"""
+        return self.jobs.qsize()
+
+    def inject(self, job):
+        """Deliver one job through the backend"""
+        traces = job.traces
+        if traces:
+            stamp(traces, 'dequeued')
+        if self.focus is None or self.focus.needs_activation(job.window):
+            self.backend.activate(job.window)
+        if traces:
+            stamp(traces, 'activated')
+        if job.kind == 'type':
+            self.backend.type_text(job.payload)
+        elif job.kind == 'chord':
+            self.backend.chord(job.payload)
+        elif job.count > 1:
+            self.backend.key(job.payload, repeat=job.count)
+        else:
+            self.backend.key(job.payload)
+        if traces:
+            stamp(traces, 'injected')
+
+    def _run(self):
+        while True:
+            job = self.jobs.get()
+            if job is None:
+                break
+            error = None
+            try:
+                self.inject(job)
+            except Exception as e:
+                error = e
+            self.on_done(job, error)
+
+    def stop(self, timeout=1.0):
+        """Ask the worker to exit once the jobs already queued are injected"""
+        try:
+            self.jobs.put(None, timeout=timeout)
+        except queue.Full:
+            return
+        self._thread.join(timeout)
+
+
+class BurstCoalescer:
+    """Buffers consecutive printable characters and injects them as one 'type' job
+
+    The first buffered character starts a timer of window_ms; when it fires,
+    or when a special key, modifier or target change arrives, the buffer is
+    flushed as a single KeyJob so ordering with other keys is preserved.
+    A window_ms of 0 disables coalescing (every character is its own job).
+    """
+
+    def __init__(self, submit, schedule, cancel, window_ms=30, max_chars=64):
+        self.submit = submit          # submit(job) -> bool
+        self.schedule = schedule      # schedule(ms, callback) -> timer handle
+        self.cancel = cancel          # cancel(timer handle)
+        self.window_ms = window_ms
+        self.max_chars = max_chars
+        self._window = None
+        self._chars = []
+        self._traces = []
+        self._timer = None
+
+        # Tuning statistics
+        self.injections = 0
+        self.chars = 0
+        self.max_burst = 0
+        self.flushes = Counter()
+        self.burst_sizes = Counter()
+
+    def add(self, window, char, trace=None):
+        """Buffer one printable character destined for window"""
+        if self._chars and window != self._window:
+            self.flush('target')
+        self._window = window
+        self._chars.append(char)
+        if trace is not None:
+            self._traces.append(trace)
+        if self.window_ms <= 0:
+            self.flush('immediate')
+            return
+        if len(self._chars) >= self.max_chars:
+            self.flush('full')
+        elif self._timer is None:
+            self._timer = self.schedule(self.window_ms, self._on_timeout)
+
+    def _on_timeout(self):
+        self._timer = None
+        self.flush('timeout')
+
+    def flush(self, reason='special'):
+        """Inject whatever is buffered now; returns the submit result (True if empty)"""
+        if self._timer is not None:
+            self.cancel(self._timer)
+            self._timer = None
+        if not self._chars:
+            return True
+        text = ''.join(self._chars)
+        traces = self._traces or None
+        self._chars = []
+        self._traces = []
+        self.injections += 1
+        self.chars += len(text)
+        self.max_burst = max(self.max_burst, len(text))
+        self.flushes[reason] += 1
+        self.burst_sizes[len(text)] += 1
+        return self.submit(KeyJob(self._window, 'type', text, traces))
+
+    def retract(self, count):
+        """Take back up to count of the last buffered characters; returns how many"""
+        removed = min(count, len(self._chars))
+        if removed:
+            del self._chars[-removed:]
+            # With tracing on every buffered character has a trace
+            del self._traces[len(self._chars):]
+        return removed
+
+    def pending(self):
+        """Number of characters waiting in the buffer"""
+        return len(self._chars)
+
+    def stats(self):
+        """Characters-per-injection and flush statistics"""
+        return {
+            'window_ms': self.window_ms,
+            'injections': self.injections,
+            'chars': self.chars,
+            'chars_per_injection': round(self.chars / self.injections, 2) if self.injections else 0.0,
+            'max_burst': self.max_burst,
+            'flushes': dict(self.flushes),
+            'burst_sizes': dict(sorted(self.burst_sizes.items())),
+        }
@@ -0,0 +1,218 @@
+#!/usr/bin/env python3
+"""
+Fan-out (broadcast) mode for the Floating On-Screen Keyboard.
+
+In fan-out mode every keystroke goes to a set of target windows instead of
+one, e.g. to drive several terminals or remote sessions in step. Only one
+window can hold the input focus, so nothing is activated: the backend
+delivers keys straight to each window (InjectionBackend.deliver).
+
+Each target has its own worker thread, FIFO queue and backend instance (an
+X connection belongs to one thread), so targets are served in parallel
+while every single target still receives keys in the order they were
+typed. A slow target only backs up its own queue. A job counts as done once
+every target has handled it; targets whose window was destroyed are
+dropped from the set.
+"""
+
+import queue
+import threading
+import time
+from collections import deque
+
+from latency import percentile, stamp
+
+# Per-target injection times kept for the latency stats
+LATENCY_SAMPLES = 512
+
+
+class _Broadcast:
+    """One KeyJob on its way to several targets"""
+
+    __slots__ = ('job', 'remaining', 'started', 'error', 'lock')
+
+    def __init__(self, job, targets):
+        self.job = job
+        self.remaining = targets
+        self.started = False
+        self.error = None
+        self.lock = threading.Lock()
+
+    def start(self):
+        """True for the first target to pick the job up"""
+        with self.lock:
+            first = not self.started
+            self.started = True
+            return first
+
+    def done(self, error):
+        """Record one target's result; True for the last target to finish"""
+        with self.lock:
+            if error is not None and self.error is None:
+                self.error = error
+            self.remaining -= 1
+            return self.remaining == 0
+
+
+class TargetWorker:
+    """Worker thread delivering broadcast jobs to one window, strictly in order"""
+
+    def __init__(self, window, name, backend, on_done, maxsize=64):
+        self.window = window
+        self.name = name
+        self.backend = backend
+        # Called on this worker's thread as on_done(worker, broadcast, error)
+        self.on_done = on_done
+        self.jobs = queue.Queue(maxsize=maxsize)
+        self.sent = 0
+        self.failures = 0
+        self.last_error = None
+        # Set once the window is gone; queued jobs are then skipped
+        self.dead = False
+        self.reported_dead = False
+        self.latencies = deque(maxlen=LATENCY_SAMPLES)
+        self._thread = threading.Thread(target=self._run, name=f'fanout-{window}', daemon=True)
+        self._thread.start()
+
+    def _alive(self):
+        try:
+            return self.backend.window_exists(self.window)
+        except Exception:
+            # Can't tell: keep the target and let the next key try again
+            return True
+
+    def _run(self):
+        try:
+            while True:
+                broadcast = self.jobs.get()
+                if broadcast is None:
+                    break
+                job = broadcast.job
+                if job.traces and broadcast.start():
+                    stamp(job.traces, 'dequeued')
+                    stamp(job.traces, 'activated')
+                error = None
+                if not self.dead:
+                    start = time.perf_counter()
+                    try:
+                        self.backend.deliver(self.window, job.kind, job.payload, job.count)
+                        self.latencies.append((time.perf_counter() - start) * 1000.0)
+                        self.sent += 1
+                    except Exception as e:
+                        error = e
+                        self.failures += 1
+                        self.last_error = str(e)
+                        self.dead = not self._alive()
+                self.on_done(self, broadcast, error)
+        finally:
+            self.backend.close()
+
+    def stop(self):
+        """Exit once the jobs already queued are handled"""
+        self.jobs.put(None)
+
+    def join(self, timeout=None):
+        self._thread.join(timeout)
+
+    def stats(self):
+        ms = sorted(self.latencies)
+        return {
+            'name': self.name,
+            'sent': self.sent,
+            'failures': self.failures,
+            'last_error': self.last_error,
+            'dead': self.dead,
+            'p50_ms': round(percentile(ms, 50), 3) if ms else None,
+            'p95_ms': round(percentile(ms, 95), 3) if ms else None,
+            'max_ms': round(ms[-1], 3) if ms else None,
+        }
+
+
+class FanoutDispatcher:
+    """Broadcasts KeyJobs to a set of target windows, one TargetWorker each
+
+    Same submit/depth/stop interface as KeyDispatcher, so the keyboard can
+    hand jobs to whichever one is in use.
+    """
+
+    def __init__(self, backend_factory, on_done, on_dead=None, maxsize=64):
+        # backend_factory() returns a new backend for each target's worker
+        self.backend_factory = backend_factory
+        # Called on a worker thread as on_done(job, error) once all targets handled job
+        self.on_done = on_done
+        # Called on a worker thread as on_dead(window) when a target window is gone
+        self.on_dead = on_dead
+        self.maxsize = maxsize
+        self.workers = {}
+        # Stats of targets that have left the set
+        self.removed = {}
+        self.broadcasts = 0
+        self.dropped = 0
+
+    def add_target(self, window, name=''):
+        """Start a worker for window; False if it is already a target"""
+        window = str(window)
+        if window in self.workers:
+            return False
+        backend = self.backend_factory()
+        self.removed.pop(window, None)
+        self.workers[window] = TargetWorker(window, name, backend, self._on_worker_done, self.maxsize)
+        return True
+
+    def remove_target(self, window):
+        """Drop window from the set; jobs still queued for it are skipped"""
+        worker = self.workers.pop(str(window), None)
+        if worker is None:
+            return False
+        worker.reported_dead = True
+        worker.dead = True
+        worker.stop()
+        self.removed[worker.window] = worker
+        return True
+
+    def targets(self):
+        return [(worker.window, worker.name) for worker in self.workers.values()]
+
+    def submit(self, job):
+        """Queue job for every target; returns False (nothing queued) if any queue is full"""
+        workers = list(self.workers.values())
+        # Only the Tk thread submits, so a queue can't fill up between check and put
+        if not workers or any(worker.jobs.full() for worker in workers):
+            self.dropped += 1
+            return False
+        broadcast = _Broadcast(job, len(workers))
+        for worker in workers:
+            worker.jobs.put_nowait(broadcast)
+        self.broadcasts += 1
+        return True
+
+    def depth(self):
+        """Jobs waiting for the most backed-up target"""
+        return max((worker.jobs.qsize() for worker in self.workers.values()), default=0)
+
+    def _on_worker_done(self, worker, broadcast, error):
+        if worker.dead and not worker.reported_dead:
+            worker.reported_dead = True
+            if self.on_dead is not None:
+                self.on_dead(worker.window)
+        if broadcast.done(error):
+            if broadcast.job.traces:
+                stamp(broadcast.job.traces, 'injected')
+            self.on_done(broadcast.job, broadcast.error)
+
+    def stats(self):
+        """Per-target delivery counts, failures and injection latency"""
+        stats = {'broadcasts': self.broadcasts, 'dropped': self.dropped, 'targets': {}}
+        for window, worker in list(self.removed.items()) + list(self.workers.items()):
+            entry = worker.stats()
+            entry['removed'] = window in self.removed
+            stats['targets'][window] = entry
+        return stats
+
+    def stop(self, timeout=1.0):
+        """Stop all workers once the jobs already queued are delivered"""
+        workers = list(self.workers.values())
+        for worker in workers:
+            worker.stop()
+        for worker in workers:
+            worker.join(timeout)
@@ -4,23 +4,152 @@ Floating On-Screen Keyboard
 A resizable, always-on-top virtual keyboard that sends keystrokes to the focused window.
 """
 
-import tkinter as tk
+import argparse
+import gc
+import json
+import os
+import shutil
+import signal
 import subprocess
+import sys
+import time
+
+if __name__ == "__main__":
+    # --toggle/--show/--hide only talk to a running daemon's socket, so they
+    # are answered before tkinter and the keyboard modules are imported
+    from daemon import run_client_command
+    status = run_client_command(sys.argv[1:])
+    if status is not None:
+        sys.exit(status)
+
+import tkinter as tk
+import tkinter.font as tkfont
+
+from canvas_renderer import CanvasLayer, create_canvas
+from daemon import ControlServer, DaemonError
+from dispatch import BurstCoalescer, KeyDispatcher, KeyJob
+from fanout import FanoutDispatcher
+from hibernation import ACTIVE, HIBERNATED, HibernationMonitor, count_widgets, trim_heap
+from injection import InjectionError, create_backend
+from journal import JournalWriter, Replayer, load_journals
+from latency import LatencyTracer, process_age_ms, resident_memory_kb, stamp
+from layout_engine import DEFAULT_LAYOUT, load_layout
+from modifiers import LATCHED, STICKY_KEYSYMS, StickyModifiers
+from prediction import create_predictor
+from script_api import ScriptServer
+from snippets import SnippetStore, expansion
+from swipe import SWIPE_START, SwipeDecoder, index_lexicon, available as swipe_available
+from window_tracker import ActiveWindowTracker, FocusCache
+from x11 import XError
 
 
 class FloatingKeyboard:
-    def __init__(self):
+    # Geometry updates from drag/resize are applied at most once per frame
+    FRAME_MS = 16
+    
+    # Keys that never auto-repeat while held
+    NO_REPEAT = frozenset(('Shift_L', 'Shift_R', 'Caps_Lock', 'Control_L', 'Control_R',
+                           'Alt_L', 'Alt_R', 'Super_L', 'Super_R'))
+    
+    def __init__(self, backend=None, queue_size=64, coalesce_ms=30, tracer=None,
+                 latency_overlay=False, layout_path=DEFAULT_LAYOUT, renderer='buttons',
+                 track_active_window=True, predictor=None, repeat_delay_ms=400, repeat_rate=25,
+                 daemon=False, socket_path=None, api=False, api_socket=None, journal=None,
+                 swipe_lexicon=None, snippets=None, idle_hibernate_s=300):
         self.root = tk.Tk()
         self.root.title("On-Screen Keyboard")
         
+        # Keystroke injection backend (XTest in-process, or xdotool fallback)
+        self.backend = backend if backend is not None else create_backend()
+        
+        # Focus and stacking as last seen in X events, so unchanged focus isn't
+        # re-activated and an unobscured keyboard isn't re-raised for every key
+        self.focus_cache = FocusCache()
+        
+        # Injection runs on a worker thread so the UI never blocks on it
+        self.dispatcher = KeyDispatcher(self.backend, self._on_key_dispatched, maxsize=queue_size,
+                                        focus=self.focus_cache)
+        
+        # Fan-out mode: while this holds any targets, keys are broadcast to all
+        # of them in parallel (each with its own backend) instead of the target
+        self.fanout = FanoutDispatcher(lambda: type(self.backend)(), self._on_key_dispatched,
+                                       on_dead=self._on_fanout_dead, maxsize=queue_size)
+        
+        # Printable characters typed in quick succession go out as one injection
+        self.coalescer = BurstCoalescer(self.submit_job, self.root.after, self.root.after_cancel,
+                                        window_ms=coalesce_ms)
+        
+        # Press-and-hold auto-repeat (repeat_rate of 0 disables it). Repeats
+        # pile up in _repeat_pending while a repeat job is being injected and
+        # go out as one batched injection when it finishes
+        self.repeat_delay_ms = repeat_delay_ms
+        self.repeat_interval_ms = max(1, round(1000 / repeat_rate)) if repeat_rate else 0
+        self._repeat_timer = None
+        self._repeat_key = None
+        self._repeat_fired = None
+        self._repeat_sent = None
+        self._repeat_pending = 0
+        self._repeat_job = None
+        self.last_sent = None
+        self.repeats_sent = 0
+        self.repeat_injections = 0
+        
+        # Daemon mode: stay resident and withdrawn, shown and hidden over a socket
+        self.daemon = daemon
+        self.socket_path = socket_path
+        self.control_server = None
+        self.startup_ms = None
+        self.visible = not daemon
+        
+        # Optional JSON-lines scripting API (started in run())
+        self.api = api
+        self.api_socket = api_socket
+        self.script_server = None
+        
+        # Optional word prediction (None = no suggestion bar)
+        self.predictor = predictor
+        
+        # Optional per-keypress latency tracing (None = disabled, no overhead)
+        self.tracer = tracer
+        self.metrics_path = None
+        self._signal_pipe = None
+        
+        # Optional keystroke journal (JournalWriter) and a Replayer set up by main()
+        self.journal = journal
+        self.replayer = None
+        self.jobs_submitted = 0
+        self.jobs_finished = 0
+        
+        # Optional text snippets (SnippetStore), expanded as abbreviations are typed
+        self.snippets = snippets
+        self.snippet_menu = None
+        
+        # Idle hibernation: minimized or hidden this long without input (0 = never),
+        # the keys and their cached state are dropped until the keyboard is restored
+        self.idle_hibernate_ms = int(idle_hibernate_s * 1000)
+        self.hibernated = False
+        self.hibernation = HibernationMonitor()
+        self.snapshot = None
+        self.last_input = time.monotonic()
+        self._idle_timer = None
+        self._tracker_suspended = False
+        
         # Track target window - must be set BEFORE override_redirect
         self.target_window = None
+        self.target_name = ''
         self.keyboard_window_id = None
         
+        # Active window follows _NET_ACTIVE_WINDOW events (started in run())
+        self.track_active_window = track_active_window
+        self.window_tracker = None
+        
         # Track shift and caps state
         self.shift_active = False
         self.caps_active = False
         
+        # Ctrl/Alt/Win latch or lock and are sent as chords with the next key
+        self.modifiers = StickyModifiers()
+        
         # Color Themes
         self.themes = {
             'dark': {
@@ -60,9 +189,39 @@ class FloatingKeyboard:
         # Variables for dragging
         self._drag_x = 0
         self._drag_y = 0
+        self._drag_origin = (0, 0)
+        
+        # Pending geometry for throttled drag/resize (applied once per frame)
+        self._pending_position = None
+        self._pending_size = None
+        self._geometry_job = None
+        
+        # Keys share one named font per size class, so rescaling touches
+        # a couple of Font objects instead of reconfiguring every button
+        self.key_fonts = {}
+        self.key_font_sizes = {}
+        self.font_scale = 1.0
+        
+        # Compiled layout; layers are built the first time they are shown
+        # either as tk.Buttons ('buttons') or drawn on a single Canvas ('canvas')
+        self.layout = load_layout(layout_path)
+        self.renderer = renderer
+        self.layers = {}
+        self.active_layer = None
         self.is_minimized = False
         self.restored_height = 250
         
+        # Optional swipe typing on the default layer; its word templates are
+        # built in the background from swipe_lexicon ((word, frequency) pairs)
+        self.swipe = None
+        if swipe_lexicon is not None:
+            self.swipe = SwipeDecoder(self.layout.layers[self.layout.default_layer])
+            self.swipe.start(swipe_lexicon)
+        self._gesture = None
+        self._gesture_frame = None
+        self.swipe_consumed = False
+        self.swipe_sent = None
+        
         # Title bar for dragging - Packed at BOTTOM
         self.title_bar = tk.Frame(self.root, bg='#404040', height=25)
         self.title_bar.pack(fill='x', side='bottom')
@@ -80,7 +239,7 @@ class FloatingKeyboard:
         # Auto width to fit text
         button_padding = 2
         close_btn = tk.Button(self.title_bar, text='X', bg='#404040', fg='white', 
-                              bd=0, font=('Arial', 3), command=self.root.quit,
+                              bd=0, font=('Arial', 3), command=self.close,
                               activebackground='#cc0000', activeforeground='white',
                               padx=button_padding)
         # Increased right padding to avoid overlap with resize grip
@@ -102,42 +261,92 @@ class FloatingKeyboard:
                                  padx=2)
         self.theme_btn.pack(side='right', padx=2)
         
+        # Layer button - cycles through the layers defined by the layout
+        self.layer_btn = tk.Button(self.title_bar, text=self.layout.layers[self.layout.default_layer].title,
+                                   bg='#404040', fg='white', bd=0, font=('Arial', 3),
+                                   command=self.next_layer, activebackground='#606060',
+                                   activeforeground='white', padx=2)
+        self.layer_btn.pack(side='right', padx=2)
+        
         # Select window button
         select_btn = tk.Button(self.title_bar, text='Select Window', bg='#505050', fg='white',
                                bd=0, font=('Arial', 3), command=self.select_target_window,
                                activebackground='#606060')
         select_btn.pack(side='right', padx=10)
         
+        # Add a window to the fan-out set (keys go to every window in it)
+        fanout_btn = tk.Button(self.title_bar, text='+ Window', bg='#505050', fg='white',
+                               bd=0, font=('Arial', 3), command=self.add_fanout_target,
+                               activebackground='#606060')
+        fanout_btn.pack(side='right', padx=2)
+        
+        # Snippet menu (only with --snippets)
+        if self.snippets is not None:
+            snippet_btn = tk.Button(self.title_bar, text='Snippets', bg='#505050', fg='white',
+                                    bd=0, font=('Arial', 3), command=self.show_snippet_menu,
+                                    activebackground='#606060')
+            snippet_btn.pack(side='right', padx=2)
+        
         # Status label
         self.status_label = tk.Label(self.title_bar, text='No target', bg='#404040', fg='#aaaaaa', font=('Arial', 3))
         self.status_label.pack(side='right', padx=5)
         
+        # Fan-out target count (blank when not broadcasting), click to clear the set
+        self.fanout_label = tk.Label(self.title_bar, text='', bg='#404040', fg='#aaaaaa', font=('Arial', 3))
+        self.fanout_label.pack(side='right', padx=5)
+        self.fanout_label.bind('<Button-1>', self.clear_fanout)
+        
+        # Dispatch queue depth (blank while the queue is empty)
+        self.queue_label = tk.Label(self.title_bar, text='', bg='#404040', fg='#aaaaaa', font=('Arial', 3))
+        self.queue_label.pack(side='right', padx=5)
+        
+        # Latency overlay (only when tracing with --latency-overlay)
+        self.latency_label = None
+        if self.tracer is not None and latency_overlay:
+            self.latency_label = tk.Label(self.title_bar, text=self.tracer.overlay_text(),
+                                          bg='#404040', fg='#aaaaaa', font=('Arial', 3))
+            self.latency_label.pack(side='right', padx=5)
+        
         # Bind drag events to title bar
         self.title_bar.bind('<Button-1>', self.start_drag)
         self.title_bar.bind('<B1-Motion>', self.do_drag)
         title_label.bind('<Button-1>', self.start_drag)
         title_label.bind('<B1-Motion>', self.do_drag)
         
-        # Main frame
+        # Suggestion bar above the keys, one button per completion slot
+        self.suggestion_bar = None
+        self.suggestion_buttons = []
+        self.suggestion_words = []
+        if self.predictor is not None:
+            self.suggestion_bar = tk.Frame(self.root, bg='#2b2b2b', height=24)
+            self.suggestion_bar.pack(fill='x', side='top', padx=2, pady=(2, 0))
+            self.suggestion_bar.pack_propagate(False)
+            for i in range(self.predictor.k):
+                button = tk.Button(self.suggestion_bar, text='', bd=0, font=self.key_font(3),
+                                   command=lambda i=i: self.pick_suggestion(i))
+                button.pack(side='left', fill='both', expand=True, padx=1)
+                self.suggestion_buttons.append(button)
+        
+        # Main frame - holds one frame per built layer, only the active one packed
         self.main_frame = tk.Frame(self.root, bg='#2b2b2b')
         self.main_frame.pack(fill='both', expand=True, padx=2, pady=2)
         
-        # Configure rows to expand
-        for i in range(5):
-            self.main_frame.grid_rowconfigure(i, weight=1)
-            
-        # Stop grid propagation so buttons don't force frame size
-        self.main_frame.grid_propagate(False)
+        # Stop propagation so buttons don't force frame size
+        self.main_frame.pack_propagate(False)
         
         # Shift character mappings
-        self.shift_map = {
-            '`': '~', '1': '!', '2': '@', '3': '#', '4': '$', '5': '%',
-            '6': '^', '7': '&', '8': '*', '9': '(', '0': ')', '-': '_',
-            '=': '+', '[': '{', ']': '}', '\\': '|', ';': ':', "'": '"',
-            ',': '<', '.': '>', '/': '?'
-        }
+        self.shift_map = self.layout.shift_map
         
+        # Buttons of the active layer, keyed by (text, keycode)
         self.buttons = {}
+        self.key_labels = {}
+        
+        # Precomputed key options per (shift, caps, modifiers, theme) state, and
+        # the options currently applied to each button, for diff-only repaints
+        self.state_tables = {}
+        self.applied_options = {}
+        self.configure_count = 0
+        self.last_repaint_configures = 0
         self.create_keyboard()
         
         # Resize grip
@@ -146,17 +355,59 @@ class FloatingKeyboard:
         self.resize_grip.bind('<Button-1>', self.start_resize)
         self.resize_grip.bind('<B1-Motion>', self.do_resize)
         
+        # VisibilityNotify/UnmapNotify on the toplevel tell us when the
+        # keyboard needs re-raising after a keystroke
+        self.root.bind('<Visibility>', self.on_visibility)
+        self.root.bind('<Unmap>', self.on_visibility)
+        
         # Apply initial theme
         self.apply_theme()
     
+    def on_visibility(self, event):
+        # Children inherit the root's bindings; only the toplevel matters here
+        if event.widget is not self.root:
+            return
+        self.focus_cache.obscured = (event.type != tk.EventType.Visibility
+                                     or event.state != 'VisibilityUnobscured')
+    
     def start_drag(self, event):
-        self._drag_x = event.x
-        self._drag_y = event.y
+        # Remember where the window and pointer started, so motion events
+        # don't need to query the window position again
+        self._drag_x = event.x_root
+        self._drag_y = event.y_root
+        self._drag_origin = (self.root.winfo_x(), self.root.winfo_y())
     
     def do_drag(self, event):
-        x = self.root.winfo_x() + event.x - self._drag_x
-        y = self.root.winfo_y() + event.y - self._drag_y
-        self.root.geometry(f"+{x}+{y}")
+        x = self._drag_origin[0] + event.x_root - self._drag_x
+        y = self._drag_origin[1] + event.y_root - self._drag_y
+        self._pending_position = (x, y)
+        self.schedule_geometry()
+    
+    def schedule_geometry(self):
+        """Apply pending drag/resize geometry on the next frame"""
+        if self._geometry_job is None:
+            self._geometry_job = self.root.after(self.FRAME_MS, self.apply_pending_geometry)
+    
+    def apply_pending_geometry(self):
+        """Apply the latest drag position and/or resize in a single geometry call"""
+        self._geometry_job = None
+        size, position = self._pending_size, self._pending_position
+        self._pending_size = self._pending_position = None
+        geometry = ''
+        if size is not None:
+            geometry += f"{size[0]}x{size[1]}"
+        if position is not None:
+            geometry += f"+{position[0]}+{position[1]}"
+        if geometry:
+            self.root.geometry(geometry)
+        if size is not None:
+            self.update_font_size(size[0])
+    
+    def cancel_pending_geometry(self):
+        if self._geometry_job is not None:
+            self.root.after_cancel(self._geometry_job)
+            self._geometry_job = None
+        self._pending_size = self._pending_position = None
     
     def toggle_minimize(self):
         """Toggle between minimized (title bar only) and restored state"""
@@ -168,15 +419,21 @@ class FloatingKeyboard:
             
             self.root.geometry(f"{self.root.winfo_width()}x{self.restored_height}+{self.root.winfo_x()}+{new_y}")
             self.main_frame.pack(fill='both', expand=True, padx=2, pady=2, side='top')
+            if self.suggestion_bar is not None:
+                self.suggestion_bar.pack(fill='x', side='top', padx=2, pady=(2, 0), before=self.main_frame)
             self.resize_grip.place(relx=1.0, rely=1.0, anchor='se')
             self.min_btn.configure(text='-')
             self.is_minimized = False
+            self.cancel_hibernation()
+            self.wake()
         else:
             # Minimize
             self.restored_height = self.root.winfo_height()
             y_now = self.root.winfo_y()
             
             self.main_frame.pack_forget()
+            if self.suggestion_bar is not None:
+                self.suggestion_bar.pack_forget()
             self.resize_grip.place_forget()
             
             # Calculate new y to keep bottom edge constant
@@ -186,6 +443,8 @@ class FloatingKeyboard:
             self.root.geometry(f"{self.root.winfo_width()}x25+{self.root.winfo_x()}+{new_y}")
             self.min_btn.configure(text='+')
             self.is_minimized = True
+            self.last_input = time.monotonic()
+            self.schedule_hibernation()
 
     def start_resize(self, event):
         if self.is_minimized:
@@ -200,6 +459,7 @@ class FloatingKeyboard:
         """Reset window to default size"""
         # Only reset if not minimized
         if not self.is_minimized:
+            self.cancel_pending_geometry()
             # Default size from __init__
             self.root.geometry("920x250")
             # Update internal resize tracking
@@ -209,33 +469,46 @@ class FloatingKeyboard:
             self.update_font_size(920)
 
     def do_resize(self, event):
+        if self.is_minimized:
+            return
         new_w = max(500, self._resize_w + (event.x_root - self._resize_x))
         new_h = max(150, self._resize_h + (event.y_root - self._resize_y))
-        self.root.geometry(f"{new_w}x{new_h}")
-        self.update_font_size(new_w)
+        self._pending_size = (new_w, new_h)
+        self.schedule_geometry()
+        
+    def key_font(self, base_size):
+        """Shared named font for keys of the given base size class"""
+        font = self.key_fonts.get(base_size)
+        if font is None:
+            size = max(1, int(base_size * self.font_scale))
+            font = tkfont.Font(root=self.root, family='Arial', size=size)
+            self.key_fonts[base_size] = font
+            self.key_font_sizes[base_size] = size
+        return font
         
     def update_font_size(self, width):
         """Update font size based on window width"""
         # Base width is 920, so scale factor is width / 920
-        # But let's scale bit more aggressively for small sizes
         scale = width / 920.0
+        self.font_scale = scale
+        
+        for base_size, font in self.key_fonts.items():
+            # 3 is the standard size. If scale is 0.65 (600/920), 3 * 0.65 = 1.95 -> 1
+            new_size = max(1, int(base_size * scale))
+            # Every key using this font picks up the change
+            if self.key_font_sizes[base_size] != new_size:
+                font.configure(size=new_size)
+                self.key_font_sizes[base_size] = new_size
         
-        for btn in self.buttons.values():
-            if hasattr(btn, 'base_font_size'):
-                # 3 is the standard size. If scale is 0.65 (600/920), 3 * 0.65 = 1.95 -> 1
-                new_size = max(1, int(btn.base_font_size * scale))
-                current_font = btn.cget('font')
-                # Check if we need to update (font is a string or tuple)
-                # Tkinter returns font as string usually, but we set it as tuple
-                # Simple check: just update it, it's cheap enough
-                btn.configure(font=('Arial', new_size))
-        
-    def create_key(self, parent, text, keycode, row, col, colspan=1, font_size=3):
+    def create_key(self, parent, text, keycode, row, col, colspan=1, font_size=3, label=None,
+                   layer=None):
         """Create a single key button"""
+        label = label or text
+        command = self.key_command(text, keycode, layer)
         btn = tk.Button(
             parent,
-            text=text,
-            font=('Arial', font_size),
+            text=label,
+            font=self.key_font(font_size),
             bg='#f0f0f0',
             activebackground='#d0d0d0',
             relief='raised',
@@ -244,81 +517,302 @@ class FloatingKeyboard:
             pady=0,
             highlightthickness=0,
             takefocus=False,
-            command=lambda: self.on_key_press(keycode, text)
+            command=command
         )
         btn.grid(row=row, column=col, columnspan=colspan, sticky='nsew', padx=1, pady=1)
-        btn.base_font_size = font_size
+        if layer is None and keycode not in self.NO_REPEAT:
+            btn.bind('<ButtonPress-1>', lambda event: self.start_repeat(keycode, text))
+            btn.bind('<ButtonRelease-1>', self.stop_repeat)
+        if self.swipe is not None and layer is None:
+            self.bind_swipe(btn)
         self.buttons[(text, keycode)] = btn
+        if label != text:
+            self.key_labels[(text, keycode)] = label
+        self.applied_options[(text, keycode)] = {'text': label, 'bg': '#f0f0f0',
+                                                 'activebackground': '#d0d0d0', 'relief': 'raised'}
         return btn
         
+    def key_command(self, text, keycode, layer=None):
+        """Callback for a key: switch layer or press the key"""
+        if layer is not None:
+            return lambda: self.show_layer(layer)
+        return lambda: self.tap_key(keycode, text)
+    
+    def tap_key(self, keycode, display):
+        """Key released over itself: a normal press, unless holding it already repeated"""
+        # The release that ends a swipe is not a key press
+        if self.swipe_consumed:
+            return
+        if self._repeat_fired == (keycode, display):
+            self._repeat_fired = None
+            return
+        self.on_key_press(keycode, display)
+    
+    def start_repeat(self, keycode, display):
+        """Key pressed down: start auto-repeat if it is still held after the delay"""
+        self.stop_repeat()
+        self._repeat_fired = None
+        if not self.repeat_interval_ms:
+            return
+        self._repeat_key = (keycode, display)
+        self._repeat_timer = self.root.after(self.repeat_delay_ms, self._repeat_first)
+    
+    def _repeat_first(self):
+        # The held key's own press goes out now instead of on release
+        keycode, display = self._repeat_key
+        self._repeat_fired = self._repeat_key
+        self.last_sent = None
+        self.on_key_press(keycode, display)
+        self._repeat_sent = self.last_sent
+        # Chords (sticky modifiers) are sent once, not repeated
+        if not isinstance(self._repeat_sent, str):
+            self._repeat_timer = None
+            return
+        self._repeat_timer = self.root.after(self.repeat_interval_ms, self._repeat_tick)
+    
+    def _repeat_tick(self):
+        sent = self._repeat_sent
+        self.repeats_sent += 1
+        if len(sent) == 1:
+            # Characters are already batched by the coalescer
+            self.send_key(sent)
+        else:
+            if self.predictor is not None and self.predictor.feed(sent):
+                self.update_suggestions()
+            if self.snippets is not None:
+                self.snippets.feed(sent)
+            self._repeat_pending += 1
+            self.flush_repeats()
+        self._repeat_timer = self.root.after(self.repeat_interval_ms, self._repeat_tick)
+    
+    def stop_repeat(self, event=None):
+        """Key released: stop repeating and send what is still pending"""
+        if self._repeat_timer is not None:
+            self.root.after_cancel(self._repeat_timer)
+            self._repeat_timer = None
+        self._repeat_key = None
+        # Don't let pending repeats land after whatever key comes next
+        self.flush_repeats(force=True)
+    
+    def flush_repeats(self, force=False):
+        """Send accumulated repeats of the held key as one batched injection"""
+        if not self._repeat_pending:
+            return
+        if not self.has_target():
+            # Nowhere to send them; they must not be sent to a target picked later
+            self._repeat_pending = 0
+            return
+        if self._repeat_job is not None and not force:
+            return
+        self.coalescer.flush('special')
+        job = KeyJob(self.target_window, 'key', self._repeat_sent, count=self._repeat_pending)
+        self._repeat_pending = 0
+        if self.submit_job(job):
+            self._repeat_job = job
+            self.repeat_injections += 1
+        
     def create_keyboard(self):
-        """Create the keyboard layout"""
-        # Use 30 columns total for fine-grained control
-        for i in range(30):
-            self.main_frame.grid_columnconfigure(i, weight=1, uniform='key')
-        
-        # Row 0: Number row
-        keys_row0 = [('`', 'grave'), ('1', '1'), ('2', '2'), ('3', '3'), ('4', '4'),
-                     ('5', '5'), ('6', '6'), ('7', '7'), ('8', '8'), ('9', '9'),
-                     ('0', '0'), ('-', 'minus'), ('=', 'equal')]
-        col = 0
-        for text, keycode in keys_row0:
-            self.create_key(self.main_frame, text, keycode, 0, col, colspan=2)
-            col += 2
-        self.create_key(self.main_frame, 'Backspace', 'BackSpace', 0, col, colspan=4, font_size=2)
-        
-        # Row 1: Tab + QWERTY
-        self.create_key(self.main_frame, 'Tab', 'Tab', 1, 0, colspan=3, font_size=2)
-        keys_row1 = ['q', 'w', 'e', 'r', 't', 'y', 'u', 'i', 'o', 'p']
-        col = 3
-        for key in keys_row1:
-            self.create_key(self.main_frame, key, key, 1, col, colspan=2)
-            col += 2
-        self.create_key(self.main_frame, '[', 'bracketleft', 1, col, colspan=2)
-        col += 2
-        self.create_key(self.main_frame, ']', 'bracketright', 1, col, colspan=2)
-        col += 2
-        self.create_key(self.main_frame, '\\', 'backslash', 1, col, colspan=3)
-        
-        # Row 2: Caps + ASDF
-        self.create_key(self.main_frame, 'Caps', 'Caps_Lock', 2, 0, colspan=4, font_size=2)
-        keys_row2 = ['a', 's', 'd', 'f', 'g', 'h', 'j', 'k', 'l']
-        col = 4
-        for key in keys_row2:
-            self.create_key(self.main_frame, key, key, 2, col, colspan=2)
-            col += 2
-        self.create_key(self.main_frame, ';', 'semicolon', 2, col, colspan=2)
-        col += 2
-        self.create_key(self.main_frame, "'", 'apostrophe', 2, col, colspan=2)
-        col += 2
-        self.create_key(self.main_frame, 'Enter', 'Return', 2, col, colspan=4, font_size=2)
-        
-        # Row 3: Shift + ZXCV
-        self.create_key(self.main_frame, 'Shift', 'Shift_L', 3, 0, colspan=5, font_size=2)
-        keys_row3 = ['z', 'x', 'c', 'v', 'b', 'n', 'm']
-        col = 5
-        for key in keys_row3:
-            self.create_key(self.main_frame, key, key, 3, col, colspan=2)
-            col += 2
-        self.create_key(self.main_frame, ',', 'comma', 3, col, colspan=2)
-        col += 2
-        self.create_key(self.main_frame, '.', 'period', 3, col, colspan=2)
-        col += 2
-        self.create_key(self.main_frame, '/', 'slash', 3, col, colspan=2)
-        col += 2
-        self.create_key(self.main_frame, 'Shift', 'Shift_R', 3, col, colspan=5, font_size=2)
-        
-        # Row 4: Bottom row
-        self.create_key(self.main_frame, 'Ctrl', 'Control_L', 4, 0, colspan=3, font_size=2)
-        self.create_key(self.main_frame, 'Win', 'Super_L', 4, 3, colspan=3, font_size=2)
-        self.create_key(self.main_frame, 'Alt', 'Alt_L', 4, 6, colspan=3, font_size=2)
-        self.create_key(self.main_frame, 'Space', 'space', 4, 9, colspan=12, font_size=2)
-        self.create_key(self.main_frame, 'Alt', 'Alt_R', 4, 21, colspan=3, font_size=2)
-        self.create_key(self.main_frame, 'Win', 'Super_R', 4, 24, colspan=3, font_size=2)
-        self.create_key(self.main_frame, 'Ctrl', 'Control_R', 4, 27, colspan=3, font_size=2)
+        """Create the keyboard layout (only the default layer is built up front)"""
+        self.show_layer(self.layout.default_layer)
     
-    def select_target_window(self):
-        """Let user click to select target window"""
+    def build_layer(self, name):
+        """Build the widgets of one layout layer and keep them for later switches"""
+        spec = self.layout.layers[name]
+        rss_before = resident_memory_kb()
+        
+        if self.renderer == 'canvas':
+            frame, widgets = self.build_canvas_layer(spec)
+        else:
+            frame, widgets = self.build_button_layer(spec)
+        
+        layer = {
+            'frame': frame,
+            'buttons': self.buttons,
+            'applied': self.applied_options,
+            'tables': None,
+            'widgets': widgets,
+            'rss_kb': 0,
+        }
+        self.layers[name] = layer
+        self.build_state_tables()
+        layer['tables'] = self.state_tables
+        layer['rss_kb'] = max(0, resident_memory_kb() - rss_before)
+        return layer
+    
+    def build_button_layer(self, spec):
+        """One tk.Button per key, gridded in a frame"""
+        frame = tk.Frame(self.main_frame, bg=self.themes[self.current_theme]['bg'])
+        # Uniform columns for fine-grained control, rows expand evenly
+        for i in range(spec.columns):
+            frame.grid_columnconfigure(i, weight=1, uniform='key')
+        for i in range(spec.rows):
+            frame.grid_rowconfigure(i, weight=1)
+        # Stop grid propagation so buttons don't force frame size
+        frame.grid_propagate(False)
+        
+        # create_key registers into self.buttons/applied_options, point them at this layer
+        self.buttons = {}
+        self.applied_options = {}
+        for key in spec.keys:
+            self.create_key(frame, key.text, key.keysym, key.row, key.col, colspan=key.span,
+                            font_size=key.font_size, label=key.label, layer=key.layer)
+        return frame, len(self.buttons) + 1
+    
+    def build_canvas_layer(self, spec):
+        """Whole layer drawn on one Canvas; keys are canvas items, not widgets"""
+        canvas = create_canvas(self.main_frame, self.themes[self.current_theme]['bg'])
+        # Draw at the current keyboard size, the canvas rescales on <Configure>
+        width = self.main_frame.winfo_width()
+        height = self.main_frame.winfo_height()
+        if width <= 1 or height <= 1:
+            width, height = 916, 221
+        renderer = CanvasLayer(canvas, spec, self.key_font,
+                               lambda key: self.key_command(key.text, key.keysym, key.layer),
+                               width, height, on_hold=self.hold_canvas_key,
+                               on_release=self.stop_repeat)
+        
+        # CanvasKeys stand in for buttons, so state tables and repaints work unchanged
+        self.buttons = renderer.keys
+        self.applied_options = {k: dict(key.options) for k, key in renderer.keys.items()}
+        for key in spec.keys:
+            if key.label != key.text:
+                self.key_labels[(key.text, key.keysym)] = key.label
+        canvas.renderer = renderer
+        if self.swipe is not None:
+            self.bind_swipe(canvas)
+        return canvas, 1
+    
+    def hold_canvas_key(self, spec):
+        if spec.layer is None and spec.keysym not in self.NO_REPEAT:
+            self.start_repeat(spec.keysym, spec.text)
+    
+    def show_layer(self, name):
+        """Switch the visible layer, building it on first use"""
+        if self.hibernated:
+            # Built when the keyboard is restored
+            self.snapshot['layer'] = name
+            self.layer_btn.configure(text=self.layout.layers[name].title)
+            return
+        if name == self.active_layer:
+            return
+        layer = self.layers.get(name) or self.build_layer(name)
+        if self.active_layer in self.layers:
+            self.layers[self.active_layer]['frame'].pack_forget()
+        layer['frame'].pack(fill='both', expand=True)
+        
+        self.active_layer = name
+        self.buttons = layer['buttons']
+        self.applied_options = layer['applied']
+        self.state_tables = layer['tables']
+        # Bring the layer up to date with the current Shift/Caps/theme state
+        self.update_key_display()
+        self.layer_btn.configure(text=self.layout.layers[name].title)
+    
+    def next_layer(self):
+        """Cycle to the next layer in layout order"""
+        names = list(self.layout.layers)
+        current = self.snapshot['layer'] if self.hibernated else self.active_layer
+        index = names.index(current) if current in names else -1
+        self.show_layer(names[(index + 1) % len(names)])
+    
+    def destroy_layers(self):
+        """Destroy every built layer (they are rebuilt lazily on next show)"""
+        for layer in self.layers.values():
+            layer['frame'].destroy()
+        self.layers = {}
+        self.active_layer = None
+        self.buttons = {}
+        self.applied_options = {}
+        self.state_tables = {}
+    
+    def layer_stats(self):
+        """Widget count and memory of built layers, split into visible and hidden"""
+        stats = {'layers': {}, 'hidden_widgets': 0, 'hidden_rss_kb': 0}
+        for name in self.layout.layers:
+            layer = self.layers.get(name)
+            visible = name == self.active_layer
+            stats['layers'][name] = {
+                'built': layer is not None,
+                'visible': visible,
+                'widgets': layer['widgets'] if layer else 0,
+                'rss_kb': layer['rss_kb'] if layer else 0,
+            }
+            if layer and not visible:
+                stats['hidden_widgets'] += layer['widgets']
+                stats['hidden_rss_kb'] += layer['rss_kb']
+        return stats
+    
+    def key_options(self, display, keycode, shift, caps, theme_name, modifier=None):
+        """Widget options for one key in a given Shift/Caps/theme state
+        
+        modifier is the LATCHED/LOCKED state of a sticky modifier key.
+        """
+        theme = self.themes[theme_name]
+        options = {'fg': theme['key_fg'], 'activebackground': theme['active_bg']}
+        
+        # Shift/caps button colors
+        if keycode in ('Shift_L', 'Shift_R'):
+            options['bg'] = theme['shift_bg'] if shift else theme['key_bg']
+            options['relief'] = 'sunken' if shift else 'raised'
+            return options
+        if keycode == 'Caps_Lock':
+            options['bg'] = theme['caps_bg'] if caps else theme['key_bg']
+            options['relief'] = 'sunken' if caps else 'raised'
+            return options
+        # Latched modifiers look like one-shot Shift, locked ones like Caps Lock
+        if modifier is not None:
+            options['bg'] = theme['shift_bg'] if modifier == LATCHED else theme['caps_bg']
+            options['relief'] = 'sunken'
+            options['text'] = self.key_labels.get((display, keycode), display)
+            return options
+        
+        options['bg'] = theme['key_bg']
+        options['relief'] = 'raised'
+        
+        # Determine display text based on state
+        new_text = self.key_labels.get((display, keycode), display)
+        if len(display) == 1:
+            # Shift state
+            if shift:
+                if display in self.shift_map:
+                    new_text = self.shift_map[display]
+                elif display.isalpha():
+                    new_text = display.upper()
+            # Normal state (respecting Caps Lock for letters)
+            elif display.isalpha():
+                new_text = display.upper() if caps else display.lower()
+        options['text'] = new_text
+        return options
+    
+    def build_state_tables(self):
+        """Precompute the options of every key for each (shift, caps, theme) state
+        
+        Tables for states with sticky modifiers active are added on first use
+        by modifier_table.
+        """
+        self.state_tables = {}
+        for theme_name in self.themes:
+            for shift in (False, True):
+                for caps in (False, True):
+                    self.state_tables[(shift, caps, (), theme_name)] = {
+                        key: self.key_options(key[0], key[1], shift, caps, theme_name)
+                        for key in self.buttons
+                    }
+    
+    def modifier_table(self, state):
+        """State table with sticky modifiers active: the base table with those keys restyled"""
+        shift, caps, modifiers, theme_name = state
+        table = dict(self.state_tables[(shift, caps, (), theme_name)])
+        active = dict(modifiers)
+        for key in self.buttons:
+            if key[1] in active:
+                table[key] = self.key_options(key[0], key[1], shift, caps, theme_name, active[key[1]])
+        self.state_tables[state] = table
+        return table
+    
+    def pick_window(self):
+        """Let user click a window; returns (window, name), window None if nothing was picked"""
+        window, name = None, ''
         try:
             # Hide keyboard temporarily
             self.root.withdraw()
@@ -327,13 +821,11 @@ class FloatingKeyboard:
             # Use xdotool to let user select a window
             result = subprocess.run(['xdotool', 'selectwindow'], capture_output=True, text=True)
             if result.stdout.strip():
-                self.target_window = result.stdout.strip()
+                window = result.stdout.strip()
                 # Get window name for display
-                name_result = subprocess.run(['xdotool', 'getwindowname', self.target_window],
+                name_result = subprocess.run(['xdotool', 'getwindowname', window],
                                             capture_output=True, text=True)
-                window_name = name_result.stdout.strip()[:20] if name_result.stdout.strip() else 'Unknown'
-                self.status_label.configure(text=f'Target: {window_name}', fg='#90EE90')
-                # print(f"Target window set: {self.target_window} ({window_name})")
+                name = name_result.stdout.strip()
             
             # Show keyboard again
             self.root.deiconify()
@@ -342,91 +834,683 @@ class FloatingKeyboard:
         except Exception as e:
             print(f"Error selecting window: {e}")
             self.root.deiconify()
+        return window, name
+    
+    def select_target_window(self):
+        """Let user click to select target window"""
+        window, name = self.pick_window()
+        if window is not None:
+            self.set_target_window(window, name)
+    
+    def set_target_window(self, window, name=''):
+        """Make window the keystroke target and show its name in the title bar"""
+        self.target_window = str(window)
+        self.target_name = name
+        self.status_label.configure(text=f'Target: {name.strip()[:20] or "Unknown"}',
+                                    fg='#90EE90' if self.current_theme == 'dark' else '#006400')
+    
+    def has_target(self):
+        """True if keys have somewhere to go (the target or a fan-out set)"""
+        return bool(self.target_window or self.fanout.workers)
+    
+    def add_fanout_target(self):
+        """Let user click a window to add to the fan-out set
+        
+        Starting a set includes the current target, so adding one window
+        broadcasts to it and to the window that was receiving keys.
+        """
+        window, name = self.pick_window()
+        if window is None:
+            return
+        # Keys typed so far belong to the previous destination
+        self.coalescer.flush('target')
+        if not self.fanout.workers and self.target_window and self.target_window != window:
+            self._start_fanout_worker(self.target_window, self.target_name)
+        self._start_fanout_worker(window, name)
+        self.update_fanout_label()
+    
+    def _start_fanout_worker(self, window, name):
+        try:
+            self.fanout.add_target(window, name)
+        except (InjectionError, XError, OSError) as e:
+            print(f"Error adding fan-out target: {e}")
+    
+    def clear_fanout(self, event=None):
+        """Leave fan-out mode, keys go to the single target again"""
+        self.coalescer.flush('target')
+        for window, _ in self.fanout.targets():
+            self.fanout.remove_target(window)
+        self.update_fanout_label()
+    
+    def _on_fanout_dead(self, window):
+        # Called from a fan-out worker when its window was destroyed
+        try:
+            self.root.after(0, self.drop_fanout_target, window)
+        except (RuntimeError, tk.TclError):
+            pass
+    
+    def drop_fanout_target(self, window):
+        """Remove a target whose window has gone away"""
+        if self.fanout.remove_target(window):
+            self.update_fanout_label()
+    
+    def update_fanout_label(self):
+        """Show the fan-out target count and how many targets have failures"""
+        targets = self.fanout.workers.values()
+        failing = sum(1 for worker in targets if worker.failures)
+        text = f'Fan-out: {len(targets)}' if targets else ''
+        if failing:
+            text += f' ({failing} failing)'
+        if self.fanout_label.cget('text') != text:
+            self.fanout_label.configure(text=text)
+    
+    def _on_active_window(self, window, name):
+        # Called from the tracker thread; hand the change to the Tk thread
+        try:
+            self.root.after(0, self.set_target_window, window, name)
+        except (RuntimeError, tk.TclError):
+            pass
+    
+    def own_window_ids(self):
+        """X ids of our toplevel and its frame, known from Tk without a name search"""
+        self.root.update_idletasks()
+        ids = {self.root.winfo_id()}
+        try:
+            frame_id = int(self.root.wm_frame(), 16)
+            ids.add(frame_id)
+            self.keyboard_window_id = str(frame_id)
+        except (ValueError, tk.TclError):
+            pass
+        return ids
+    
+    def start_window_tracker(self):
+        """Follow the active window via X events; False if X is not usable"""
+        try:
+            self.window_tracker = ActiveWindowTracker(self._on_active_window,
+                                                      exclude=self.own_window_ids(),
+                                                      focus=self.focus_cache)
+        except (XError, OSError) as e:
+            print(f"Error starting active window tracker: {e}")
+            return False
+        return True
     
     def get_target_window(self):
         """Get the window that should receive keystrokes"""
         try:
-            # Get our own window ID
-            if self.keyboard_window_id is None:
-                result = subprocess.run(['xdotool', 'search', '--name', 'On-Screen Keyboard'],
-                                       capture_output=True, text=True)
-                if result.stdout.strip():
-                    self.keyboard_window_id = result.stdout.strip().split()[0]
+            # Our own window IDs come straight from Tk
+            own_ids = {str(window) for window in self.own_window_ids()}
             
             # Get the currently active window
             result = subprocess.run(['xdotool', 'getactivewindow'], capture_output=True, text=True)
             current = result.stdout.strip()
             
             # If active window is not the keyboard, use it as target
-            if current and current != self.keyboard_window_id:
+            if current and current not in own_ids:
                 self.target_window = current
                 
         except Exception as e:
             print(f"Error getting target window: {e}")
     
-    def send_key(self, keycode):
-        """Send a key to the target window using xdotool"""
+    def send_key(self, keycode, trace=None):
+        """Queue a key for the dispatcher to send to the target window"""
+        if not self.has_target():
+            # print("No target window set. Click 'Select Window' first.")
+            return
+        if trace is not None:
+            trace.resolved = time.perf_counter()
+        self.last_sent = keycode
+        
+        # print(f"Sending '{keycode}' to window {self.target_window}")
+        
+        # Follow the word being typed for the suggestion bar
+        chord = isinstance(keycode, tuple)
+        if self.predictor is not None and self.predictor.feed('+'.join(keycode) if chord else keycode):
+            self.update_suggestions()
+        
+        if chord:
+            # Sticky modifiers plus a key: one chord injection
+            self.coalescer.flush('special')
+            self.submit_job(KeyJob(self.target_window, 'chord', keycode,
+                                   [trace] if trace is not None else None))
+        # For single printable characters, use type (buffered into bursts)
+        elif len(keycode) == 1:
+            self.coalescer.add(self.target_window, keycode, trace)
+        else:
+            # For special keys (BackSpace, Return, etc), use key
+            # Flush buffered text first so ordering is preserved
+            self.coalescer.flush('special')
+            self.submit_job(KeyJob(self.target_window, 'key', keycode,
+                                   [trace] if trace is not None else None))
+        
+        # A completed abbreviation is replaced by its snippet
+        if self.snippets is not None:
+            abbrev = self.snippets.feed(keycode)
+            if abbrev is not None:
+                self.expand_snippet(abbrev)
+    
+    def expand_snippet(self, abbrev):
+        """Replace a just-typed abbreviation with its snippet in a single injection"""
+        erase, text = expansion(abbrev, self.snippets.snippets[abbrev])
+        # Abbreviation characters still in the coalescer are simply never sent
+        erase -= self.coalescer.retract(erase)
+        self.insert_text('\b' * erase + text)
+        if self.predictor is not None:
+            self.predictor.reset()
+            self.update_suggestions()
+    
+    def insert_text(self, text):
+        """Type text in one injection, recording its latency with the snippet store"""
+        if not text or not self.has_target():
+            return
+        self.coalescer.flush('special')
+        started = time.perf_counter()
+        chars = len(text)
+        self.submit_job(KeyJob(self.target_window, 'type', text,
+                               callback=lambda job, error: self.snippets.injected(started, chars, error)))
+    
+    def show_snippet_menu(self):
+        """Pop up the snippets at the pointer, reloading the file if it changed"""
+        if self.hibernated:
+            # The window tracker is suspended, so ask X for the target now
+            self.get_target_window()
+        if self.snippet_menu is not None:
+            self.snippet_menu.destroy()
+        self.snippet_menu = tk.Menu(self.root, tearoff=0)
+        entries = self.snippets.menu()
+        if not entries:
+            self.snippet_menu.add_command(label='(no snippets)', state='disabled')
+        for label, abbrev in entries:
+            self.snippet_menu.add_command(label=label,
+                                          command=lambda abbrev=abbrev: self.insert_snippet(abbrev))
+        self.snippet_menu.tk_popup(self.root.winfo_pointerx(), self.root.winfo_pointery())
+    
+    def insert_snippet(self, abbrev):
+        """Menu pick: type a snippet's whole text"""
+        text = self.snippets.snippets.get(abbrev)
+        if text is None:
+            return
+        self.insert_text(text)
+        # What precedes the cursor is now the snippet, not a word being typed
+        self.snippets.reset()
+        if self.predictor is not None:
+            self.predictor.reset()
+            self.update_suggestions()
+    
+    def update_suggestions(self):
+        """Show completions of the current word"""
+        self.show_suggestions(self.predictor.suggestions())
+    
+    def show_suggestions(self, words):
+        """Label the suggestion slots with words, relabelling only changed slots"""
+        if words == self.suggestion_words:
+            return
+        self.suggestion_words = words
+        for i, button in enumerate(self.suggestion_buttons):
+            text = words[i] if i < len(words) else ''
+            if button.cget('text') != text:
+                button.configure(text=text)
+    
+    def pick_suggestion(self, index):
+        """Complete the current word with a suggestion in a single injection"""
+        if index >= len(self.suggestion_words) or not self.has_target():
+            return
+        word = self.suggestion_words[index]
+        if self.swipe_sent is not None:
+            # A swipe alternate replaces the word the swipe typed
+            self.submit_job(KeyJob(self.target_window, 'key', 'BackSpace', count=len(self.swipe_sent)))
+            self.submit_job(KeyJob(self.target_window, 'type', word + ' '))
+            self.predictor.learn(word)
+            previous = self.swipe_sent[:-1]
+            self.swipe_sent = word + ' '
+            self.show_suggestions([previous if w == word else w for w in self.suggestion_words])
+            return
+        text = self.predictor.pick(word) + ' '
+        # Characters still buffered belong before the completion
+        self.coalescer.flush('special')
+        self.submit_job(KeyJob(self.target_window, 'type', text))
+        if self.snippets is not None:
+            self.snippets.reset()
+        self.update_suggestions()
+    
+    def submit_job(self, job):
+        """Hand a job to the dispatcher, returns False if it had to be dropped"""
+        # In fan-out mode the job goes to every window in the set instead
+        dispatcher = self.fanout if self.fanout.workers else self.dispatcher
+        # Keys from the scripting API count as input as much as clicks do
+        self.last_input = time.monotonic()
+        if not dispatcher.submit(job):
+            # Queue is full: drop the key rather than freezing the UI
+            self.queue_label.configure(text='Queue full', fg='#ff6666')
+            return False
+        self.jobs_submitted += 1
+        self.update_queue_indicator()
+        return True
+    
+    def _on_key_dispatched(self, job, error):
+        """Dispatcher thread callback - hand the result over to the Tk mainloop"""
         try:
-            if not self.target_window:
-                # print("No target window set. Click 'Select Window' first.")
-                return
-            
-            # print(f"Sending '{keycode}' to window {self.target_window}")
-            
-            # Activate the target window first
-            subprocess.run(['xdotool', 'windowactivate', '--sync', self.target_window], 
-                          capture_output=True, check=False)
-            
-            # For single printable characters, use type
-            if len(keycode) == 1:
-                subprocess.run(['xdotool', 'type', '--clearmodifiers', keycode])
-            else:
-                # For special keys (BackSpace, Return, etc), use key
-                subprocess.run(['xdotool', 'key', '--clearmodifiers', keycode])
-            
-            # Bring keyboard back on top
+            self.root.after(0, self._finish_key, job, error)
+        except (RuntimeError, tk.TclError):
+            # Tk is already gone (keyboard closing)
+            pass
+    
+    def _finish_key(self, job, error):
+        """Runs on the Tk mainloop after the dispatcher injected a job"""
+        self.jobs_finished += 1
+        if isinstance(error, FileNotFoundError):
+            print("xdotool not found. Please install: sudo apt install xdotool")
+        elif isinstance(error, (subprocess.CalledProcessError, InjectionError)):
+            print(f"Error sending key: {error}")
+        elif error is not None:
+            print(f"Error sending key {job.payload!r}: {error}")
+        if error is not None and self.fanout.workers:
+            self.update_fanout_label()
+        
+        if job.callback is not None:
+            job.callback(job, error)
+        
+        # Repeats that piled up while this batch was injected go out as the next batch
+        if job is self._repeat_job:
+            self._repeat_job = None
+            self.flush_repeats()
+        
+        # Bring keyboard back on top once the queue has drained, if anything covered it
+        if self.queue_depth() == 0 and self.focus_cache.needs_raise():
             self.root.deiconify()
             self.root.lift()
             self.root.attributes('-topmost', True)
-                    
-        except subprocess.CalledProcessError as e:
-            print(f"Error sending key: {e}")
-        except FileNotFoundError:
-            print("xdotool not found. Please install: sudo apt install xdotool")
+        if job.traces:
+            self.finish_traces(job.traces)
+        self.update_queue_indicator()
+    
+    def finish_traces(self, traces):
+        """Record finished key traces and refresh the latency overlay"""
+        stamp(traces, 'restored')
+        for trace in traces:
+            self.tracer.record(trace)
+        if self.latency_label is not None:
+            self.latency_label.configure(text=self.tracer.overlay_text())
+    
+    def watch_signals(self):
+        """Dump metrics on SIGUSR1, even while Tk is asleep waiting for events"""
+        # A Python signal handler only runs once Tk hands control back to the
+        # interpreter, which an idle keyboard never does; the wakeup fd gets the
+        # signal number written to it right away and wakes Tk up instead
+        read_fd, write_fd = os.pipe()
+        os.set_blocking(read_fd, False)
+        os.set_blocking(write_fd, False)
+        signal.set_wakeup_fd(write_fd)
+        signal.signal(signal.SIGUSR1, lambda signum, frame: None)
+        self.root.tk.createfilehandler(read_fd, tk.READABLE, self._on_signal)
+        self._signal_pipe = (read_fd, write_fd)
+    
+    def _on_signal(self, fd, mask):
+        try:
+            signals = os.read(fd, 64)
+        except BlockingIOError:
+            return
+        if signal.SIGUSR1 in signals:
+            self.dump_metrics()
+    
+    def unwatch_signals(self):
+        if self._signal_pipe is None:
+            return
+        signal.signal(signal.SIGUSR1, signal.SIG_DFL)
+        signal.set_wakeup_fd(-1)
+        try:
+            self.root.tk.deletefilehandler(self._signal_pipe[0])
+        except tk.TclError:
+            pass
+        for fd in self._signal_pipe:
+            os.close(fd)
+        self._signal_pipe = None
+    
+    def dump_metrics(self, path=None):
+        """Write latency metrics to path (JSON, or CSV for a .csv path)"""
+        path = path or self.metrics_path
+        if self.tracer is None or not path:
+            return
+        try:
+            self.tracer.dump(path)
+            print(f"Latency metrics written to {path}")
+        except OSError as e:
+            print(f"Error writing metrics: {e}")
+    
+    def queue_depth(self):
+        """Jobs waiting in the dispatcher plus the most backed-up fan-out target"""
+        return self.dispatcher.depth() + self.fanout.depth()
+    
+    def bind_swipe(self, widget):
+        """Record pointer paths over a key (button) or a whole canvas layer for swipe typing"""
+        widget.bind('<ButtonPress-1>', self.swipe_press, add='+')
+        widget.bind('<B1-Motion>', self.swipe_motion)
+        widget.bind('<ButtonRelease-1>', self.swipe_release, add='+')
+    
+    def _swipe_point(self, event):
+        # Pointer position in layout grid units (columns, rows); a pressed
+        # button grabs the pointer, so root coordinates are used throughout
+        x, y, width, height = self._gesture_frame
+        spec = self.swipe.layer
+        return ((event.x_root - x) * spec.columns / width, (event.y_root - y) * spec.rows / height)
+    
+    def swipe_press(self, event):
+        """Pointer down on a key: start recording what may become a swipe"""
+        self.swipe_consumed = False
+        self._gesture = None
+        if self.active_layer != self.swipe.layer.name:
+            return
+        frame = self.layers[self.active_layer]['frame']
+        self._gesture_frame = (frame.winfo_rootx(), frame.winfo_rooty(),
+                               max(1, frame.winfo_width()), max(1, frame.winfo_height()))
+        self._gesture = [self._swipe_point(event)]
+    
+    def swipe_motion(self, event):
+        if self._gesture is None:
+            return
+        self._gesture.append(self._swipe_point(event))
+        # Once the pointer has travelled far enough this is a swipe, not a key press
+        if not self.swipe_consumed and self.swipe.travel(self._gesture) >= SWIPE_START:
+            self.swipe_consumed = True
+            self.stop_repeat()
+    
+    def swipe_release(self, event):
+        gesture, self._gesture = self._gesture, None
+        if gesture is None or not self.swipe_consumed:
+            return
+        gesture.append(self._swipe_point(event))
+        self.type_swipe(gesture)
+    
+    def type_swipe(self, gesture):
+        """Type the best word for a gesture in one injection, offering the others as alternates"""
+        if not self.has_target():
+            return
+        words = self.swipe.decode(gesture, k=1 + len(self.suggestion_buttons))
+        if not words:
+            return
+        # Shift capitalizes the word, Caps Lock types it in capitals
+        if self.caps_active:
+            words = [w.upper() for w in words]
+        elif self.shift_active:
+            words = [w[:1].upper() + w[1:] for w in words]
+        self.coalescer.flush('special')
+        if self.predictor is not None:
+            self.predictor.commit()
+            self.predictor.learn(words[0])
+        text = words[0] + ' '
+        if self.submit_job(KeyJob(self.target_window, 'type', text)):
+            self.swipe_sent = text
+            if self.snippets is not None:
+                self.snippets.reset()
+            self.show_suggestions(words[1:])
+        if self.shift_active:
+            self.shift_active = False
+            self.update_key_display()
+    
+    def update_queue_indicator(self):
+        """Show how many keystrokes are waiting to be injected"""
+        depth = self.queue_depth()
+        theme = self.themes[self.current_theme]
+        text = f'Queue: {depth}' if depth else ''
+        if self.queue_label.cget('text') != text:
+            self.queue_label.configure(text=text, fg=theme['title_fg'])
     
     def on_key_press(self, keycode, display):
         """Handle key button press"""
+        trace = self.tracer.begin(keycode) if self.tracer is not None else None
+        self.last_input = time.monotonic()
+        if self.journal is not None:
+            self.journal.record(keycode, display, self.key_state())
+        if self.swipe_sent is not None:
+            # Typing on ends the chance to swap the swiped word for an alternate
+            self.swipe_sent = None
+            if self.predictor is not None:
+                self.show_suggestions(self.predictor.suggestions())
+        if keycode in ('Shift_L', 'Shift_R'):
+            self.coalescer.flush('modifier')
+        
+        state = self.key_state()
+        sent = self.resolve_key(keycode, display)
+        if sent is not None:
+            self.send_key(sent, trace)
+        if state != self.key_state():
+            self.update_key_display()
+    
+    def key_state(self):
+        """Shift, Caps and sticky modifier state, for detecting changes"""
+        return (self.shift_active, self.caps_active, self.modifiers.key())
+    
+    def resolve_key(self, keycode, display):
+        """Character or keysym a key press sends, updating Shift/Caps/modifier state
+
+        Returns None for keys that only change state (Shift, Ctrl, Alt, Win)
+        and a tuple of keysyms for a key pressed with sticky modifiers
+        active. The caller repaints the keys if the state changed.
+        """
         # Handle Shift
         if keycode in ('Shift_L', 'Shift_R'):
             self.shift_active = not self.shift_active
-            self.update_key_display()
-            return
+            return None
+        
+        # Ctrl/Alt/Win latch (then lock) for the next key
+        if keycode in STICKY_KEYSYMS:
+            self.modifiers.tap(keycode)
+            return None
         
         # Handle Caps Lock
         if keycode == 'Caps_Lock':
             self.caps_active = not self.caps_active
-            self.update_key_display()
-            self.send_key(keycode)
-            return
+            return keycode
+        
+        # With modifiers active the key's own keysym goes out as a chord,
+        # Shift included as a modifier rather than applied to the character
+        if self.modifiers:
+            sent = self.modifiers.compose('space' if keycode == ' ' else keycode, self.shift_active)
+            self.shift_active = False
+            return sent
         
         # Handle letter keys
         if len(display) == 1 and display.isalpha():
-            if self.shift_active or self.caps_active:
-                self.send_key(keycode.upper())
-            else:
-                self.send_key(keycode)
+            sent = keycode.upper() if self.shift_active or self.caps_active else keycode
         # Handle shifted symbols
         elif self.shift_active and display in self.shift_map:
-            shifted = self.shift_map[display]
-            if self.target_window:
-                subprocess.run(['xdotool', 'type', '--window', self.target_window, '--', shifted])
+            sent = self.shift_map[display]
+        # Digits and unshifted symbols are typed as characters so they can be coalesced
+        elif len(display) == 1:
+            sent = display
+        elif keycode == 'space':
+            sent = ' '
         else:
-            self.send_key(keycode)
+            sent = keycode
         
         # Reset shift after key press
-        if self.shift_active:
-            self.shift_active = False
-            self.update_key_display()
+        self.shift_active = False
+        return sent
+    
+    def close(self):
+        """Close button: a daemon only hides, otherwise the keyboard exits"""
+        if self.daemon:
+            self.hide_keyboard()
+        else:
+            self.root.quit()
+    
+    def show_keyboard(self):
+        """Map the keyboard on top of other windows"""
+        if not self.visible:
+            self.cancel_hibernation()
+            if self.is_minimized:
+                self.schedule_hibernation()
+            else:
+                self.wake()
+            # Without live tracking, pick up whatever is focused now
+            if self.window_tracker is None:
+                self.get_target_window()
+            self.root.deiconify()
+            self.root.lift()
+            self.root.attributes('-topmost', True)
+            self.root.update_idletasks()
+            self.visible = True
+        return {'visible': True}
+    
+    def hide_keyboard(self):
+        """Withdraw the keyboard, keeping every widget built"""
+        if self.visible:
+            self.stop_repeat()
+            self.coalescer.flush('hide')
+            # A latch left over would surprise the next time the keyboard is used
+            if self.modifiers.release_latched():
+                self.update_key_display()
+            self.root.withdraw()
+            self.root.update_idletasks()
+            self.visible = False
+            self.last_input = time.monotonic()
+            self.schedule_hibernation()
+        return {'visible': False}
+    
+    def toggle_keyboard(self):
+        return self.hide_keyboard() if self.visible else self.show_keyboard()
+    
+    def schedule_hibernation(self):
+        """Hibernate once the keyboard has gone idle_hibernate_ms without input"""
+        self.cancel_hibernation()
+        if not self.idle_hibernate_ms or self.hibernated:
+            return
+        idle_ms = (time.monotonic() - self.last_input) * 1000
+        self._idle_timer = self.root.after(max(0, int(self.idle_hibernate_ms - idle_ms)),
+                                           self._idle_check)
+    
+    def cancel_hibernation(self):
+        if self._idle_timer is not None:
+            self.root.after_cancel(self._idle_timer)
+            self._idle_timer = None
+    
+    def _idle_check(self):
+        self._idle_timer = None
+        if self.visible and not self.is_minimized:
+            return
+        # A connected script may send keys at any moment; check again later
+        if self.script_server is not None and self.script_server.busy():
+            self.last_input = time.monotonic()
+        if (time.monotonic() - self.last_input) * 1000 < self.idle_hibernate_ms:
+            self.schedule_hibernation()
+            return
+        self.hibernate()
+    
+    def hibernate(self):
+        """Drop the keys and everything cached for them, keeping a snapshot to rebuild from"""
+        # A replay drives the keys itself
+        if self.hibernated or self.replayer is not None:
+            return
+        self.hibernation.sample(resident_memory_kb(), count_widgets(self.root))
+        self.stop_repeat()
+        self.coalescer.flush('hibernate')
+        self.cancel_pending_geometry()
+        
+        # Shift/Caps/modifier state stays on the keyboard; the layer is all it takes
+        self.snapshot = {'layer': self.active_layer}
+        self.destroy_layers()
+        self.key_labels = {}
+        if self.snippet_menu is not None:
+            self.snippet_menu.destroy()
+            self.snippet_menu = None
+        
+        # No tracker thread waking up for every focus change while nobody types
+        if self.window_tracker is not None:
+            self.window_tracker.stop()
+            self.window_tracker = None
+            self._tracker_suspended = True
+        self.focus_cache.forget()
+        if self.swipe is not None:
+            self.swipe.release()
+        if self.journal is not None:
+            self.journal.flush()
+        self.hibernated = True
+        
+        # Hand what the widgets and tables used back to the OS
+        gc.collect()
+        trim_heap()
+        self.hibernation.enter(HIBERNATED, resident_memory_kb(), count_widgets(self.root))
+    
+    def wake(self):
+        """Rebuild the keys of a hibernated keyboard from its snapshot"""
+        if not self.hibernated:
+            return
+        start = time.perf_counter()
+        self.hibernated = False
+        self.show_layer(self.snapshot['layer'])
+        self.root.update_idletasks()
+        rebuild_ms = (time.perf_counter() - start) * 1000
+        self.snapshot = None
+        
+        if self._tracker_suspended:
+            self._tracker_suspended = False
+            if not self.start_window_tracker():
+                self.get_target_window()
+            elif self.window_tracker.current:
+                # Keys may go out before the tracker's own update reaches the mainloop
+                self.set_target_window(self.window_tracker.current, self.window_tracker.current_name)
+        if self.swipe is not None:
+            self.swipe.rebuild()
+        self.hibernation.enter(ACTIVE, resident_memory_kb(), count_widgets(self.root), rebuild_ms)
+    
+    def hibernation_stats(self):
+        """RSS, widget count and wakeups while active and while hibernated"""
+        self.hibernation.sample(resident_memory_kb(), count_widgets(self.root))
+        stats = self.hibernation.stats()
+        stats['idle_hibernate_s'] = self.idle_hibernate_ms / 1000
+        return stats
+    
+    def daemon_status(self):
+        """Startup and per-command timings for --status"""
+        return {
+            'pid': os.getpid(),
+            'visible': self.visible,
+            'startup_ms': self.startup_ms,
+            'commands': self.control_server.stats(),
+            'rss_kb': resident_memory_kb(),
+            'fanout': self.fanout.stats(),
+            'hibernation': self.hibernation_stats(),
+        }
+    
+    def start_control_server(self):
+        """Listen for --toggle/--show/--hide clients; False if the socket is taken"""
+        handlers = {
+            'toggle': self.toggle_keyboard,
+            'show': self.show_keyboard,
+            'hide': self.hide_keyboard,
+            'status': self.daemon_status,
+            'quit': self.quit_daemon,
+        }
+        try:
+            self.control_server = ControlServer(self.root, handlers, self.socket_path)
+        except DaemonError as e:
+            print(f"Error starting keyboard daemon: {e}")
+            return False
+        return True
+    
+    def quit_daemon(self):
+        # Leave the mainloop once the reply has been sent
+        self.root.after_idle(self.root.quit)
+        return {'visible': False}
+    
+    def record_startup(self):
+        # Cold start: process start (interpreter, imports, widget tree) to first idle
+        self.startup_ms = round(process_age_ms(), 1)
+    
+    def start_replay(self):
+        """Feed the loaded journal through the keyboard, then print the report and exit"""
+        if not self.has_target():
+            if self.backend.name != 'stub':
+                print("Error replaying journal: no target window (focus one, or use --backend stub)")
+                self.root.after_idle(self.root.quit)
+                return
+            # The stub backend records keys for any window id
+            self.target_window = '1'
+        self.replayer.on_finish = self.finish_replay
+        self.replayer.start()
+    
+    def finish_replay(self, report):
+        print(json.dumps({'replay': report}, indent=2))
+        self.root.quit()
     
     def toggle_theme(self):
         """Switch between dark and light mode"""
@@ -440,7 +1524,14 @@ class FloatingKeyboard:
         # Update main window and frames
         self.root.configure(bg=theme['bg'])
         self.main_frame.configure(bg=theme['bg'])
+        for layer in self.layers.values():
+            layer['frame'].configure(bg=theme['bg'])
         self.title_bar.configure(bg=theme['title_bg'])
+        if self.suggestion_bar is not None:
+            self.suggestion_bar.configure(bg=theme['bg'])
+            for button in self.suggestion_buttons:
+                button.configure(bg=theme['title_bg'], fg=theme['title_fg'],
+                                 activebackground=theme['active_bg'], activeforeground=theme['title_fg'])
         
         # Update title bar widgets
         # Note: We need to keep references if we want to update them easily
@@ -458,69 +1549,256 @@ class FloatingKeyboard:
         else:
              self.status_label.configure(fg='#aaaaaa' if self.current_theme == 'dark' else '#666666')
 
-        # Update Keys
-        for key_btn in self.buttons.values():
-            # Check special keys to maintain their state colors if active
-            # This is handled by update_key_display usually, but let's reset base colors
-            key_btn.configure(bg=theme['key_bg'], fg=theme['key_fg'],
-                            activebackground=theme['active_bg'])
-                            
-        # Re-apply state colors (Shift/Caps)
+        # Update keys (theme colors plus Shift/Caps state, only what changed)
         self.update_key_display()
 
     def update_key_display(self):
-        """Update key labels and highlights"""
-        theme = self.themes[self.current_theme]
-        
-        for (display, keycode), btn in self.buttons.items():
-            # Update shift/caps button colors
-            if keycode in ('Shift_L', 'Shift_R'):
-                btn.configure(bg=theme['shift_bg'] if self.shift_active else theme['key_bg'],
-                            relief='sunken' if self.shift_active else 'raised')
-            elif keycode == 'Caps_Lock':
-                btn.configure(bg=theme['caps_bg'] if self.caps_active else theme['key_bg'],
-                            relief='sunken' if self.caps_active else 'raised')
-            else:
-                # Ensure normal keys have correct theme color
-                btn.configure(bg=theme['key_bg'], fg=theme['key_fg'])
-                
-                # Determine display text based on state
-                new_text = display
-                
-                # Handle Shift state
-                if self.shift_active:
-                    if display in self.shift_map:
-                        new_text = self.shift_map[display]
-                    elif len(display) == 1 and display.isalpha():
-                        new_text = display.upper()
-                # Handle Normal state (respecting Caps Lock for letters)
-                else:
-                    if len(display) == 1 and display.isalpha():
-                        if self.caps_active:
-                            new_text = display.upper()
-                        else:
-                            new_text = display.lower()
-                            
-                # Update button text if changed
-                if btn.cget('text') != new_text:
-                    btn.configure(text=new_text)
+        """Update key labels and highlights, touching only options that changed"""
+        if self.hibernated:
+            # The layer picks up the current state when it is rebuilt
+            return
+        state = (self.shift_active, self.caps_active, self.modifiers.key(), self.current_theme)
+        table = self.state_tables.get(state) or self.modifier_table(state)
+        configures = 0
+        for key, options in table.items():
+            applied = self.applied_options[key]
+            changed = {name: value for name, value in options.items() if applied.get(name) != value}
+            if changed:
+                self.buttons[key].configure(**changed)
+                applied.update(changed)
+                configures += 1
+        self.last_repaint_configures = configures
+        self.configure_count += configures
     
     def run(self):
-        # Get initial target window (whatever is focused when keyboard starts)
-        self.get_target_window()
-        self.root.mainloop()
+        # A daemon starts withdrawn and waits for --show/--toggle
+        if self.daemon:
+            if not self.start_control_server():
+                return
+            self.root.withdraw()
+        self.root.after_idle(self.record_startup)
+        
+        if self.api:
+            try:
+                self.script_server = ScriptServer(self, self.api_socket)
+            except DaemonError as e:
+                print(f"Error starting scripting API: {e}")
+        
+        # Follow the active window from X events; otherwise take whatever is
+        # focused when the keyboard starts
+        if not (self.track_active_window and self.start_window_tracker()):
+            self.get_target_window()
+        
+        if self.replayer is not None:
+            self.start_replay()
+        
+        # A daemon that is never shown hibernates too
+        if not self.visible:
+            self.schedule_hibernation()
+        
+        # SIGUSR1 dumps latency metrics on demand (e.g. kill -USR1 <pid>)
+        if self.tracer is not None:
+            self.watch_signals()
+        
+        try:
+            self.root.mainloop()
+        finally:
+            self.unwatch_signals()
+            if self.script_server is not None:
+                self.script_server.close()
+            if self.control_server is not None:
+                self.control_server.close()
+            if self.window_tracker is not None:
+                self.window_tracker.stop()
+            self.coalescer.flush('exit')
+            self.dispatcher.stop()
+            self.fanout.stop()
+            self.backend.close()
+            self.dump_metrics()
+            if self.journal is not None:
+                self.journal.close()
+            if self.swipe is not None:
+                self.swipe.close()
+            if self.predictor is not None:
+                self.predictor.save_user_words()
+                self.predictor.close()
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Floating On-Screen Keyboard")
+    parser.add_argument('--backend', choices=['auto', 'xtest', 'xdotool', 'stub'], default='auto',
+                        help="keystroke injection backend (default: XTest, falling back to xdotool; "
+                             "stub only records keys, for --replay load tests)")
+    parser.add_argument('--queue-size', type=int, default=64,
+                        help="maximum number of keystrokes waiting to be injected")
+    parser.add_argument('--coalesce-ms', type=int, default=30,
+                        help="window for merging typed characters into one injection (0 disables)")
+    parser.add_argument('--stats', action='store_true',
+                        help="print injection statistics on exit")
+    parser.add_argument('--layout', default=DEFAULT_LAYOUT,
+                        help="layout file (JSON) defining keys and layers")
+    parser.add_argument('--renderer', choices=['buttons', 'canvas'], default='buttons',
+                        help="draw keys as tk.Buttons or on a single Canvas")
+    parser.add_argument('--no-window-tracking', action='store_true',
+                        help="don't follow the active window from X events (pick it once at startup)")
+    parser.add_argument('--repeat-delay', type=int, default=400, metavar='MS',
+                        help="hold a key this long before it starts repeating")
+    parser.add_argument('--repeat-rate', type=float, default=25,
+                        help="auto-repeats per second while a key is held (0 disables)")
+    parser.add_argument('--predict', action='store_true',
+                        help="show word suggestions above the keys")
+    parser.add_argument('--words', metavar='PATH',
+                        help="word list for suggestions, one 'word [count]' per line "
+                             "(default: /usr/share/dict/words)")
+    parser.add_argument('--suggestions', type=int, default=4,
+                        help="number of word suggestions shown above the keys")
+    parser.add_argument('--no-word-index', action='store_true',
+                        help="rebuild the word index in memory on every start instead of "
+                             "mapping a cached index file")
+    parser.add_argument('--learn-words', metavar='PATH',
+                        help="remember typed words across runs in this file (plaintext, mode 0600; "
+                             "by default they are forgotten on exit)")
+    parser.add_argument('--swipe', action='store_true',
+                        help="type whole words by dragging across the letter keys "
+                             "(needs NumPy and the word list)")
+    parser.add_argument('--snippets', metavar='PATH',
+                        help="JSON file of abbreviations expanded as they are typed, also "
+                             "offered in a Snippets menu (reloaded when the file changes)")
+    parser.add_argument('--idle-hibernate', type=float, default=300, metavar='SECONDS',
+                        help="after this long minimized or hidden without input, free the keys "
+                             "until the keyboard is restored (0 = never; default: 300)")
+    parser.add_argument('--daemon', action='store_true',
+                        help="stay resident and hidden; show/hide with --toggle, --show, --hide")
+    client = parser.add_argument_group("daemon client (does not start a keyboard)")
+    for command, text in (('toggle', "show or hide the resident keyboard"),
+                          ('show', "show the resident keyboard"),
+                          ('hide', "hide the resident keyboard"),
+                          ('status', "print daemon startup and command timings"),
+                          ('quit', "stop the daemon")):
+        client.add_argument(f'--{command}', action='store_true', help=text)
+    parser.add_argument('--socket', metavar='PATH',
+                        help="daemon control socket (default: per user and display)")
+    parser.add_argument('--api', action='store_true',
+                        help="accept JSON-lines text/key/chord requests on a Unix socket")
+    parser.add_argument('--api-socket', metavar='PATH',
+                        help="scripting API socket (default: per user and display)")
+    parser.add_argument('--journal', metavar='PATH',
+                        help="record every key press with its timestamp to PATH (.bin for binary)")
+    parser.add_argument('--journal-format', choices=['jsonl', 'binary'],
+                        help="journal format (default: binary for .bin paths, otherwise JSONL)")
+    parser.add_argument('--journal-max-kb', type=int, default=1024,
+                        help="rotate the journal to PATH.1, PATH.2, ... past this size")
+    parser.add_argument('--journal-backups', type=int, default=3,
+                        help="number of rotated journal files kept")
+    parser.add_argument('--journal-redact', action='store_true',
+                        help="record character keys as 'x' (timing and named keys only)")
+    parser.add_argument('--replay', nargs='+', metavar='PATH',
+                        help="replay journal files through the keyboard, print throughput and "
+                             "latency, then exit (implies --trace)")
+    parser.add_argument('--replay-speed', type=float, default=1.0,
+                        help="replay at N times the recorded pace (0: as fast as possible)")
+    parser.add_argument('--trace', action='store_true',
+                        help="record per-keypress latency for each pipeline stage")
+    parser.add_argument('--trace-size', type=int, default=1024,
+                        help="number of key traces kept in the ring buffer")
+    parser.add_argument('--latency-overlay', action='store_true',
+                        help="show p50/p95/p99 key latency in the title bar (implies --trace)")
+    parser.add_argument('--metrics-out', metavar='PATH',
+                        help="dump latency metrics to PATH (.json or .csv) on exit and on SIGUSR1 "
+                             "(implies --trace)")
+    return parser.parse_args()
 
 
 def main():
-    # Check for xdotool
-    try:
-        subprocess.run(['which', 'xdotool'], capture_output=True, check=True)
-    except subprocess.CalledProcessError:
+    args = parse_args()
+    
+    # Check for xdotool (still used for window selection and the fallback backend)
+    if args.backend != 'stub' and shutil.which('xdotool') is None:
         print("xdotool is required! Install with: sudo apt install xdotool")
         return
     
-    keyboard = FloatingKeyboard()
+    entries = None
+    if args.replay:
+        try:
+            entries = load_journals(args.replay)
+        except OSError as e:
+            print(f"Error reading journal: {e}")
+            return
+    
+    tracer = None
+    if args.trace or args.latency_overlay or args.metrics_out or entries is not None:
+        # A replay keeps the latency of every replayed key
+        size = max(args.trace_size, len(entries)) if entries is not None else args.trace_size
+        tracer = LatencyTracer(size=size)
+    
+    journal = None
+    if args.journal:
+        try:
+            journal = JournalWriter(args.journal, args.journal_format,
+                                    max_bytes=args.journal_max_kb * 1024,
+                                    backups=args.journal_backups, redact=args.journal_redact)
+        except OSError as e:
+            print(f"Error opening journal: {e}")
+    
+    predictor = None
+    # Swiping offers the other likely words in the suggestion bar, so it needs one
+    if args.predict or args.swipe:
+        predictor = create_predictor(args.words, k=args.suggestions, learn_path=args.learn_words,
+                                     persist_index=not args.no_word_index)
+    
+    swipe_lexicon = None
+    if args.swipe:
+        if not swipe_available():
+            print("Error: swipe typing needs NumPy (pip install numpy)")
+        elif predictor is None or predictor.index is None:
+            print("Error: swipe typing needs a word list (see --words)")
+        else:
+            swipe_lexicon = index_lexicon(predictor.index)
+    
+    keyboard = FloatingKeyboard(backend=create_backend(args.backend), queue_size=args.queue_size,
+                                coalesce_ms=args.coalesce_ms, tracer=tracer,
+                                latency_overlay=args.latency_overlay, layout_path=args.layout,
+                                renderer=args.renderer,
+                                track_active_window=not args.no_window_tracking,
+                                predictor=predictor, repeat_delay_ms=args.repeat_delay,
+                                repeat_rate=args.repeat_rate, daemon=args.daemon,
+                                socket_path=args.socket, api=args.api, api_socket=args.api_socket,
+                                journal=journal, swipe_lexicon=swipe_lexicon,
+                                snippets=SnippetStore(args.snippets) if args.snippets else None,
+                                idle_hibernate_s=args.idle_hibernate)
+    keyboard.metrics_path = args.metrics_out
+    if entries is not None:
+        keyboard.replayer = Replayer(keyboard, entries, speed=args.replay_speed)
     keyboard.run()
+    
+    if args.stats:
+        stats = {'coalescing': keyboard.coalescer.stats(), 'dropped': keyboard.dispatcher.dropped,
+                 'layers': keyboard.layer_stats()}
+        stats['focus'] = keyboard.focus_cache.stats()
+        stats['startup_ms'] = keyboard.startup_ms
+        if keyboard.control_server is not None:
+            stats['daemon_commands'] = keyboard.control_server.stats()
+        if keyboard.script_server is not None:
+            stats['script_api'] = keyboard.script_server.stats()
+        if keyboard.fanout.broadcasts or keyboard.fanout.removed:
+            stats['fanout'] = keyboard.fanout.stats()
+        stats['modifiers'] = keyboard.modifiers.stats()
+        if journal is not None:
+            stats['journal'] = journal.stats()
+        stats['repeat'] = {'repeats': keyboard.repeats_sent, 'injections': keyboard.repeat_injections}
+        if predictor is not None:
+            stats['prediction'] = predictor.stats()
+        if keyboard.swipe is not None:
+            stats['swipe'] = keyboard.swipe.stats()
+        if keyboard.snippets is not None:
+            stats['snippets'] = keyboard.snippets.stats()
+        stats['hibernation'] = keyboard.hibernation_stats()
+        if keyboard.window_tracker is not None:
+            stats['window_tracker'] = {'events': keyboard.window_tracker.events,
+                                       'changes': keyboard.window_tracker.changes}
+        if tracer is not None:
+            stats['latency'] = tracer.summary()
+        print(json.dumps(stats, indent=2))
 
 
 if __name__ == "__main__":
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+Idle hibernation for the Floating On-Screen Keyboard.
+
+A keyboard that stays minimized (or withdrawn in daemon mode) for
+--idle-hibernate seconds without input hibernates: the key widgets of every
+built layer, their state tables and the swipe templates are dropped, the
+active-window tracker thread is stopped, and the freed heap is handed back
+to the OS. Only a snapshot (which layer was showing) is kept; Shift, Caps
+and sticky modifier state live on the keyboard and are not touched.
+Restoring rebuilds just that layer before the keys are shown again.
+
+HibernationMonitor keeps, for the active and hibernated states, the time
+spent in each, the process wakeups (voluntary context switches of all its
+threads) over that time, and the last sampled RSS and widget count, plus
+the time each restore took to rebuild the keys.
+"""
+
+import ctypes
+import time
+
+from latency import process_wakeups
+
+ACTIVE = 'active'
+HIBERNATED = 'hibernated'
+
+
+def trim_heap():
+    """Return freed heap pages to the OS (glibc malloc_trim); False if unsupported"""
+    try:
+        return bool(ctypes.CDLL(None).malloc_trim(0))
+    except (OSError, AttributeError):
+        return False
+
+
+def count_widgets(widget):
+    """Number of Tk widgets in the tree under widget, itself included"""
+    return 1 + sum(count_widgets(child) for child in widget.winfo_children())
+
+
+class HibernationMonitor:
+    """Time, wakeups, RSS and widget count per state, and restore times"""
+
+    def __init__(self):
+        self.state = ACTIVE
+        self.hibernations = 0
+        self.rebuilds = 0
+        self.last_rebuild_ms = None
+        self.max_rebuild_ms = None
+        self.states = {state: {'seconds': 0.0, 'wakeups': 0, 'rss_kb': None, 'widgets': None}
+                       for state in (ACTIVE, HIBERNATED)}
+        self._since = time.monotonic()
+        self._wakeups = process_wakeups()
+
+    def sample(self, rss_kb, widgets):
+        """Record the footprint of the current state"""
+        totals = self.states[self.state]
+        totals['rss_kb'] = rss_kb
+        totals['widgets'] = widgets
+
+    def enter(self, state, rss_kb, widgets, rebuild_ms=None):
+        """Close the current state's period and switch to state, with its footprint"""
+        now = time.monotonic()
+        wakeups = process_wakeups()
+        totals = self.states[self.state]
+        totals['seconds'] += now - self._since
+        totals['wakeups'] += wakeups - self._wakeups
+        self._since = now
+        self._wakeups = wakeups
+        self.state = state
+        self.sample(rss_kb, widgets)
+        if state == HIBERNATED:
+            self.hibernations += 1
+        if rebuild_ms is not None:
+            self.rebuilds += 1
+            self.last_rebuild_ms = round(rebuild_ms, 3)
+            self.max_rebuild_ms = max(self.max_rebuild_ms or 0, self.last_rebuild_ms)
+
+    def stats(self):
+        # The current state's period counts up to now
+        elapsed = time.monotonic() - self._since
+        woken = process_wakeups() - self._wakeups
+        stats = {'state': self.state, 'hibernations': self.hibernations}
+        for state, totals in self.states.items():
+            seconds = totals['seconds'] + (elapsed if state == self.state else 0)
+            wakeups = totals['wakeups'] + (woken if state == self.state else 0)
+            stats[state] = {
+                'seconds': round(seconds, 1),
+                'wakeups': wakeups,
+                'wakeups_per_min': round(wakeups * 60 / seconds, 1) if seconds else None,
+                'rss_kb': totals['rss_kb'],
+                'widgets': totals['widgets'],
+            }
+        if self.rebuilds:
+            stats['rebuild_ms'] = {'last': self.last_rebuild_ms, 'max': self.max_rebuild_ms,
+                                   'count': self.rebuilds}
+        return stats
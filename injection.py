@@ -0,0 +1,519 @@
+#!/usr/bin/env python3
+"""
+Keystroke injection backends for the Floating On-Screen Keyboard.
+
+A backend knows how to focus a target window and push text or named keys
+into it. For fan-out mode it can also deliver keys straight to a window
+that does not have focus (deliver). Three implementations are provided:
+
+- XTestBackend keeps a single X display connection open and fakes key
+  events in-process through libXtst (loaded with ctypes, no extra packages).
+- XdotoolBackend forks xdotool for every call, exactly like the keyboard
+  always did. It is the fallback when libXtst is not available.
+- StubBackend only records what it was asked to do, for benchmarks.
+"""
+
+import ctypes
+import ctypes.util
+import subprocess
+import time
+
+from x11 import (CLIENT_MESSAGE, CURRENT_TIME, KEY_PRESS, KEY_PRESS_MASK, KEY_RELEASE,
+                 KEY_RELEASE_MASK, LOCK_MASK, MAPPING_KEYBOARD, MAPPING_NOTIFY,
+                 SUBSTRUCTURE_NOTIFY_MASK, SUBSTRUCTURE_REDIRECT_MASK, XConnection, XError, XEvent)
+
+
+class InjectionError(Exception):
+    """Raised when a backend cannot deliver a keystroke"""
+
+
+# Short modifier names accepted in chords ("ctrl+alt+t")
+MODIFIER_ALIASES = {
+    'ctrl': 'Control_L', 'control': 'Control_L',
+    'alt': 'Alt_L',
+    'shift': 'Shift_L',
+    'super': 'Super_L', 'win': 'Super_L', 'meta': 'Meta_L',
+}
+
+# Keysym names of punctuation, which the symbol layers send as the character
+# itself; xdotool needs the name ('+' would split a "ctrl++" key sequence)
+CHAR_KEYSYM_NAMES = {
+    ' ': 'space', '!': 'exclam', '"': 'quotedbl', '#': 'numbersign', '$': 'dollar',
+    '%': 'percent', '&': 'ampersand', "'": 'apostrophe', '(': 'parenleft', ')': 'parenright',
+    '*': 'asterisk', '+': 'plus', ',': 'comma', '-': 'minus', '.': 'period', '/': 'slash',
+    ':': 'colon', ';': 'semicolon', '<': 'less', '=': 'equal', '>': 'greater',
+    '?': 'question', '@': 'at', '[': 'bracketleft', '\\': 'backslash', ']': 'bracketright',
+    '^': 'asciicircum', '_': 'underscore', '`': 'grave', '{': 'braceleft', '|': 'bar',
+    '}': 'braceright', '~': 'asciitilde',
+}
+
+
+def keysym_name(key):
+    """Keysym name for a key given as a name ('Return') or a single character ('+')"""
+    if len(key) != 1 or (key.isascii() and key.isalnum()):
+        return key
+    return CHAR_KEYSYM_NAMES.get(key) or f'U{ord(key):04X}'
+
+
+def parse_chord(spec):
+    """Keysyms of a chord given as "ctrl+alt+t" or a list; modifiers first, key last"""
+    parts = spec.split('+') if isinstance(spec, str) else list(spec)
+    keysyms = tuple(MODIFIER_ALIASES.get(part.strip().lower(), part.strip()) for part in parts)
+    if not keysyms or not all(keysyms):
+        raise ValueError(f"bad chord: {spec!r}")
+    return keysyms
+
+
+class InjectionBackend:
+    """Interface shared by all injection backends"""
+
+    name = 'base'
+
+    def activate(self, window):
+        """Give input focus to the target window (waits until it is active)"""
+        raise NotImplementedError
+
+    def type_text(self, text):
+        """Type a string of printable characters into the focused window"""
+        raise NotImplementedError
+
+    def key(self, keysym, repeat=1):
+        """Tap a named key (BackSpace, Return, Caps_Lock, ...) repeat times"""
+        raise NotImplementedError
+
+    def chord(self, keysyms):
+        """Hold keysyms[:-1] while tapping keysyms[-1] (e.g. Control_L, Alt_L, t)"""
+        raise NotImplementedError
+
+    def deliver(self, window, kind, payload, count=1):
+        """Send a KeyJob's keys ('type', 'key' or 'chord') to window without focusing it
+
+        Used by fan-out mode, where several windows receive the same keys and
+        none of them can be given focus. Raises InjectionError on failure.
+        """
+        raise NotImplementedError
+
+    def window_exists(self, window):
+        """False once window has been destroyed"""
+        return True
+
+    def sync(self):
+        """Block until previously injected events have reached the X server"""
+
+    def close(self):
+        """Release any resources held by the backend"""
+
+
+class XdotoolBackend(InjectionBackend):
+    """Backend that forks one xdotool process per call"""
+
+    name = 'xdotool'
+
+    def activate(self, window):
+        subprocess.run(['xdotool', 'windowactivate', '--sync', str(window)],
+                       capture_output=True, check=False)
+
+    @staticmethod
+    def _type_args(text, options):
+        # Leading backspaces (a snippet erasing its abbreviation) are chained
+        # as a key command in the same xdotool process
+        erase = len(text) - len(text.lstrip('\b'))
+        args = []
+        if erase:
+            args = ['key'] + options + ['--repeat', str(erase), '--delay', '0', 'BackSpace']
+        return args + ['type'] + options + ['--', text[erase:]]
+
+    def type_text(self, text):
+        subprocess.run(['xdotool'] + self._type_args(text, ['--clearmodifiers']))
+
+    def key(self, keysym, repeat=1):
+        if repeat > 1:
+            # One process for the whole batch of auto-repeats
+            subprocess.run(['xdotool', 'key', '--clearmodifiers', '--repeat', str(repeat),
+                            '--delay', '0', keysym_name(keysym)])
+        else:
+            subprocess.run(['xdotool', 'key', '--clearmodifiers', keysym_name(keysym)])
+
+    @staticmethod
+    def _key_sequence(keysyms):
+        return '+'.join(keysym_name(keysym) for keysym in keysyms)
+
+    def chord(self, keysyms):
+        subprocess.run(['xdotool', 'key', '--clearmodifiers', self._key_sequence(keysyms)])
+
+    def deliver(self, window, kind, payload, count=1):
+        window = str(window)
+        if kind == 'type':
+            args = self._type_args(payload, ['--window', window])
+        elif kind == 'chord':
+            args = ['key', '--window', window, self._key_sequence(payload)]
+        elif count > 1:
+            args = ['key', '--window', window, '--repeat', str(count), '--delay', '0',
+                    keysym_name(payload)]
+        else:
+            args = ['key', '--window', window, keysym_name(payload)]
+        result = subprocess.run(['xdotool'] + args, capture_output=True, text=True)
+        if result.returncode != 0:
+            raise InjectionError(result.stderr.strip() or f"xdotool exited with {result.returncode}")
+
+    def window_exists(self, window):
+        result = subprocess.run(['xdotool', 'getwindowname', str(window)], capture_output=True)
+        return result.returncode == 0
+
+
+class StubBackend(InjectionBackend):
+    """Backend that records calls instead of injecting (benchmarks and dry runs)"""
+
+    name = 'stub'
+
+    def __init__(self, delay=0.0, keep_log=True):
+        # Optional artificial per-call delay, to mimic a slow backend
+        self.delay = delay
+        self.keep_log = keep_log
+        self.log = []
+        self.activations = 0
+        self.injections = 0
+        self.chars = 0
+        self.keys = 0
+        # Windows deliver() treats as destroyed
+        self.dead_windows = set()
+
+    def _call(self, entry):
+        if self.delay:
+            time.sleep(self.delay)
+        if self.keep_log:
+            self.log.append(entry)
+
+    def activate(self, window):
+        self.activations += 1
+        self._call(('activate', window))
+
+    def type_text(self, text):
+        self.injections += 1
+        self.chars += len(text)
+        self._call(('type', text))
+
+    def key(self, keysym, repeat=1):
+        self.injections += 1
+        self.keys += repeat
+        self._call(('key', keysym) if repeat == 1 else ('key', keysym, repeat))
+
+    def chord(self, keysyms):
+        self.injections += 1
+        self.keys += 1
+        self._call(('chord', tuple(keysyms)))
+
+    def deliver(self, window, kind, payload, count=1):
+        if str(window) in self.dead_windows:
+            raise InjectionError(f"BadWindow: {window}")
+        self.injections += 1
+        if kind == 'type':
+            self.chars += len(payload)
+        else:
+            self.keys += count
+        self._call(('deliver', window, kind, payload, count))
+
+    def window_exists(self, window):
+        return str(window) not in self.dead_windows
+
+
+# X11 constants used by the XTest backend
+_REVERT_TO_PARENT = 2
+_SHIFT_L = 0xffe1
+
+# Modifier state bits set on synthetic key events, by keysym prefix
+_MODIFIER_MASKS = {'Shift': 1 << 0, 'Control': 1 << 2, 'Alt': 1 << 3, 'Meta': 1 << 3, 'Super': 1 << 6}
+
+# Characters that have their own named keysym rather than a Unicode one
+_CHAR_KEYSYMS = {'\n': 0xff0d, '\r': 0xff0d, '\t': 0xff09, '\b': 0xff08}
+
+
+def _is_cased(keysym):
+    """True for letter keysyms whose case Caps Lock changes"""
+    if keysym >= 0x01000000:
+        keysym &= 0xffffff
+    elif keysym > 0xff:
+        return False
+    char = chr(keysym)
+    upper = char.upper()
+    return len(upper) == 1 and upper != char.lower()
+
+
+def _load_xtst():
+    """Load libXtst and declare the functions we call"""
+    path = ctypes.util.find_library('Xtst')
+    if not path:
+        raise InjectionError("libXtst not found (install libxtst6)")
+    xtst = ctypes.cdll.LoadLibrary(path)
+    xtst.XTestQueryExtension.argtypes = [ctypes.c_void_p] + [ctypes.POINTER(ctypes.c_int)] * 4
+    xtst.XTestFakeKeyEvent.argtypes = [ctypes.c_void_p, ctypes.c_uint, ctypes.c_int, ctypes.c_ulong]
+    return xtst
+
+
+class XTestBackend(InjectionBackend):
+    """In-process backend: one persistent X connection, events faked with XTest"""
+
+    name = 'xtest'
+
+    # How long activate() waits for the window manager to hand over focus
+    ACTIVATE_TIMEOUT = 0.25
+
+    def __init__(self, display_name=None):
+        self._xtst = _load_xtst()
+        try:
+            self.conn = XConnection(display_name)
+        except XError as e:
+            raise InjectionError(str(e)) from e
+        self._xlib = self.conn.xlib
+        self.display = self.conn.display
+
+        ints = [ctypes.c_int() for _ in range(4)]
+        if not self._xtst.XTestQueryExtension(self.display, *[ctypes.byref(i) for i in ints]):
+            self.close()
+            raise InjectionError("X server does not support the XTEST extension")
+
+        self.root_window = self.conn.root_window
+        self._net_active_window = self.conn.atom('_NET_ACTIVE_WINDOW')
+        self._wm_supports_active = self.conn.wm_supports('_NET_ACTIVE_WINDOW')
+        self._shift_keycode = self._xlib.XKeysymToKeycode(self.display, _SHIFT_L)
+        self._scratch_keycode = self._find_scratch_keycode()
+        self._keycode_cache = {}
+
+    def get_active_window(self):
+        """Window id the window manager reports as active, or None"""
+        return self.conn.get_active_window()
+
+    def _find_scratch_keycode(self):
+        """Find a keycode with no keysyms bound, used for characters not on the keymap"""
+        min_kc = ctypes.c_int()
+        max_kc = ctypes.c_int()
+        self._xlib.XDisplayKeycodes(self.display, ctypes.byref(min_kc), ctypes.byref(max_kc))
+        count = max_kc.value - min_kc.value + 1
+        per_code = ctypes.c_int()
+        mapping = self._xlib.XGetKeyboardMapping(self.display, min_kc.value, count, ctypes.byref(per_code))
+        if not mapping:
+            return 0
+        try:
+            for i in range(count - 1, -1, -1):
+                syms = mapping[i * per_code.value:(i + 1) * per_code.value]
+                if not any(syms):
+                    return min_kc.value + i
+        finally:
+            self._xlib.XFree(mapping)
+        return 0
+
+    def activate(self, window):
+        window = int(window)
+        if self._wm_supports_active:
+            # Same request xdotool windowactivate sends to the window manager
+            event = XEvent()
+            event.xclient.type = CLIENT_MESSAGE
+            event.xclient.send_event = True
+            event.xclient.window = window
+            event.xclient.message_type = self._net_active_window
+            event.xclient.format = 32
+            event.xclient.data[0] = 2  # source indication: pager/tool
+            event.xclient.data[1] = CURRENT_TIME
+            self._xlib.XSendEvent(self.display, self.root_window, False,
+                                  SUBSTRUCTURE_REDIRECT_MASK | SUBSTRUCTURE_NOTIFY_MASK,
+                                  ctypes.byref(event))
+            self._xlib.XFlush(self.display)
+
+            # Equivalent of --sync: wait until the window manager reports it active
+            deadline = time.monotonic() + self.ACTIVATE_TIMEOUT
+            while self.get_active_window() != window and time.monotonic() < deadline:
+                time.sleep(0.001)
+        else:
+            # No EWMH window manager (e.g. bare Xvfb): set focus directly
+            self._xlib.XSetInputFocus(self.display, window, _REVERT_TO_PARENT, CURRENT_TIME)
+            self._xlib.XSync(self.display, False)
+
+    def _char_keysym(self, char):
+        if char in _CHAR_KEYSYMS:
+            return _CHAR_KEYSYMS[char]
+        code = ord(char)
+        # Latin-1 keysyms match their code points, everything else uses the Unicode range
+        if 0x20 <= code <= 0x7e or 0xa0 <= code <= 0xff:
+            return code
+        return 0x01000000 | code
+
+    def _check_keymap(self):
+        """Forget cached keycodes once the server reports a new keyboard mapping"""
+        # MappingNotify reaches every client without selecting it; nothing
+        # else is selected on this connection
+        while self._xlib.XPending(self.display):
+            event = XEvent()
+            self._xlib.XNextEvent(self.display, ctypes.byref(event))
+            if event.type != MAPPING_NOTIFY:
+                continue
+            self._xlib.XRefreshKeyboardMapping(ctypes.byref(event.xmapping))
+            if event.xmapping.request == MAPPING_KEYBOARD:
+                self._keycode_cache = {}
+                self._shift_keycode = self._xlib.XKeysymToKeycode(self.display, _SHIFT_L)
+
+    def _lookup(self, keysym):
+        """Map a keysym to (keycode, needs_shift); keycode 0 means not on the keymap"""
+        cached = self._keycode_cache.get(keysym)
+        if cached is not None:
+            return cached
+        keycode = self._xlib.XKeysymToKeycode(self.display, keysym)
+        needs_shift = False
+        if keycode:
+            if self._xlib.XkbKeycodeToKeysym(self.display, keycode, 0, 0) == keysym:
+                needs_shift = False
+            elif self._xlib.XkbKeycodeToKeysym(self.display, keycode, 0, 1) == keysym:
+                needs_shift = True
+            else:
+                # Only reachable through AltGr or another group, remap instead
+                keycode = 0
+        result = (keycode, needs_shift)
+        self._keycode_cache[keysym] = result
+        return result
+
+    def _tap(self, keycode, shift=False):
+        fake = self._xtst.XTestFakeKeyEvent
+        if shift:
+            fake(self.display, self._shift_keycode, True, 0)
+        fake(self.display, keycode, True, 0)
+        fake(self.display, keycode, False, 0)
+        if shift:
+            fake(self.display, self._shift_keycode, False, 0)
+
+    def _lock_active(self):
+        return bool(self.conn.modifier_state() & LOCK_MASK)
+
+    def _tap_keysym(self, keysym, lock=False):
+        keycode, needs_shift = self._lookup(keysym)
+        # With Caps Lock on the server already shifts letters and Shift would
+        # undo it, so flip Shift for them (what xdotool --clearmodifiers gets right)
+        if lock and _is_cased(keysym):
+            needs_shift = not needs_shift
+        if keycode:
+            self._tap(keycode, needs_shift)
+            return
+        if not self._scratch_keycode:
+            raise InjectionError(f"No keycode available for keysym {keysym:#x}")
+        # Bind the keysym to a spare keycode just long enough to type it
+        syms = (ctypes.c_ulong * 1)(keysym)
+        self._xlib.XChangeKeyboardMapping(self.display, self._scratch_keycode, 1, syms, 1)
+        self._xlib.XSync(self.display, False)
+        self._tap(self._scratch_keycode)
+        self._xlib.XSync(self.display, False)
+        syms[0] = 0
+        self._xlib.XChangeKeyboardMapping(self.display, self._scratch_keycode, 1, syms, 1)
+
+    def _keysym(self, name):
+        value = self._xlib.XStringToKeysym(name.encode())
+        # Punctuation from the symbol layers arrives as the character itself
+        if not value and len(name) == 1:
+            value = self._char_keysym(name)
+        if not value:
+            raise InjectionError(f"Unknown keysym: {name}")
+        return value
+
+    def type_text(self, text):
+        self._check_keymap()
+        lock = self._lock_active()
+        for char in text:
+            self._tap_keysym(self._char_keysym(char), lock)
+        self._xlib.XFlush(self.display)
+
+    def key(self, keysym, repeat=1):
+        self._check_keymap()
+        value = self._keysym(keysym)
+        lock = _is_cased(value) and self._lock_active()
+        for _ in range(repeat):
+            self._tap_keysym(value, lock)
+        self._xlib.XFlush(self.display)
+
+    def chord(self, keysyms):
+        # Resolve everything before pressing anything, so a bad keysym can't
+        # leave modifiers held down
+        self._check_keymap()
+        keycodes = []
+        for name in keysyms:
+            keycode, needs_shift = self._lookup(self._keysym(name))
+            if not keycode:
+                raise InjectionError(f"Unmapped keysym in chord: {name}")
+            keycodes.append(keycode)
+        # The key itself may only be reachable with Shift ('!' is Shift+1)
+        if needs_shift and self._shift_keycode not in keycodes:
+            keycodes.insert(-1, self._shift_keycode)
+        fake = self._xtst.XTestFakeKeyEvent
+        # Press in order, release in reverse so modifiers wrap the key
+        for keycode in keycodes:
+            fake(self.display, keycode, True, 0)
+        for keycode in reversed(keycodes):
+            fake(self.display, keycode, False, 0)
+        self._xlib.XFlush(self.display)
+
+    def _direct_tap(self, keysym, state=0):
+        """(keycode, state) of a synthetic tap; the scratch keycode can't be used here
+        because other fan-out workers may be remapping it at the same time"""
+        keycode, needs_shift = self._lookup(keysym)
+        if not keycode:
+            raise InjectionError(f"Keysym {keysym:#x} is not on the keymap")
+        return keycode, state | (_MODIFIER_MASKS['Shift'] if needs_shift else 0)
+
+    def deliver(self, window, kind, payload, count=1):
+        window = int(window)
+        self._check_keymap()
+        if kind == 'type':
+            taps = [self._direct_tap(self._char_keysym(char)) for char in payload]
+        elif kind == 'chord':
+            state = 0
+            for name in payload[:-1]:
+                state |= _MODIFIER_MASKS.get(name.split('_')[0], 0)
+            taps = [self._direct_tap(self._keysym(payload[-1]), state)]
+        else:
+            taps = [self._direct_tap(self._keysym(payload))] * count
+
+        event = XEvent()
+        key = event.xkey
+        key.send_event = True
+        key.display = self.display
+        key.window = window
+        key.root = self.root_window
+        key.time = CURRENT_TIME
+        key.same_screen = True
+        self.conn.take_error()
+        for keycode, state in taps:
+            key.keycode = keycode
+            key.state = state
+            key.type = KEY_PRESS
+            self._xlib.XSendEvent(self.display, window, True, KEY_PRESS_MASK, ctypes.byref(event))
+            key.type = KEY_RELEASE
+            self._xlib.XSendEvent(self.display, window, True, KEY_RELEASE_MASK, ctypes.byref(event))
+        # Errors arrive asynchronously: one round trip tells whether the window is gone
+        self._xlib.XSync(self.display, False)
+        error = self.conn.take_error()
+        if error is not None:
+            raise InjectionError(f"X error {error} sending keys to window {window:#x}")
+
+    def window_exists(self, window):
+        return self.conn.window_exists(int(window))
+
+    def sync(self):
+        self._xlib.XSync(self.display, False)
+
+    def close(self):
+        self.conn.close()
+        self.display = None
+
+
+BACKENDS = {
+    'xtest': XTestBackend,
+    'xdotool': XdotoolBackend,
+    'stub': StubBackend,
+}
+
+
+def create_backend(name='auto'):
+    """Create an injection backend by name, 'auto' prefers XTest and falls back to xdotool"""
+    if name != 'auto':
+        return BACKENDS[name]()
+    try:
+        return XTestBackend()
+    except (InjectionError, OSError) as e:
+        print(f"XTest backend unavailable ({e}), falling back to xdotool")
+        return XdotoolBackend()
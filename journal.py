@@ -0,0 +1,345 @@
+#!/usr/bin/env python3
+"""
+Keystroke journal for the Floating On-Screen Keyboard.
+
+With --journal every key press is appended at the on_key_press boundary:
+the keysym and label of the key, the Shift/Caps/sticky-modifier state
+before the press and a monotonic timestamp (relative to when recording
+started). Two formats are supported:
+
+    jsonl   one header line, then one JSON object per press
+    binary  magic + header, then fixed 13-byte records followed by the
+            UTF-8 keysym and label (about 2.5x smaller and 4x cheaper to
+            write than JSONL)
+
+The file is written as a stream through a buffer that is flushed at least
+once a second, and rotated (path -> path.1 -> path.2 ...) when it grows past
+max_bytes. In redaction mode every key that types a character is recorded
+as 'x', so a journal keeps the timing and the named keys (BackSpace, Return,
+modifiers) but not what was typed.
+
+A Replayer feeds a journal back through the keyboard's on_key_press - the
+same resolve, coalescing and dispatch path as real presses - at the
+recorded pace, N times faster or as fast as the dispatcher accepts, and
+reports the throughput and latency it achieved.
+"""
+
+import json
+import os
+import struct
+import time
+
+from latency import percentile
+from modifiers import LATCHED, LOCKED, STICKY_KEYSYMS
+
+JOURNAL_VERSION = 1
+BINARY_MAGIC = b'ZOSKJRN1'
+# Binary header: wall-clock start, redacted flag
+BINARY_HEADER = struct.Struct('<dB')
+# Binary record: t (ns since start), Shift/Caps flags, modifier bits, keysym and label lengths
+BINARY_RECORD = struct.Struct('<QBHBB')
+
+# Two bits per sticky modifier in the binary format: 1 latched, 2 locked
+_MODIFIER_ORDER = sorted(STICKY_KEYSYMS)
+_STATE_BITS = {LATCHED: 1, LOCKED: 2}
+_BITS_STATE = {1: LATCHED, 2: LOCKED}
+
+# Pending records are flushed to disk at least this often
+FLUSH_INTERVAL = 1.0
+
+# What a redacted character key is recorded as
+REDACTED = 'x'
+
+
+def _encode_modifiers(modifiers):
+    bits = 0
+    for keysym, state in modifiers:
+        bits |= _STATE_BITS[state] << (2 * _MODIFIER_ORDER.index(keysym))
+    return bits
+
+
+def _decode_modifiers(bits):
+    modifiers = []
+    for i, keysym in enumerate(_MODIFIER_ORDER):
+        state = (bits >> (2 * i)) & 3
+        if state:
+            modifiers.append((keysym, _BITS_STATE[state]))
+    return tuple(modifiers)
+
+
+class JournalEntry:
+    """One recorded key press"""
+
+    __slots__ = ('t', 'keycode', 'display', 'shift', 'caps', 'modifiers')
+
+    def __init__(self, t, keycode, display, shift=False, caps=False, modifiers=()):
+        self.t = t                  # seconds since recording started
+        self.keycode = keycode
+        self.display = display
+        self.shift = shift
+        self.caps = caps
+        self.modifiers = modifiers  # sorted (keysym, state) pairs, as StickyModifiers.key()
+
+    @property
+    def state(self):
+        """Keyboard state before the press, comparable with FloatingKeyboard.key_state()"""
+        return (self.shift, self.caps, self.modifiers)
+
+    def __repr__(self):
+        return f"JournalEntry({self.t:.6f}, {self.keycode!r}, {self.display!r})"
+
+
+class JournalWriter:
+    """Appends key presses to a journal file, rotating it when it grows too large"""
+
+    def __init__(self, path, fmt=None, max_bytes=1 << 20, backups=3, redact=False):
+        self.path = path
+        self.format = fmt or ('binary' if path.endswith('.bin') else 'jsonl')
+        if self.format not in ('jsonl', 'binary'):
+            raise ValueError(f"unknown journal format: {self.format}")
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.redact = redact
+        self.records = 0
+        self.rotations = 0
+        self._origin = time.monotonic_ns()
+        self._started = time.time()
+        self._last_flush = time.monotonic()
+        self._file = None
+        self._size = 0
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        # Each recording session starts a fresh file; an older one becomes path.1
+        if os.path.exists(path) and os.path.getsize(path):
+            self._shift_backups()
+        self._open()
+
+    def _open(self):
+        # Without --journal-redact this is everything typed: readable by the user only
+        fd = os.open(self.path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        os.fchmod(fd, 0o600)
+        self._file = open(fd, 'wb')
+        if self.format == 'binary':
+            header = BINARY_MAGIC + BINARY_HEADER.pack(self._started, self.redact)
+        else:
+            header = json.dumps({'journal': JOURNAL_VERSION, 'started': self._started,
+                                 'redacted': self.redact}).encode() + b'\n'
+        self._file.write(header)
+        self._size = len(header)
+
+    def _shift_backups(self):
+        """path.N-1 -> path.N ... path -> path.1, dropping the oldest"""
+        for i in range(self.backups - 1, 0, -1):
+            older = f'{self.path}.{i}'
+            if os.path.exists(older):
+                os.replace(older, f'{self.path}.{i + 1}')
+        if self.backups > 0:
+            os.replace(self.path, f'{self.path}.1')
+        else:
+            os.unlink(self.path)
+
+    def rotate(self):
+        """Close the current file, shift the backups and continue in a new file"""
+        self._file.close()
+        self._shift_backups()
+        self._open()
+        self.rotations += 1
+
+    def record(self, keycode, display, state):
+        """Append one press; state is FloatingKeyboard.key_state() before the press"""
+        t_ns = time.monotonic_ns() - self._origin
+        shift, caps, modifiers = state
+        if self.redact and len(display) == 1:
+            keycode = display = REDACTED
+        if self.format == 'binary':
+            key = keycode.encode()
+            label = display.encode()
+            data = BINARY_RECORD.pack(t_ns, shift | (caps << 1), _encode_modifiers(modifiers),
+                                      len(key), len(label)) + key + label
+        else:
+            entry = {'t': round(t_ns / 1e9, 6), 'key': keycode, 'display': display}
+            if shift:
+                entry['shift'] = 1
+            if caps:
+                entry['caps'] = 1
+            if modifiers:
+                entry['mods'] = dict(modifiers)
+            data = json.dumps(entry, separators=(',', ':')).encode() + b'\n'
+
+        if self._size + len(data) > self.max_bytes and self.records:
+            self.rotate()
+        self._file.write(data)
+        self._size += len(data)
+        self.records += 1
+        now = time.monotonic()
+        if now - self._last_flush >= FLUSH_INTERVAL:
+            self._file.flush()
+            self._last_flush = now
+
+    def stats(self):
+        return {'path': self.path, 'format': self.format, 'records': self.records,
+                'rotations': self.rotations, 'redacted': self.redact}
+
+    def flush(self):
+        """Write out buffered records (before the keyboard goes idle)"""
+        if self._file is not None:
+            self._file.flush()
+            self._last_flush = time.monotonic()
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+def read_journal(path):
+    """Entries of one journal file (either format), oldest first"""
+    with open(path, 'rb') as f:
+        data = f.read()
+    if data.startswith(BINARY_MAGIC):
+        return _read_binary(data)
+    entries = []
+    lines = data.splitlines()
+    for line in lines[1:]:
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+            modifiers = tuple(sorted(record.get('mods', {}).items()))
+            entries.append(JournalEntry(record['t'], record['key'], record['display'],
+                                        bool(record.get('shift')), bool(record.get('caps')),
+                                        modifiers))
+        except (ValueError, KeyError, TypeError):
+            # A torn last line from a crash ends the journal
+            break
+    return entries
+
+
+def _read_binary(data):
+    entries = []
+    position = len(BINARY_MAGIC) + BINARY_HEADER.size
+    size = BINARY_RECORD.size
+    while position + size <= len(data):
+        t_ns, flags, bits, key_len, label_len = BINARY_RECORD.unpack_from(data, position)
+        position += size
+        end = position + key_len + label_len
+        if end > len(data):
+            break
+        keycode = data[position:position + key_len].decode()
+        display = data[position + key_len:end].decode()
+        position = end
+        entries.append(JournalEntry(t_ns / 1e9, keycode, display, bool(flags & 1),
+                                    bool(flags & 2), _decode_modifiers(bits)))
+    return entries
+
+
+def load_journals(paths):
+    """Entries of several journal files in order, as one continuous timeline
+
+    Each recording session starts at t=0, so a file whose timestamps go
+    back in time is shifted to start where the previous one ended.
+    """
+    entries = []
+    for path in paths:
+        part = read_journal(path)
+        if entries and part and part[0].t < entries[-1].t:
+            offset = entries[-1].t - part[0].t
+            for entry in part:
+                entry.t += offset
+        entries.extend(part)
+    return entries
+
+
+class Replayer:
+    """Feeds journal entries back through keyboard.on_key_press on the Tk mainloop
+
+    speed is a multiple of the recorded pace (1 = real time); 0 replays as
+    fast as the dispatcher accepts. on_finish(report) is called once every
+    replayed key has been injected.
+    """
+
+    # Presses fed per mainloop turn at full speed, so injection results still get handled
+    BATCH = 32
+
+    def __init__(self, keyboard, entries, speed=1.0, on_finish=None):
+        self.keyboard = keyboard
+        self.root = keyboard.root
+        self.entries = entries
+        self.speed = speed
+        self.on_finish = on_finish
+        self.index = 0
+        self.lateness = []
+        self.state_mismatches = 0
+        self.waits = 0
+        self.elapsed = None
+        self._started = None
+        self._origin = entries[0].t if entries else 0.0
+        # Keep a little room in the dispatcher queue for the keyboard's own keys
+        self._max_depth = max(1, keyboard.dispatcher.jobs.maxsize - 4)
+
+    def start(self):
+        self._started = time.perf_counter()
+        self.root.after_idle(self._step)
+
+    def _step(self):
+        keyboard = self.keyboard
+        fed = 0
+        while self.index < len(self.entries):
+            entry = self.entries[self.index]
+            if self.speed:
+                now = time.perf_counter() - self._started
+                due = (entry.t - self._origin) / self.speed
+                if due > now:
+                    self.root.after(max(1, int((due - now) * 1000)), self._step)
+                    return
+                self.lateness.append((now - due) * 1000.0)
+            elif fed >= self.BATCH or keyboard.queue_depth() >= self._max_depth:
+                # Let the dispatcher catch up and its results be handled
+                if fed == 0:
+                    self.waits += 1
+                self.root.after(0 if fed else 1, self._step)
+                return
+            # Replaying from a different starting state would change what is sent
+            if keyboard.key_state() != entry.state:
+                self.state_mismatches += 1
+            keyboard.on_key_press(entry.keycode, entry.display)
+            self.index += 1
+            fed += 1
+        self._drain()
+
+    def _drain(self):
+        keyboard = self.keyboard
+        keyboard.coalescer.flush('exit')
+        if keyboard.jobs_finished < keyboard.jobs_submitted:
+            self.root.after(1, self._drain)
+            return
+        self.elapsed = time.perf_counter() - self._started
+        if self.on_finish is not None:
+            self.on_finish(self.report())
+
+    def report(self):
+        """Achieved throughput, pacing and key latency of the replay"""
+        keyboard = self.keyboard
+        presses = self.index
+        span = (self.entries[-1].t - self._origin) if self.entries else 0.0
+        lateness = sorted(self.lateness)
+        report = {
+            'presses': presses,
+            'speed': self.speed or 'max',
+            'journal_s': round(span, 3),
+            'elapsed_s': round(self.elapsed, 3) if self.elapsed is not None else None,
+            'presses_per_s': round(presses / self.elapsed, 1) if self.elapsed else None,
+            'achieved_speed': round(span / self.elapsed, 2) if self.elapsed and span else None,
+            'injections': keyboard.jobs_submitted,
+            'dropped': keyboard.dispatcher.dropped,
+            'state_mismatches': self.state_mismatches,
+        }
+        if lateness:
+            report['lateness_ms'] = {'p50': round(percentile(lateness, 50), 3),
+                                     'p95': round(percentile(lateness, 95), 3),
+                                     'max': round(lateness[-1], 3)}
+        else:
+            report['dispatcher_waits'] = self.waits
+        if keyboard.tracer is not None:
+            report['latency'] = keyboard.tracer.summary()
+        return report
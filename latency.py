@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+"""
+Per-keypress latency tracing for the Floating On-Screen Keyboard.
+
+A KeyTrace is started when a key button is pressed and stamped as the key
+moves through the pipeline:
+
+    press      on_key_press entry
+    resolved   target window resolved in send_key
+    dequeued   dispatcher worker picked the job up
+    activated  target window activation finished
+    injected   keystroke injected
+    restored   keyboard deiconify/lift/topmost restore finished (Tk thread)
+
+Finished traces are reduced to per-stage durations and stored in a
+fixed-size ring buffer. When tracing is disabled the keyboard holds no
+LatencyTracer at all, so the hot path only pays for a None check.
+"""
+
+import csv
+import json
+import os
+import time
+from array import array
+
+STAGES = ('resolve', 'queue', 'activate', 'inject', 'restore', 'total')
+
+
+class KeyTrace:
+    """Timestamps for a single key press (time.perf_counter seconds)"""
+
+    __slots__ = ('keycode', 'press', 'resolved', 'dequeued', 'activated', 'injected', 'restored')
+
+    def __init__(self, keycode):
+        self.keycode = keycode
+        self.press = time.perf_counter()
+        self.resolved = self.dequeued = self.activated = self.injected = self.restored = None
+
+    def durations(self):
+        """Per-stage durations in milliseconds, None if a stage never happened"""
+        def span(start, end):
+            if start is None or end is None:
+                return None
+            return (end - start) * 1000.0
+
+        return (
+            span(self.press, self.resolved),
+            span(self.resolved, self.dequeued),
+            span(self.dequeued, self.activated),
+            span(self.activated, self.injected),
+            span(self.injected, self.restored),
+            span(self.press, self.restored),
+        )
+
+
+def stamp(traces, stage):
+    """Stamp every trace in a list with the current time for the given stage"""
+    now = time.perf_counter()
+    for trace in traces:
+        setattr(trace, stage, now)
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted sequence"""
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, max(0, int(round(pct / 100.0 * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+
+class LatencyTracer:
+    """Fixed-size ring buffer of per-stage key latencies with percentile summaries"""
+
+    def __init__(self, size=1024):
+        self.size = size
+        # One preallocated column per stage; NaN marks a stage that was skipped
+        self._columns = [array('d', [float('nan')] * size) for _ in STAGES]
+        self._keys = [''] * size
+        self._next = 0
+        self.count = 0
+
+    def begin(self, keycode):
+        """Start a trace at on_key_press entry"""
+        return KeyTrace(keycode)
+
+    def record(self, trace):
+        """Store a finished trace, overwriting the oldest sample when full"""
+        slot = self._next
+        for column, value in zip(self._columns, trace.durations()):
+            column[slot] = float('nan') if value is None else value
+        self._keys[slot] = trace.keycode
+        self._next = (slot + 1) % self.size
+        self.count += 1
+
+    def __len__(self):
+        return min(self.count, self.size)
+
+    def _slots(self):
+        """Ring slots in chronological order"""
+        n = len(self)
+        start = (self._next - n) % self.size
+        return [(start + i) % self.size for i in range(n)]
+
+    def summary(self):
+        """p50/p95/p99/max per stage over the samples currently in the buffer"""
+        slots = self._slots()
+        result = {'samples': len(slots), 'recorded': self.count}
+        for stage, column in zip(STAGES, self._columns):
+            values = sorted(v for v in (column[s] for s in slots) if v == v)
+            result[stage] = {
+                'p50_ms': _round(percentile(values, 50)),
+                'p95_ms': _round(percentile(values, 95)),
+                'p99_ms': _round(percentile(values, 99)),
+                'max_ms': _round(values[-1] if values else None),
+            }
+        return result
+
+    def samples(self):
+        """Buffered samples as dicts, oldest first"""
+        rows = []
+        for slot in self._slots():
+            row = {'key': self._keys[slot]}
+            for stage, column in zip(STAGES, self._columns):
+                value = column[slot]
+                row[stage + '_ms'] = _round(value) if value == value else None
+            rows.append(row)
+        return rows
+
+    def overlay_text(self):
+        """Short summary for the title bar overlay"""
+        column = self._columns[STAGES.index('total')]
+        values = sorted(v for v in (column[s] for s in self._slots()) if v == v)
+        if not values:
+            return 'lat: -'
+        return (f"lat p50 {percentile(values, 50):.1f} p95 {percentile(values, 95):.1f} "
+                f"p99 {percentile(values, 99):.1f} ms")
+
+    def dump(self, path):
+        """Write summary and samples to path; .csv writes samples only, anything else JSON"""
+        if path.endswith('.csv'):
+            with open(path, 'w', newline='') as f:
+                writer = csv.DictWriter(f, fieldnames=['key'] + [s + '_ms' for s in STAGES])
+                writer.writeheader()
+                writer.writerows(self.samples())
+        else:
+            with open(path, 'w') as f:
+                json.dump({'summary': self.summary(), 'samples': self.samples()}, f, indent=2)
+
+
+def resident_memory_kb():
+    """Resident set size of this process in KiB (Linux /proc), 0 if unavailable"""
+    try:
+        with open('/proc/self/statm') as f:
+            resident_pages = int(f.read().split()[1])
+    except (OSError, ValueError, IndexError):
+        return 0
+    return resident_pages * os.sysconf('SC_PAGE_SIZE') // 1024
+
+
+def process_wakeups():
+    """Times any thread of this process blocked and was woken again (voluntary context
+    switches, Linux /proc), 0 if unavailable"""
+    total = 0
+    try:
+        tasks = os.listdir('/proc/self/task')
+    except OSError:
+        return 0
+    for task in tasks:
+        try:
+            with open(f'/proc/self/task/{task}/status') as f:
+                for line in f:
+                    if line.startswith('voluntary_ctxt_switches:'):
+                        total += int(line.split()[1])
+                        break
+        except (OSError, ValueError, IndexError):
+            # The thread exited while we were reading
+            continue
+    return total
+
+
+def process_age_ms():
+    """Milliseconds since this process was started (Linux /proc, clock-tick resolution)"""
+    try:
+        with open('/proc/self/stat') as f:
+            # Fields after the parenthesised command name; starttime is field 22
+            start_ticks = int(f.read().rsplit(')', 1)[1].split()[19])
+        with open('/proc/uptime') as f:
+            uptime = float(f.read().split()[0])
+    except (OSError, ValueError, IndexError):
+        return 0.0
+    return max(0.0, (uptime - start_ticks / os.sysconf('SC_CLK_TCK')) * 1000.0)
+
+
+def _round(value):
+    return None if value is None else round(value, 3)
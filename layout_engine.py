@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+Declarative keyboard layouts for the Floating On-Screen Keyboard.
+
+Layouts are JSON files (see layouts/qwerty.json). Each layer is a list of
+rows and each row a list of keys, laid out left to right on a grid of
+`columns` uniform columns. A key is either a plain string ("q") or an
+object with these fields:
+
+    text    identity and default label, passed to on_key_press as display
+    keysym  X keysym to send (defaults to text)
+    label   text shown on the key if different from text (e.g. an arrow)
+    span    number of grid columns (default 2)
+    font    base font size class (default 3)
+    layer   switch to this layer instead of sending a key
+    gap     leave this many empty columns (no key)
+
+load_layout() compiles a file into an immutable Layout of grid positions,
+keysyms, labels and the shift mapping. Compiled layouts are cached in
+memory and pickled under ~/.cache so later starts skip parsing entirely.
+"""
+
+import json
+import os
+import pickle
+from collections import namedtuple
+
+DEFAULT_LAYOUT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'layouts', 'qwerty.json')
+CACHE_DIR = os.path.join(os.environ.get('XDG_CACHE_HOME', os.path.expanduser('~/.cache')), 'zorin-keyboard')
+
+# Bump when the compiled form changes so stale pickles are ignored
+COMPILED_VERSION = 1
+
+KeySpec = namedtuple('KeySpec', 'text keysym label row col span font_size layer')
+Layer = namedtuple('Layer', 'name title rows columns keys')
+Layout = namedtuple('Layout', 'name columns default_layer shift_map layers')
+
+
+class LayoutError(Exception):
+    """Raised for malformed layout files"""
+
+
+_memory_cache = {}
+
+
+def compile_layout(data):
+    """Compile parsed layout JSON into a Layout"""
+    columns = data.get('columns', 30)
+    layers = {}
+    for layer_name, layer_data in data['layers'].items():
+        keys = []
+        seen = set()
+        rows = layer_data['rows']
+        for row_index, row in enumerate(rows):
+            col = 0
+            for entry in row:
+                if isinstance(entry, str):
+                    entry = {'text': entry}
+                if 'gap' in entry:
+                    col += entry['gap']
+                    continue
+                text = entry['text']
+                span = entry.get('span', 2)
+                target = entry.get('layer')
+                if target is not None and target not in data['layers']:
+                    raise LayoutError(f"{layer_name}: key {text!r} switches to unknown layer {target!r}")
+                keysym = f'layer:{target}' if target else entry.get('keysym', text)
+                # Keys are identified by (text, keysym) within a layer
+                if (text, keysym) in seen:
+                    raise LayoutError(f"{layer_name}: duplicate key {text!r} ({keysym})")
+                seen.add((text, keysym))
+                keys.append(KeySpec(text, keysym, entry.get('label', text), row_index, col, span,
+                                    entry.get('font', 3), target))
+                col += span
+            if col > columns:
+                raise LayoutError(f"{layer_name}: row {row_index} spans {col} of {columns} columns")
+        layers[layer_name] = Layer(layer_name, layer_data.get('title', layer_name), len(rows),
+                                   columns, tuple(keys))
+
+    default_layer = data.get('default_layer', next(iter(layers)))
+    if default_layer not in layers:
+        raise LayoutError(f"default layer {default_layer!r} is not defined")
+    return Layout(data.get('name', 'layout'), columns, default_layer,
+                  dict(data.get('shift_map', {})), layers)
+
+
+def _cache_path(path):
+    name = os.path.abspath(path).strip(os.sep).replace(os.sep, '_')
+    return os.path.join(CACHE_DIR, f'{name}.pickle')
+
+
+def load_layout(path=DEFAULT_LAYOUT):
+    """Load a compiled layout, reusing the in-memory or on-disk cache when fresh"""
+    stat = os.stat(path)
+    stamp = (COMPILED_VERSION, stat.st_mtime_ns, stat.st_size)
+
+    cached = _memory_cache.get(path)
+    if cached and cached[0] == stamp:
+        return cached[1]
+
+    cache_path = _cache_path(path)
+    layout = None
+    try:
+        with open(cache_path, 'rb') as f:
+            cached_stamp, cached_layout = pickle.load(f)
+        if cached_stamp == stamp:
+            layout = cached_layout
+    except (OSError, pickle.UnpicklingError, EOFError, ValueError, AttributeError):
+        pass
+
+    if layout is None:
+        with open(path) as f:
+            try:
+                layout = compile_layout(json.load(f))
+            except (KeyError, TypeError, ValueError) as e:
+                raise LayoutError(f"{path}: {e}") from e
+        try:
+            os.makedirs(CACHE_DIR, exist_ok=True)
+            tmp_path = cache_path + '.tmp'
+            with open(tmp_path, 'wb') as f:
+                pickle.dump((stamp, layout), f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, cache_path)
+        except OSError:
+            # Cache is only an optimization
+            pass
+
+    _memory_cache[path] = (stamp, layout)
+    return layout
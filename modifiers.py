@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+Sticky modifiers for the Floating On-Screen Keyboard.
+
+Ctrl, Alt and Super (Win) on the on-screen keyboard are not sent as bare
+key taps. Tapping one latches it: the next key goes out together with it as
+a single chord injection ("ctrl+c") and the latch is released. Tapping it
+again while latched locks it, so it applies to every key until it is tapped
+a third time.
+
+Modifiers are never held down between injections. Each chord presses and
+releases its own modifiers inside one backend call, so nothing is left
+stuck when keys arrive faster than they are injected or an injection fails.
+"""
+
+LATCHED = 'latched'
+LOCKED = 'locked'
+
+# Keys that latch/lock instead of being sent (Shift keeps its own one-shot toggle)
+STICKY_KEYSYMS = frozenset(('Control_L', 'Control_R', 'Alt_L', 'Alt_R',
+                            'Super_L', 'Super_R', 'Meta_L', 'Meta_R'))
+
+# Order modifiers are pressed in within a chord
+_CHORD_ORDER = {'Control': 0, 'Alt': 1, 'Meta': 2, 'Super': 3, 'Shift': 4}
+
+
+def _chord_rank(keysym):
+    return _CHORD_ORDER.get(keysym.split('_')[0], len(_CHORD_ORDER)), keysym
+
+
+class StickyModifiers:
+    """Latched and locked state of the sticky modifier keys"""
+
+    def __init__(self):
+        self.state = {}
+        self.chords = 0
+        self.latches = 0
+        self.locks = 0
+
+    def __bool__(self):
+        return bool(self.state)
+
+    def tap(self, keysym):
+        """A modifier key was pressed: off -> latched -> locked -> off"""
+        current = self.state.get(keysym)
+        if current is None:
+            self.state[keysym] = LATCHED
+            self.latches += 1
+        elif current == LATCHED:
+            self.state[keysym] = LOCKED
+            self.locks += 1
+        else:
+            del self.state[keysym]
+
+    def key(self):
+        """Hashable snapshot of the state, for state tables and change checks"""
+        return tuple(sorted(self.state.items()))
+
+    def compose(self, keysym, shift=False):
+        """Chord of the active modifiers (plus Shift) and keysym; latches are used up"""
+        held = sorted(self.state, key=_chord_rank)
+        if shift:
+            held.append('Shift_L')
+        self.release_latched()
+        self.chords += 1
+        return tuple(held) + (keysym,)
+
+    def release_latched(self):
+        """Drop latched (not locked) modifiers; True if any were dropped"""
+        latched = [keysym for keysym, state in self.state.items() if state == LATCHED]
+        for keysym in latched:
+            del self.state[keysym]
+        return bool(latched)
+
+    def stats(self):
+        return {'chords': self.chords, 'latches': self.latches, 'locks': self.locks}
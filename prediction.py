@@ -0,0 +1,389 @@
+#!/usr/bin/env python3
+"""
+Word prediction for the Floating On-Screen Keyboard.
+
+A WordIndex is an array-backed prefix index over a frequency-weighted word
+list: the words sorted and packed into one UTF-8 blob with a uint32 offset
+table and a uint32 frequency table. Every prefix corresponds to one
+contiguous range of the sorted words (found by bisection), which plays the
+role of a trie node without allocating one object per node. Top-k
+completions of small ranges are picked directly; for prefixes matching
+more than HOT_RANGE words (the first one or two letters) the top-k is
+precomputed at build time, so every lookup touches a bounded number of
+entries.
+
+The index can be saved to a file and loaded back with mmap, so a 100k-word
+lexicon starts in milliseconds and its pages are shared between processes.
+
+WordPredictor tracks the word being typed from the keys sent by the
+keyboard and merges index completions with words the user has typed.
+"""
+
+import bisect
+import heapq
+import json
+import mmap
+import os
+import struct
+import time
+from array import array
+
+from layout_engine import CACHE_DIR
+
+# Index file layout: header, offsets (n + 1), freqs (n), word blob, hot table (JSON)
+INDEX_MAGIC = b'ZOSKWRD1'
+INDEX_HEADER = struct.Struct('=8sqqIIII')
+
+# Prefixes matching more words than this get their top-k precomputed
+HOT_RANGE = 256
+TOP_K = 8
+
+DEFAULT_WORD_LIST = '/usr/share/dict/words'
+
+
+class _Words:
+    """Read-only sequence view of the packed word blob, for bisect"""
+
+    __slots__ = ('blob', 'offsets')
+
+    def __init__(self, blob, offsets):
+        self.blob = blob
+        self.offsets = offsets
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        return str(self.blob[self.offsets[i]:self.offsets[i + 1]], 'utf-8')
+
+
+def read_word_list(path):
+    """Read 'word [count]' lines; words without a count are weighted by rank"""
+    weights = {}
+    with open(path, encoding='utf-8', errors='replace') as f:
+        lines = f.read().splitlines()
+    total = len(lines)
+    for rank, line in enumerate(lines):
+        parts = line.split()
+        if not parts:
+            continue
+        word = parts[0].lower()
+        if not is_word(word):
+            continue
+        try:
+            freq = int(parts[1]) if len(parts) > 1 else total - rank
+        except ValueError:
+            freq = total - rank
+        if freq > weights.get(word, 0):
+            weights[word] = freq
+    return weights
+
+
+def is_word(text):
+    """Letters with optional inner apostrophes, like the word tracker collects"""
+    return bool(text) and text.replace("'", '').isalpha()
+
+
+class WordIndex:
+    """Sorted, array-backed prefix index with top-k completion"""
+
+    def __init__(self, blob, offsets, freqs, hot, source_stamp=(0, 0)):
+        self.blob = blob
+        self.offsets = offsets
+        self.freqs = freqs
+        self.hot = hot
+        self.words = _Words(blob, offsets)
+        self.count = len(self.words)
+        self.source_stamp = source_stamp
+        self._mmap = None
+        self._view = None
+
+    def __len__(self):
+        return self.count
+
+    @classmethod
+    def build(cls, weights, source_stamp=(0, 0)):
+        """Build an index from a {word: frequency} mapping"""
+        words = sorted(weights)
+        freqs = array('I', (min(weights[w], 0xFFFFFFFF) for w in words))
+        encoded = [w.encode('utf-8') for w in words]
+        offsets = array('I', [0])
+        position = 0
+        for data in encoded:
+            position += len(data)
+            offsets.append(position)
+        blob = b''.join(encoded)
+
+        # Precompute top-k for every prefix whose range is too large to scan;
+        # each depth only refines the large groups found at the previous one
+        hot = {}
+        groups = [(0, len(words))]
+        depth = 1
+        while groups:
+            next_groups = []
+            for lo, hi in groups:
+                start = lo
+                while start < hi:
+                    word = words[start]
+                    if len(word) < depth:
+                        start += 1
+                        continue
+                    prefix = word[:depth]
+                    end = bisect.bisect_left(words, prefix + '\uffff', start, hi)
+                    if end - start > HOT_RANGE:
+                        hot[prefix] = heapq.nlargest(TOP_K, range(start, end), key=freqs.__getitem__)
+                        next_groups.append((start, end))
+                    start = end
+            groups = next_groups
+            depth += 1
+        return cls(blob, offsets, freqs, hot, source_stamp)
+
+    def prefix_range(self, prefix):
+        """Index range [lo, hi) of the words starting with prefix"""
+        lo = bisect.bisect_left(self.words, prefix)
+        hi = bisect.bisect_left(self.words, prefix + '\uffff', lo)
+        return lo, hi
+
+    def complete(self, prefix, k=TOP_K):
+        """The k most frequent words starting with prefix, most frequent first"""
+        hot = self.hot.get(prefix)
+        if hot is not None and k <= len(hot):
+            indices = hot[:k]
+        else:
+            lo, hi = self.prefix_range(prefix)
+            indices = heapq.nlargest(k, range(lo, hi), key=self.freqs.__getitem__)
+        return [(self.words[i], self.freqs[i]) for i in indices]
+
+    def save(self, path):
+        """Write the index in the mmap-able file format"""
+        hot = json.dumps(self.hot, separators=(',', ':')).encode('utf-8')
+        header = INDEX_HEADER.pack(INDEX_MAGIC, self.source_stamp[0], self.source_stamp[1],
+                                   len(self), len(self.blob), len(hot), 0)
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(header)
+            f.write(array('I', self.offsets).tobytes())
+            f.write(array('I', self.freqs).tobytes())
+            f.write(self.blob)
+            f.write(hot)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        """Map an index file; the word tables stay in the page cache, not the heap"""
+        with open(path, 'rb') as f:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        # A truncated or corrupt file (e.g. from a crash mid-write) is checked
+        # against the header before any view is cast, and the map closed again
+        try:
+            if len(mm) < INDEX_HEADER.size:
+                raise ValueError(f"{path}: truncated word index")
+            magic, mtime_ns, size, count, blob_len, hot_len, _ = INDEX_HEADER.unpack_from(mm, 0)
+            if magic != INDEX_MAGIC:
+                raise ValueError(f"{path}: not a word index")
+            hot_start = INDEX_HEADER.size + 4 * (2 * count + 1) + blob_len
+            if len(mm) != hot_start + hot_len:
+                raise ValueError(f"{path}: truncated word index")
+            hot = json.loads(mm[hot_start:hot_start + hot_len])
+            if not isinstance(hot, dict):
+                raise ValueError(f"{path}: corrupt word index")
+        except ValueError:
+            mm.close()
+            raise
+        view = memoryview(mm)
+        position = INDEX_HEADER.size
+        offsets = view[position:position + 4 * (count + 1)].cast('I')
+        position += 4 * (count + 1)
+        freqs = view[position:position + 4 * count].cast('I')
+        position += 4 * count
+        blob = view[position:position + blob_len]
+        index = cls(blob, offsets, freqs, hot, (mtime_ns, size))
+        index._mmap = mm
+        index._view = view
+        return index
+
+    def close(self):
+        if self._mmap is not None:
+            # Views into the map must be released before it can be closed
+            self.words = None
+            for view in (self.offsets, self.freqs, self.blob, self._view):
+                view.release()
+            self._mmap.close()
+            self._mmap = None
+
+
+def load_index(words_path, index_path=None):
+    """Index for a word list, mapped from index_path when it is up to date
+
+    Returns (index, timings) where timings holds build_ms or load_ms. With
+    no index_path the index is built in memory every time.
+    """
+    stat = os.stat(words_path)
+    stamp = (stat.st_mtime_ns, stat.st_size)
+
+    if index_path:
+        start = time.perf_counter()
+        try:
+            index = WordIndex.load(index_path)
+            if index.source_stamp == stamp:
+                return index, {'load_ms': round((time.perf_counter() - start) * 1000, 3)}
+            index.close()
+        except (OSError, ValueError):
+            # Missing, stale format or corrupt: rebuild and overwrite it
+            pass
+
+    start = time.perf_counter()
+    index = WordIndex.build(read_word_list(words_path), stamp)
+    timings = {'build_ms': round((time.perf_counter() - start) * 1000, 3)}
+    if index_path:
+        try:
+            os.makedirs(os.path.dirname(index_path) or '.', exist_ok=True)
+            index.save(index_path)
+        except OSError:
+            # Persisting is only an optimization
+            pass
+    return index, timings
+
+
+class WordPredictor:
+    """Tracks the word being typed and suggests completions for it"""
+
+    def __init__(self, index=None, k=4, user_words_path=None):
+        self.index = index
+        self.k = k
+        self.word = ''
+        self.timings = {}
+        # Words the user typed, with use counts, kept sorted for prefix lookup
+        self.user_words = {}
+        self._user_sorted = []
+        self.user_words_path = user_words_path
+        if user_words_path:
+            self.load_user_words(user_words_path)
+
+    def feed(self, key):
+        """Update the current word from a sent character or keysym; True if it changed"""
+        before = self.word
+        if len(key) == 1:
+            if key.isalpha() or (key == "'" and self.word):
+                self.word += key
+            else:
+                # Space, digits and punctuation end the word
+                self.commit()
+        elif key == 'BackSpace':
+            self.word = self.word[:-1]
+        elif key in ('Caps_Lock', 'Shift_L', 'Shift_R'):
+            pass
+        elif key in ('Return', 'Tab'):
+            self.commit()
+        else:
+            # Cursor movement or editing keys: we no longer know the word
+            self.word = ''
+        return self.word != before
+
+    def commit(self):
+        """Finish the current word, learning it"""
+        word = self.word.strip("'")
+        if len(word) > 1:
+            self.learn(word)
+        self.word = ''
+
+    def reset(self):
+        """Forget the current word without learning it (it was replaced)"""
+        self.word = ''
+
+    def learn(self, word):
+        word = word.lower()
+        if word not in self.user_words:
+            bisect.insort(self._user_sorted, word)
+            self.user_words[word] = 0
+        self.user_words[word] += 1
+
+    def suggestions(self):
+        """Completions of the current word, learned words first"""
+        prefix = self.word.lower()
+        if not prefix:
+            return []
+        results = []
+
+        # Learned words matching the prefix, most used first
+        lo = bisect.bisect_left(self._user_sorted, prefix)
+        hi = bisect.bisect_left(self._user_sorted, prefix + '\uffff', lo)
+        if hi > lo:
+            learned = heapq.nlargest(self.k, self._user_sorted[lo:hi], key=self.user_words.__getitem__)
+            results.extend(w for w in learned if w != prefix)
+
+        if self.index is not None and len(results) < self.k:
+            for word, _ in self.index.complete(prefix, self.k + 1):
+                if word != prefix and word not in results:
+                    results.append(word)
+        return results[:self.k]
+
+    def pick(self, word):
+        """Characters to type to complete the current word with word"""
+        remainder = word[len(self.word):]
+        # Match an all-caps prefix (Caps Lock on)
+        if len(self.word) > 1 and self.word.isupper():
+            remainder = remainder.upper()
+        self.learn(word)
+        self.word = ''
+        return remainder
+
+    def load_user_words(self, path):
+        try:
+            with open(path) as f:
+                words = json.load(f)
+        except (OSError, ValueError):
+            return
+        for word, count in words.items():
+            if is_word(word):
+                self.user_words[word] = int(count)
+        self._user_sorted = sorted(self.user_words)
+
+    def save_user_words(self, path=None):
+        path = path or self.user_words_path
+        if not path or not self.user_words:
+            return
+        try:
+            os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+            # Readable by the user only, and tightened if the file already existed
+            fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            os.fchmod(fd, 0o600)
+            with open(fd, 'w') as f:
+                json.dump(self.user_words, f)
+        except OSError as e:
+            print(f"Error saving learned words: {e}")
+
+    def stats(self):
+        stats = dict(self.timings)
+        stats['words'] = len(self.index) if self.index is not None else 0
+        stats['learned_words'] = len(self.user_words)
+        return stats
+
+    def close(self):
+        if self.index is not None:
+            self.index.close()
+
+
+def create_predictor(words_path=None, k=4, persist_index=True, learn_path=None):
+    """WordPredictor over words_path (default: the system word list, if any)
+
+    With persist_index the compiled index is kept next to the layout cache
+    and mapped on later starts. Learned words are only kept in memory unless
+    learn_path is given, since they include anything typed (passwords too).
+    """
+    if words_path is None and os.path.exists(DEFAULT_WORD_LIST):
+        words_path = DEFAULT_WORD_LIST
+    index = None
+    timings = {}
+    if words_path:
+        index_path = None
+        if persist_index:
+            name = os.path.abspath(words_path).strip(os.sep).replace(os.sep, '_')
+            index_path = os.path.join(CACHE_DIR, f'{name}.idx')
+        try:
+            index, timings = load_index(words_path, index_path)
+        except OSError as e:
+            print(f"Error loading word list: {e}")
+    predictor = WordPredictor(index, k=k, user_words_path=learn_path)
+    predictor.timings = timings
+    return predictor
@@ -0,0 +1,390 @@
+#!/usr/bin/env python3
+"""
+Local scripting API for the Floating On-Screen Keyboard.
+
+Other local programs (macro scripts, switch-scanning software, test
+harnesses) connect to a Unix socket and stream JSON lines, one request
+per line:
+
+    {"id": 1, "text": "Hello"}                 type text
+    {"id": 2, "key": "BackSpace", "repeat": 3} press a key, like the on-screen key
+    {"id": 3, "chord": "ctrl+alt+t"}           chord (string or list of keysyms)
+
+Requests go through the keyboard's own path: its current target window
+(or fan-out set), its Shift/Caps state (a "key" acts exactly like tapping
+that key on the keyboard) and its dispatcher. Clients don't wait between
+requests; the server turns runs of text and repeated keys into as few
+injections as possible, keeps at most one injection in flight so later
+requests can still be merged, and acknowledges each request once its
+injection has finished. Requests that would queue more than MAX_QUEUED
+characters and key taps are refused, so clients should wait for
+acknowledgements now and then:
+
+    {"id": 1, "ok": true}
+    {"id": 3, "ok": false, "error": "..."}
+
+Requests without an "id" are acknowledged with their position on the
+connection (1, 2, ...).
+"""
+
+import json
+import os
+import tkinter
+from collections import deque
+
+from daemon import DaemonError, claim_socket_path, listen_socket, socket_path
+from dispatch import KeyJob
+from injection import parse_chord
+
+# Largest text batch handed to the backend in one injection
+MAX_BATCH_CHARS = 4096
+
+# Largest "repeat" of one request, and most characters and key taps that
+# may wait to be injected; requests over either are answered with an error
+MAX_REPEAT = 10000
+MAX_QUEUED = 1 << 20
+RECV_SIZE = 65536
+
+
+class _Connection:
+    """One client socket with its read and write buffers"""
+
+    __slots__ = ('sock', 'inbuf', 'outbuf', 'requests', 'closed')
+
+    def __init__(self, sock):
+        self.sock = sock
+        self.inbuf = b''
+        self.outbuf = bytearray()
+        self.requests = 0
+        self.closed = False
+
+
+class _Batch:
+    """Requests merged into one injection: 'type' text, 'key' with a count, or a 'chord'"""
+
+    __slots__ = ('kind', 'payload', 'count', 'acks')
+
+    def __init__(self, kind, payload, count=1):
+        self.kind = kind
+        self.payload = payload
+        self.count = count
+        self.acks = []
+
+
+class ScriptServer:
+    """JSON-lines injection API served on the Tk mainloop"""
+
+    def __init__(self, keyboard, path=None):
+        self.keyboard = keyboard
+        self.root = keyboard.root
+        self.path = path or socket_path('api')
+        self.connections = {}
+        self.pending = deque()
+        self.queued = 0
+        self.in_flight = None
+        self.requests = 0
+        self.injections = 0
+        self.errors = 0
+        self.max_batch = 0
+
+        claim_socket_path(self.path)
+        try:
+            self.sock = listen_socket(self.path, 16)
+        except OSError as e:
+            raise DaemonError(f"cannot listen on {self.path}: {e}") from e
+        self.sock.setblocking(False)
+        self.root.tk.createfilehandler(self.sock, tkinter.READABLE, self._on_accept)
+
+    # -- sockets -------------------------------------------------------------
+
+    def _on_accept(self, sock, mask):
+        try:
+            client, _ = self.sock.accept()
+        except BlockingIOError:
+            return
+        client.setblocking(False)
+        conn = _Connection(client)
+        self.connections[client.fileno()] = conn
+        self._watch(conn)
+
+    def _watch(self, conn):
+        mask = tkinter.READABLE | (tkinter.WRITABLE if conn.outbuf else 0)
+        self.root.tk.createfilehandler(conn.sock, mask, lambda sock, ready: self._on_ready(conn, ready))
+
+    def _on_ready(self, conn, ready):
+        if ready & tkinter.WRITABLE:
+            self._write(conn)
+        if ready & tkinter.READABLE and not conn.closed:
+            self._read(conn)
+        self.pump()
+
+    def _read(self, conn):
+        chunks = [conn.inbuf]
+        while True:
+            try:
+                data = conn.sock.recv(RECV_SIZE)
+            except BlockingIOError:
+                break
+            except OSError:
+                data = b''
+            if not data:
+                self._close(conn)
+                break
+            chunks.append(data)
+            if len(data) < RECV_SIZE:
+                break
+        lines = b''.join(chunks).split(b'\n')
+        conn.inbuf = lines.pop()
+        for line in lines:
+            if line.strip():
+                self.submit_line(conn, line)
+
+    def _write(self, conn):
+        try:
+            sent = conn.sock.send(conn.outbuf)
+        except BlockingIOError:
+            return
+        except OSError:
+            self._close(conn)
+            return
+        del conn.outbuf[:sent]
+        if not conn.outbuf:
+            self._watch(conn)
+
+    def _reply(self, conn, reply):
+        if conn.closed:
+            return
+        pending = bool(conn.outbuf)
+        conn.outbuf += json.dumps(reply).encode() + b'\n'
+        if not pending:
+            # Try right away; only wait for WRITABLE if the socket is full
+            self._write(conn)
+            if conn.outbuf and not conn.closed:
+                self._watch(conn)
+
+    def _close(self, conn):
+        if conn.closed:
+            return
+        conn.closed = True
+        try:
+            self.root.tk.deletefilehandler(conn.sock)
+        except tkinter.TclError:
+            pass
+        self.connections.pop(conn.sock.fileno(), None)
+        conn.sock.close()
+
+    # -- requests ------------------------------------------------------------
+
+    def submit_line(self, conn, line):
+        """Parse one request, resolve it against the keyboard state and queue it"""
+        conn.requests += 1
+        self.requests += 1
+        try:
+            request = json.loads(line)
+        except (ValueError, RecursionError):
+            request = None
+        if not isinstance(request, dict):
+            self._fail(conn, conn.requests, f"not a JSON object: {line[:80]!r}")
+            return
+        request_id = request.get('id', conn.requests)
+        # Fields are type-checked here so nothing a client sends can raise
+        # out of the Tk file handler and lose the rest of its lines
+        try:
+            if 'text' in request:
+                text = request['text']
+                if not isinstance(text, str):
+                    raise ValueError("text must be a string")
+                self._reserve(len(text))
+                self._add_text(conn, request_id, text)
+            elif 'key' in request:
+                key = request['key']
+                repeat = request.get('repeat', 1)
+                if not isinstance(key, str) or not key:
+                    raise ValueError("key must be a non-empty string")
+                if type(repeat) is not int:
+                    raise ValueError("repeat must be an integer")
+                repeat = max(1, repeat)
+                if repeat > MAX_REPEAT:
+                    raise ValueError(f"repeat {repeat} is over the limit of {MAX_REPEAT}")
+                self._reserve(repeat)
+                self._add_key(conn, request_id, key, repeat)
+            elif 'chord' in request:
+                chord = request['chord']
+                if not (isinstance(chord, str) or (isinstance(chord, list)
+                                                   and all(isinstance(part, str) for part in chord))):
+                    raise ValueError("chord must be a string or a list of strings")
+                self._append(_Batch('chord', parse_chord(chord)), conn, request_id)
+            else:
+                raise ValueError("expected one of text, key, chord")
+        except ValueError as e:
+            self._fail(conn, request_id, str(e))
+
+    def _add_text(self, conn, request_id, text):
+        # Each character behaves like its key on the keyboard (one-shot Shift,
+        # Caps, sticky modifiers), so text is split into typed runs and chords
+        keyboard = self.keyboard
+        state = keyboard.key_state()
+        segments = [[]]
+        for char in text:
+            sent = keyboard.resolve_key(char, char) if char != ' ' or keyboard.modifiers else ' '
+            if isinstance(sent, tuple):
+                segments.append(sent)
+                segments.append([])
+            else:
+                segments[-1].append(sent)
+        if state != keyboard.key_state():
+            keyboard.update_key_display()
+        segments = [segment for segment in segments if segment] or [[]]
+        # Only the last injection of the request acknowledges it
+        for i, segment in enumerate(segments):
+            ack = i == len(segments) - 1
+            if isinstance(segment, tuple):
+                self._append(_Batch('chord', segment), conn, request_id, ack)
+            else:
+                self._add_typed(conn, request_id, ''.join(segment), ack)
+
+    def _add_key(self, conn, request_id, key, repeat):
+        keyboard = self.keyboard
+        state = keyboard.key_state()
+        # Named keys are given as keysyms, single characters as themselves
+        display = key if len(key) == 1 else ''
+        # Each tap that changes the state (Caps Lock, one-shot Shift, sticky
+        # modifiers) resolves on its own; once a tap leaves the state as it
+        # was, the remaining taps resolve the same and go out as one batch
+        taps = []
+        while repeat:
+            before = keyboard.key_state()
+            sent = keyboard.resolve_key(key, display)
+            if keyboard.key_state() == before and not isinstance(sent, tuple):
+                taps.append((sent, repeat))
+                break
+            taps.append((sent, 1))
+            repeat -= 1
+        if state != keyboard.key_state():
+            keyboard.update_key_display()
+        # Only the last injection of the request acknowledges it
+        for i, (sent, count) in enumerate(taps):
+            self._add_sent(conn, request_id, sent, count, ack=i == len(taps) - 1)
+
+    def _add_sent(self, conn, request_id, sent, count, ack):
+        if sent is None:
+            # Shift, Ctrl, Alt and Win only change state
+            if ack:
+                self._append(_Batch('state', None, 0), conn, request_id)
+        elif isinstance(sent, tuple):
+            self._append(_Batch('chord', sent), conn, request_id, ack)
+        elif len(sent) == 1:
+            self._add_typed(conn, request_id, sent * count, ack)
+        else:
+            last = self.pending[-1] if self.pending else None
+            if last is not None and last.kind == 'key' and last.payload == sent:
+                last.count += count
+                self.queued += count
+                if ack:
+                    last.acks.append((conn, request_id))
+            else:
+                self._append(_Batch('key', sent, count), conn, request_id, ack)
+
+    def _add_typed(self, conn, request_id, text, ack=True):
+        last = self.pending[-1] if self.pending else None
+        if (last is not None and last.kind == 'type'
+                and last.count + len(text) <= MAX_BATCH_CHARS):
+            last.payload.append(text)
+            last.count += len(text)
+            self.queued += len(text)
+            if ack:
+                last.acks.append((conn, request_id))
+        else:
+            batch = _Batch('type', [text], len(text))
+            self._append(batch, conn, request_id, ack)
+
+    def _append(self, batch, conn, request_id, ack=True):
+        if ack:
+            batch.acks.append((conn, request_id))
+        self.pending.append(batch)
+        self.queued += batch.count
+
+    def _reserve(self, size):
+        """Refuse a request that would queue more than MAX_QUEUED characters and taps"""
+        if self.queued + size > MAX_QUEUED:
+            raise ValueError(f"{size} more characters would exceed the {MAX_QUEUED} queued; "
+                             "wait for earlier requests to be acknowledged")
+
+    def _fail(self, conn, request_id, error):
+        self.errors += 1
+        self._reply(conn, {'id': request_id, 'ok': False, 'error': error})
+
+    # -- injection -----------------------------------------------------------
+
+    def pump(self):
+        """Hand the next merged batch to the dispatcher if none is in flight"""
+        keyboard = self.keyboard
+        while self.in_flight is None and self.pending:
+            batch = self.pending.popleft()
+            self.queued -= batch.count
+            if batch.kind == 'state':
+                self._acknowledge(batch, None)
+                continue
+            if keyboard.hibernated:
+                # The target went stale while the window tracker was stopped
+                keyboard.wake()
+            if not keyboard.has_target():
+                self._acknowledge(batch, "no target window")
+                continue
+            if batch.kind == 'type':
+                job = KeyJob(keyboard.target_window, 'type', ''.join(batch.payload))
+            else:
+                job = KeyJob(keyboard.target_window, batch.kind, batch.payload, count=batch.count)
+            job.callback = self._on_injected
+            # Keys clicked on the keyboard before this batch go first
+            keyboard.coalescer.flush('special')
+            if not keyboard.submit_job(job):
+                # Dispatcher queue is full: retry on the next frame
+                self.pending.appendleft(batch)
+                self.queued += batch.count
+                self.root.after(keyboard.FRAME_MS, self.pump)
+                return
+            self.in_flight = batch
+            self.injections += 1
+            self.max_batch = max(self.max_batch, len(batch.acks))
+
+    def _on_injected(self, job, error):
+        batch = self.in_flight
+        self.in_flight = None
+        self._acknowledge(batch, str(error) if error is not None else None)
+        self.pump()
+
+    def _acknowledge(self, batch, error):
+        for conn, request_id in batch.acks:
+            if error is None:
+                self._reply(conn, {'id': request_id, 'ok': True})
+            else:
+                self._fail(conn, request_id, error)
+
+    def stats(self):
+        return {
+            'requests': self.requests,
+            'injections': self.injections,
+            'requests_per_injection': round(self.requests / self.injections, 2) if self.injections else 0,
+            'max_batch': self.max_batch,
+            'errors': self.errors,
+        }
+
+    def busy(self):
+        """True while a client is connected or its keys are still queued"""
+        return bool(self.connections or self.pending or self.in_flight is not None)
+
+    def close(self):
+        for conn in list(self.connections.values()):
+            self._close(conn)
+        if self.sock is not None:
+            try:
+                self.root.tk.deletefilehandler(self.sock)
+            except tkinter.TclError:
+                pass
+            self.sock.close()
+            self.sock = None
+            try:
+                os.unlink(self.path)
+            except OSError:
+                pass
@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+"""
+Text snippets for the Floating On-Screen Keyboard.
+
+With --snippets PATH, typing an abbreviation replaces it with its text, and
+the Snippets button in the title bar inserts any snippet from a menu. The
+file is a JSON object mapping abbreviations to text, or to an object with
+the text and a menu label:
+
+    {
+        ";addr": "221B Baker Street\\nLondon NW1 6XE",
+        ";sig": {"text": "Kind regards,\\nAlex", "label": "Signature"}
+    }
+
+An abbreviation expands as soon as its last character is typed, if it
+starts a word (follows a space, punctuation or nothing), so a prefix
+character like ';' keeps abbreviations from firing inside ordinary words.
+Abbreviations are indexed by their last character, so checking a typed
+character only compares the few abbreviations that end with it.
+
+An expansion is one 'type' injection: backspaces ('\\b') over the part of
+the abbreviation the text doesn't start with, then the rest of the text.
+The keyboard first takes back abbreviation characters still waiting in
+the BurstCoalescer, which then never reach the window at all.
+
+The file is loaded on first use and reloaded when its mtime or size
+changes, checked at most once per CHECK_INTERVAL while typing; there is no
+polling thread.
+"""
+
+import json
+import os
+import time
+from collections import deque
+
+from latency import percentile
+
+# Seconds between checks of the snippet file for changes
+CHECK_INTERVAL = 1.0
+
+# Expansion latencies kept for stats()
+LATENCY_SAMPLES = 256
+
+# Keys that don't end the word being followed
+_STATE_KEYS = frozenset(('Caps_Lock', 'Shift_L', 'Shift_R'))
+
+
+def expansion(abbrev, text):
+    """(backspaces, text to type) that turn a typed abbreviation into text"""
+    common = len(os.path.commonprefix([abbrev, text]))
+    return len(abbrev) - common, text[common:]
+
+
+class SnippetStore:
+    """Abbreviations and their texts from a JSON file, reloaded when it changes"""
+
+    def __init__(self, path):
+        self.path = path
+        self.snippets = {}
+        self.labels = {}
+        self.longest = 0
+        self.typed = ''
+        self.loads = 0
+        self.expansions = 0
+        self.expanded_chars = 0
+        self.latency_ms = deque(maxlen=LATENCY_SAMPLES)
+        self._by_last = {}
+        self._stamp = None
+        self._checked = None
+
+    def __len__(self):
+        return len(self.snippets)
+
+    def refresh(self, force=False):
+        """Reload the file if it changed since it was loaded (checked at most once per interval)"""
+        now = time.monotonic()
+        if not force and self._checked is not None and now - self._checked < CHECK_INTERVAL:
+            return
+        self._checked = now
+        try:
+            stat = os.stat(self.path)
+            stamp = (stat.st_mtime_ns, stat.st_size)
+        except OSError:
+            stamp = None
+        if stamp == self._stamp:
+            return
+        # Remember the stamp even if loading fails, so the error isn't repeated every second
+        self._stamp = stamp
+        if stamp is None:
+            self.load({})
+            return
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                self.load(json.load(f))
+        except (OSError, ValueError) as e:
+            print(f"Error loading snippets: {e}")
+
+    def load(self, data):
+        """Replace the snippets with a parsed snippet file"""
+        if not isinstance(data, dict):
+            raise ValueError("snippet file must be a JSON object")
+        snippets = {}
+        labels = {}
+        for abbrev, entry in data.items():
+            if isinstance(entry, dict):
+                text = entry.get('text')
+                label = entry.get('label')
+            else:
+                text = entry
+                label = None
+            if not abbrev or not isinstance(text, str):
+                print(f"Error loading snippets: {abbrev!r} has no text")
+                continue
+            snippets[abbrev] = text
+            labels[abbrev] = label or abbrev
+        by_last = {}
+        # Longest first, so 'x;ab' is found before ';ab' when both end the typed text
+        for abbrev in sorted(snippets, key=len, reverse=True):
+            by_last.setdefault(abbrev[-1], []).append(abbrev)
+        self.snippets = snippets
+        self.labels = labels
+        self._by_last = by_last
+        self.longest = max(map(len, snippets), default=0)
+        self.typed = ''
+        self.loads += 1
+
+    def feed(self, key):
+        """Follow a sent character or keysym; returns the abbreviation it completes, or None"""
+        self.refresh()
+        if key == 'BackSpace':
+            self.typed = self.typed[:-1]
+        elif isinstance(key, str) and len(key) == 1:
+            # Keep one character more than the longest abbreviation, for the word boundary
+            self.typed = (self.typed + key)[-(self.longest + 1):]
+            for abbrev in self._by_last.get(key, ()):
+                if self.typed.endswith(abbrev):
+                    before = self.typed[-len(abbrev) - 1:-len(abbrev)]
+                    if not before or not before.isalnum():
+                        self.typed = ''
+                        return abbrev
+        elif key not in _STATE_KEYS:
+            # Chords, Return, Tab, cursor keys: we no longer know what precedes the cursor
+            self.typed = ''
+        return None
+
+    def reset(self):
+        """Forget the typed characters (text was inserted some other way)"""
+        self.typed = ''
+
+    def menu(self):
+        """(label, abbreviation) of every snippet, for the Snippets menu"""
+        self.refresh(force=True)
+        return sorted(((label, abbrev) for abbrev, label in self.labels.items()),
+                      key=lambda item: item[0].lower())
+
+    def injected(self, started, chars, error=None):
+        """Record an expansion that finished injecting (started is a perf_counter time)"""
+        if error is not None:
+            return
+        self.expansions += 1
+        self.expanded_chars += chars
+        self.latency_ms.append((time.perf_counter() - started) * 1000.0)
+
+    def stats(self):
+        stats = {'path': self.path, 'snippets': len(self.snippets), 'loads': self.loads,
+                 'expansions': self.expansions, 'expanded_chars': self.expanded_chars}
+        if self.latency_ms:
+            samples = sorted(self.latency_ms)
+            stats['expansion_ms'] = {'p50': round(percentile(samples, 50), 3),
+                                     'p95': round(percentile(samples, 95), 3),
+                                     'max': round(samples[-1], 3)}
+        return stats
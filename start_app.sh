@@ -20,4 +20,4 @@ eval "$(conda shell.bash hook)"
 conda activate zorin-keyboard
 
 # Run the application
-python floating_keyboard.py
+python floating_keyboard.py "$@"
@@ -0,0 +1,313 @@
+#!/usr/bin/env python3
+"""
+Swipe (gesture) typing for the Floating On-Screen Keyboard.
+
+With --swipe, dragging across the letter keys without lifting the pointer
+types a whole word. The pointer path is resampled to POINTS points evenly
+spaced along it and compared with a template for every lexicon word: the
+polyline through the centres of the word's letter keys, taken from the same
+compiled layout geometry create_keyboard lays the keys out with, resampled
+the same way.
+
+Decoding a gesture:
+
+    1. candidates are the words whose first and last letters are keys near
+       where the path starts and ends and whose template length is close to
+       the path length (templates are stored sorted by first and last key,
+       so each pair of keys is one contiguous slice)
+    2. the mean point-to-point distance to every candidate is computed in
+       one NumPy expression and the SHORTLIST closest are kept
+    3. those are re-scored with a banded dynamic time warping distance,
+       vectorized across the shortlist, plus a word frequency prior
+
+Templates are built on a background thread, so a large lexicon doesn't
+delay startup. A hibernating keyboard releases them and rebuilds them the
+same way when it is restored. NumPy is an optional dependency: without it swipe typing is
+unavailable and the keyboard works as before.
+"""
+
+import threading
+import time
+from collections import deque
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from latency import percentile
+
+# Points every gesture and word template is resampled to
+POINTS = 32
+
+# Pointer travel (in key widths) after which a press is a swipe, not a tap
+SWIPE_START = 0.6
+
+# Keys this close (in key widths) to where the path starts or ends are its
+# possible first or last letters, at most END_KEYS of them
+END_RADIUS = 1.0
+END_KEYS = 4
+
+# A template must be within this fraction of the path length, plus one key width
+LENGTH_TOLERANCE = 0.35
+
+# Candidates re-scored with DTW, and the DTW band half-width in points
+SHORTLIST = 48
+BAND = 4
+
+# Cost of -log(relative word frequency), against distances in key widths
+PRIOR_WEIGHT = 0.03
+
+# Row height over key width of the default keyboard, so distances are isotropic
+ROW_ASPECT = 0.72
+
+# Decode latencies kept for stats()
+LATENCY_SAMPLES = 1024
+
+
+def available():
+    """True if swipe typing can be used (NumPy is installed)"""
+    return np is not None
+
+
+def is_letter_key(key):
+    return len(key.text) == 1 and key.text.isalpha()
+
+
+def index_lexicon(index):
+    """(word, frequency) pairs of a prediction.WordIndex, iterable more than once"""
+    return _IndexLexicon(index)
+
+
+class _IndexLexicon:
+    def __init__(self, index):
+        self.index = index
+
+    def __iter__(self):
+        words = self.index.words
+        freqs = self.index.freqs
+        for i in range(len(self.index)):
+            yield words[i], freqs[i]
+
+
+def resample(points, n=POINTS):
+    """n points evenly spaced along a polyline, and its length"""
+    points = np.asarray(points, dtype=np.float64)
+    step = np.diff(points, axis=0)
+    seg_len = np.hypot(step[:, 0], step[:, 1])
+    # Repeated pointer positions would make the arc length non-increasing
+    keep = np.concatenate(([True], seg_len > 0))
+    points = points[keep]
+    cum = np.concatenate(([0.0], np.cumsum(seg_len[seg_len > 0])))
+    if len(points) < 2:
+        return np.repeat(points[:1], n, axis=0), 0.0
+    t = np.linspace(0.0, cum[-1], n)
+    resampled = np.stack([np.interp(t, cum, points[:, 0]), np.interp(t, cum, points[:, 1])], axis=1)
+    return resampled, float(cum[-1])
+
+
+def resample_paths(paths, n=POINTS):
+    """Resample k polylines of L >= 2 distinct vertices, (k, L, 2) -> (k, n, 2), and their lengths"""
+    seg = np.diff(paths, axis=1)
+    seg_len = np.hypot(seg[..., 0], seg[..., 1])
+    cum = np.concatenate([np.zeros((len(paths), 1)), np.cumsum(seg_len, axis=1)], axis=1)
+    total = cum[:, -1]
+    t = total[:, None] * np.linspace(0.0, 1.0, n)[None, :]
+    # Segment each sample falls on: how many inner vertices lie before it
+    index = (cum[:, None, 1:-1] <= t[:, :, None]).sum(axis=2)
+    start = np.take_along_axis(cum, index, axis=1)
+    length = np.maximum(np.take_along_axis(seg_len, index, axis=1), 1e-9)
+    frac = (t - start) / length
+    base = np.take_along_axis(paths, index[..., None], axis=1)
+    delta = np.take_along_axis(seg, index[..., None], axis=1)
+    return base + frac[..., None] * delta, total
+
+
+def dtw_distance(templates, gesture, band=BAND):
+    """Banded DTW distance per point between each (C, n, 2) template and an (n, 2) gesture"""
+    count, n = templates.shape[0], templates.shape[1]
+    diff = templates[:, :, None, :] - gesture[None, None, :, :]
+    cost = np.sqrt((diff * diff).sum(axis=3))
+    # acc[:, i + 1, j + 1]: cheapest alignment of template[:i + 1] with gesture[:j + 1]
+    acc = np.full((count, n + 1, n + 1), np.inf)
+    acc[:, 0, 0] = 0.0
+    for i in range(1, n + 1):
+        for j in range(max(1, i - band), min(n, i + band) + 1):
+            best = np.minimum(np.minimum(acc[:, i - 1, j], acc[:, i - 1, j - 1]), acc[:, i, j - 1])
+            acc[:, i, j] = cost[:, i - 1, j - 1] + best
+    return acc[:, n, n] / n
+
+
+class SwipeDecoder:
+    """Word templates for one layout layer and the path-to-word decoder"""
+
+    def __init__(self, layer):
+        self.layer = layer
+        letters = [key for key in layer.keys if is_letter_key(key)]
+        # Distances are measured in key widths (the most common letter key span)
+        spans = sorted(key.span for key in letters)
+        self.key_span = spans[len(spans) // 2] if spans else 1
+        self.letters = ''.join(key.text.lower() for key in letters)
+        self.centres = np.array([((key.col + key.span / 2) / self.key_span,
+                                  (key.row + 0.5) * ROW_ASPECT) for key in letters])
+        self.ready = threading.Event()
+        self.lexicon = None
+        self.words = []
+        self.templates = None
+        self.lengths = None
+        self.prior = None
+        self.pair_start = None
+        self.build_ms = None
+        self.decode_ms = deque(maxlen=LATENCY_SAMPLES)
+        self.candidates = 0
+        self.decodes = 0
+        self._cancel = False
+        self._thread = None
+
+    def start(self, lexicon):
+        """Build the templates for lexicon ((word, frequency) pairs) on a background thread"""
+        self.lexicon = lexicon
+        self._cancel = False
+        self._thread = threading.Thread(target=self.build, args=(lexicon,), name='swipe-templates',
+                                        daemon=True)
+        self._thread.start()
+
+    def close(self):
+        """Stop a build still running (it may be reading a word index about to be closed)"""
+        self._cancel = True
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def release(self):
+        """Drop the templates to free their memory; rebuild() makes them again"""
+        self.close()
+        self.ready.clear()
+        self.words = []
+        self.templates = None
+        self.lengths = None
+        self.prior = None
+        self.pair_start = None
+
+    def rebuild(self):
+        """Start building released templates again from the lexicon given to start()"""
+        if self.lexicon is not None and self.templates is None and self._thread is None:
+            self.start(self.lexicon)
+
+    def build(self, lexicon):
+        """Build the templates for lexicon ((word, frequency) pairs)"""
+        start = time.perf_counter()
+        key_of = {letter: i for i, letter in enumerate(self.letters)}
+        # Words grouped by their number of path vertices (repeated letters collapse)
+        groups = {}
+        for word, freq in lexicon:
+            if self._cancel:
+                return
+            path = []
+            for letter in word.lower():
+                if letter == "'":
+                    continue
+                key = key_of.get(letter)
+                if key is None:
+                    break
+                if not path or path[-1] != key:
+                    path.append(key)
+            else:
+                if path:
+                    groups.setdefault(len(path), []).append((word, freq, path))
+
+        words = []
+        templates = []
+        lengths = []
+        freqs = []
+        ends = []
+        for size, group in groups.items():
+            keys = np.array([path for _, _, path in group])
+            if size == 1:
+                resampled = np.repeat(self.centres[keys], POINTS, axis=1)
+                total = np.zeros(len(group))
+            else:
+                resampled, total = resample_paths(self.centres[keys])
+            words.extend(word for word, _, _ in group)
+            templates.append(resampled.astype(np.float32))
+            lengths.append(total)
+            freqs.extend(freq for _, freq, _ in group)
+            ends.append(keys[:, 0] * len(self.letters) + keys[:, -1])
+        if not words:
+            self.ready.set()
+            return
+
+        # Sort by (first key, last key) so each pair of end keys is one slice
+        pairs = np.concatenate(ends)
+        order = np.argsort(pairs, kind='stable')
+        freqs = np.maximum(np.array(freqs, dtype=np.float64), 1.0)
+        self.words = [words[i] for i in order]
+        self.templates = np.concatenate(templates)[order]
+        self.lengths = np.concatenate(lengths)[order]
+        self.prior = (PRIOR_WEIGHT * (np.log(freqs.max()) - np.log(freqs)))[order]
+        self.pair_start = np.searchsorted(pairs[order], np.arange(len(self.letters) ** 2 + 1))
+        self.build_ms = round((time.perf_counter() - start) * 1000, 1)
+        self.ready.set()
+
+    def to_keys(self, points):
+        """Layout grid points (columns, rows) in key widths"""
+        return np.asarray(points, dtype=np.float64) * (1.0 / self.key_span, ROW_ASPECT)
+
+    def travel(self, points):
+        """Length of a pointer path (layout grid units) in key widths"""
+        if len(points) < 2:
+            return 0.0
+        step = np.diff(self.to_keys(points), axis=0)
+        return float(np.hypot(step[:, 0], step[:, 1]).sum())
+
+    def near_keys(self, point):
+        """Keys a path end could be meant to start or end on, nearest first"""
+        distance = np.hypot(*(self.centres - point).T)
+        nearest = np.argsort(distance)[:END_KEYS]
+        return [key for i, key in enumerate(nearest) if i == 0 or distance[key] <= END_RADIUS]
+
+    def decode(self, points, k=4):
+        """Up to k words for a pointer path (layout grid units), best first"""
+        if not self.ready.is_set() or self.templates is None or len(points) < 2:
+            return []
+        start = time.perf_counter()
+        gesture, length = resample(self.to_keys(points))
+
+        # Prune by first and last key, then by template length
+        slices = []
+        for first in self.near_keys(gesture[0]):
+            for last in self.near_keys(gesture[-1]):
+                pair = first * len(self.letters) + last
+                slices.append(np.arange(self.pair_start[pair], self.pair_start[pair + 1]))
+        ids = np.concatenate(slices)
+        ids = ids[np.abs(self.lengths[ids] - length) <= LENGTH_TOLERANCE * length + 1.0]
+        self.candidates += len(ids)
+        words = []
+        if len(ids):
+            # Coarse score of every candidate: mean distance of corresponding points
+            candidates = self.templates[ids]
+            diff = candidates - gesture.astype(np.float32)
+            coarse = np.sqrt((diff * diff).sum(axis=2)).mean(axis=1) + self.prior[ids]
+            if len(ids) > SHORTLIST:
+                keep = np.argpartition(coarse, SHORTLIST)[:SHORTLIST]
+                ids = ids[keep]
+                candidates = candidates[keep]
+            # Elastic re-scoring of the shortlist
+            fine = dtw_distance(candidates.astype(np.float64), gesture) + self.prior[ids]
+            words = [self.words[i] for i in ids[np.argsort(fine)[:k]]]
+
+        self.decodes += 1
+        self.decode_ms.append((time.perf_counter() - start) * 1000.0)
+        return words
+
+    def stats(self):
+        stats = {'words': len(self.words), 'build_ms': self.build_ms, 'decodes': self.decodes}
+        if self.templates is not None:
+            stats['template_kb'] = self.templates.nbytes // 1024
+        if self.decode_ms:
+            samples = sorted(self.decode_ms)
+            stats['decode_ms'] = {'p50': round(percentile(samples, 50), 3),
+                                  'p95': round(percentile(samples, 95), 3),
+                                  'max': round(samples[-1], 3)}
+            stats['mean_candidates'] = round(self.candidates / self.decodes, 1)
+        return stats
@@ -0,0 +1,105 @@
+import gc
+import os
+import sys
+import time
+
+import pytest
+
+# The keyboard modules live at the top of the repository, not in a package,
+# and the benchmark helpers next to the benchmarks
+REPO_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+for path in (REPO_DIR, os.path.join(REPO_DIR, 'benchmarks')):
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+from floating_keyboard import FloatingKeyboard  # noqa: E402
+from modifiers import StickyModifiers  # noqa: E402
+
+
+class FakeCoalescer:
+    """Records why the keyboard flushed instead of sending anything"""
+
+    def __init__(self):
+        self.flushes = []
+
+    def flush(self, reason):
+        self.flushes.append(reason)
+
+
+class FakeRoot:
+    """Tk root calls without a display; after() timers fire only in run_timers()"""
+
+    def __init__(self):
+        self.timers = {}
+        self.next_id = 0
+        self.geometries = []
+
+    def after(self, ms, callback, *args):
+        self.next_id += 1
+        self.timers[self.next_id] = (callback, args)
+        return self.next_id
+
+    def after_idle(self, callback, *args):
+        return self.after(0, callback, *args)
+
+    def after_cancel(self, timer):
+        self.timers.pop(timer, None)
+
+    def run_timers(self):
+        for timer in list(self.timers):
+            callback, args = self.timers.pop(timer)
+            callback(*args)
+
+    def geometry(self, spec):
+        self.geometries.append(spec)
+
+    def winfo_x(self):
+        return 100
+
+    def winfo_y(self):
+        return 200
+
+    def winfo_width(self):
+        return 920
+
+    def winfo_height(self):
+        return 250
+
+
+@pytest.fixture(autouse=True)
+def collect_garbage():
+    """Free each test's reference cycles on the main thread
+
+    A Tcl interpreter left in a cycle aborts the process if a later test's
+    worker thread happens to be the one that garbage-collects it.
+    """
+    yield
+    gc.collect()
+
+
+@pytest.fixture
+def fake_root():
+    return FakeRoot()
+
+
+@pytest.fixture
+def keyboard():
+    """A FloatingKeyboard with its key state but no window, backend or threads
+
+    Jobs handed to submit_job are collected in keyboard.jobs.
+    """
+    kb = FloatingKeyboard.__new__(FloatingKeyboard)
+    kb.shift_active = False
+    kb.caps_active = False
+    kb.modifiers = StickyModifiers()
+    kb.shift_map = {'1': '!'}
+    kb.target_window = None
+    kb.hibernated = False
+    kb.script_server = None
+    kb.last_input = time.monotonic()
+    kb.coalescer = FakeCoalescer()
+    kb.jobs = []
+    kb.submit_job = lambda job: kb.jobs.append(job) or True
+    kb.has_target = lambda: kb.target_window is not None
+    kb.update_key_display = lambda: None
+    return kb
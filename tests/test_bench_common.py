@@ -0,0 +1,22 @@
+"""Baseline comparison of the benchmark suite"""
+
+import json
+
+from bench_common import compare_to_baseline, load_baseline, metric
+
+
+def test_missing_baseline_is_none(tmp_path):
+    assert load_baseline(str(tmp_path / 'baseline.json')) is None
+
+
+def test_regressions_beyond_tolerance(tmp_path):
+    path = tmp_path / 'baseline.json'
+    path.write_text(json.dumps({'metrics': {'startup_ms': metric(100, 'ms'),
+                                            'keys_per_s': metric(1000, '/s', better='higher')}}))
+    baseline = load_baseline(str(path))
+    assert compare_to_baseline({'startup_ms': metric(120, 'ms'),
+                                'keys_per_s': metric(800, '/s', better='higher')},
+                               baseline, 0.25) == []
+    assert compare_to_baseline({'startup_ms': metric(130, 'ms'),
+                                'keys_per_s': metric(700, '/s', better='higher')},
+                               baseline, 0.25) == [('startup_ms', 100, 130), ('keys_per_s', 1000, 700)]
@@ -0,0 +1,96 @@
+"""Canvas key layer hit-testing and press handling, against a recording canvas"""
+
+from types import SimpleNamespace
+
+import pytest
+
+from canvas_renderer import CanvasLayer
+from layout_engine import compile_layout
+
+
+class FakeCanvas:
+    def __init__(self):
+        self.items = {}
+        self.bindings = {}
+        self.scales = []
+
+    def _create(self, kind, coords, options):
+        item = len(self.items) + 1
+        self.items[item] = dict(options, kind=kind, coords=coords)
+        return item
+
+    def create_rectangle(self, *coords, **options):
+        return self._create('rectangle', coords, options)
+
+    def create_text(self, *coords, **options):
+        return self._create('text', coords, options)
+
+    def itemconfigure(self, item, **options):
+        self.items[item].update(options)
+
+    def bind(self, sequence, handler):
+        self.bindings[sequence] = handler
+
+    def scale(self, tag, x, y, sx, sy):
+        self.scales.append((sx, sy))
+
+    def delete(self, *items):
+        for item in items:
+            del self.items[item]
+
+
+# Two rows on a 10-column grid: a b [gap] Enter / Space
+LAYER = compile_layout({'columns': 10, 'layers': {'main': {'rows': [
+    ['a', 'b', {'gap': 2}, {'text': 'Enter', 'keysym': 'Return', 'span': 4}],
+    [{'text': 'Space', 'keysym': 'space', 'span': 10}],
+]}}}).layers['main']
+
+
+@pytest.fixture
+def layer():
+    pressed = []
+    layer = CanvasLayer(FakeCanvas(), LAYER, lambda size: None,
+                        lambda spec: lambda: pressed.append(spec.text), 200, 100)
+    layer.pressed = pressed
+    return layer
+
+
+def click(layer, x, y, release_x=None, release_y=None):
+    layer.canvas.bindings['<ButtonPress-1>'](SimpleNamespace(x=x, y=y))
+    layer.canvas.bindings['<ButtonRelease-1>'](SimpleNamespace(
+        x=x if release_x is None else release_x, y=y if release_y is None else release_y))
+
+
+def label(key):
+    return key.canvas.items[key.label]['text'] if key is not None else None
+
+
+def test_hit_test_finds_keys_and_misses_gaps(layer):
+    # Keys are two 20 px columns wide and each row is 50 px high
+    assert label(layer.key_at(5, 10)) == 'a'
+    assert label(layer.key_at(40, 10)) == 'b'
+    assert layer.key_at(90, 10) is None
+    assert label(layer.key_at(199, 10)) == 'Enter'
+    assert label(layer.key_at(100, 60)) == 'Space'
+    assert layer.key_at(100, 120) is None and layer.key_at(-1, 10) is None
+
+
+def test_key_fires_only_when_released_over_it(layer):
+    click(layer, 5, 10)
+    click(layer, 5, 10, release_x=50)
+    click(layer, 90, 10)
+    assert layer.pressed == ['a']
+
+
+def test_resize_scales_items_and_hit_testing(layer):
+    layer.canvas.bindings['<Configure>'](SimpleNamespace(width=400, height=100))
+    assert layer.canvas.scales == [(2.0, 1.0)]
+    assert label(layer.key_at(100, 10)) == 'b'
+
+
+def test_keys_configure_like_buttons(layer):
+    key = layer.keys[('Enter', 'Return')]
+    key.configure(bg='blue', relief='sunken', fg='white', text='Go')
+    rect = layer.canvas.items[key.rect]
+    assert (rect['fill'], rect['outline'], rect['width']) == ('blue', 'white', 2)
+    assert label(key) == 'Go' and key.cget('bg') == 'blue'
@@ -0,0 +1,134 @@
+"""Control and scripting sockets"""
+
+import json
+import os
+import socket
+import stat
+import threading
+import time
+import tkinter
+
+import pytest
+
+from daemon import (ControlServer, DaemonError, claim_socket_path, listen_socket, run_client_command,
+                    send_command)
+
+
+def test_socket_is_private_from_creation(tmp_path):
+    path = str(tmp_path / 'kb.sock')
+    previous = os.umask(0o022)
+    try:
+        sock = listen_socket(path, 1)
+        assert os.umask(0o022) == 0o022
+    finally:
+        os.umask(previous)
+    try:
+        mode = os.stat(path).st_mode
+        assert stat.S_ISSOCK(mode)
+        assert mode & 0o777 == 0o600
+    finally:
+        sock.close()
+
+
+def test_claim_refuses_to_delete_a_regular_file(tmp_path):
+    path = tmp_path / 'notes.txt'
+    path.write_text('keep me')
+    with pytest.raises(DaemonError, match='not a socket'):
+        claim_socket_path(str(path))
+    assert path.read_text() == 'keep me'
+
+
+def test_claim_removes_a_stale_socket(tmp_path):
+    path = str(tmp_path / 'kb.sock')
+    listen_socket(path, 1).close()
+    claim_socket_path(path)
+    assert not os.path.exists(path)
+
+
+def test_claim_refuses_a_live_socket(tmp_path):
+    path = str(tmp_path / 'kb.sock')
+    sock = listen_socket(path, 1)
+    try:
+        with pytest.raises(DaemonError, match='already listening'):
+            claim_socket_path(path)
+    finally:
+        sock.close()
+
+
+@pytest.fixture
+def control(tmp_path):
+    def broken():
+        raise RuntimeError('boom')
+    handlers = {'status': lambda: {'visible': False},
+                'broken': broken,
+                'opaque': lambda: {'widget': object()}}
+    # A Tcl interpreter runs the same event loop as Tk, without a display
+    server = ControlServer(tkinter.Tcl(), handlers, str(tmp_path / 'kb.sock'))
+    yield server
+    server.close()
+
+
+def run_events(server, seconds):
+    """Service the event loop for a while without ever blocking in it"""
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        start = time.monotonic()
+        server.root.tk.dooneevent(tkinter._tkinter.DONT_WAIT)
+        assert time.monotonic() - start < 0.05
+
+
+def command(server, data):
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.connect(server.path)
+        sock.sendall(data)
+        sock.setblocking(False)
+        reply = b''
+        deadline = time.monotonic() + 2
+        while not reply.endswith(b'\n') and time.monotonic() < deadline:
+            run_events(server, 0.01)
+            try:
+                reply += sock.recv(4096)
+            except BlockingIOError:
+                pass
+    return json.loads(reply)
+
+
+def test_partial_command_does_not_block_the_mainloop(control):
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as slow:
+        slow.connect(control.path)
+        slow.sendall(b'{"command": ')
+        run_events(control, 0.2)
+        # Others are answered while the slow client is still typing
+        assert command(control, b'{"command": "status"}\n')['visible'] is False
+        slow.sendall(b'"status"}\n')
+        slow.settimeout(0)
+        run_events(control, 0.05)
+        assert json.loads(slow.recv(4096))['ok']
+    assert not control.clients
+
+
+def test_failing_handler_gets_an_error_reply(control):
+    reply = command(control, b'{"command": "broken"}\n')
+    assert reply == {'ok': False, 'error': 'broken failed: boom'}
+    reply = command(control, b'{"command": "opaque"}\n')
+    assert not reply['ok'] and 'not encodable' in reply['error']
+    assert command(control, b'{"command": "status"}\n')['ok']
+
+
+def test_client_command_round_trip(control):
+    replies = []
+    client = threading.Thread(target=lambda: replies.append(send_command('status', control.path)))
+    client.start()
+    deadline = time.monotonic() + 2
+    while client.is_alive() and time.monotonic() < deadline:
+        run_events(control, 0.01)
+    client.join()
+    assert replies[0]['ok'] and replies[0]['visible'] is False
+    assert control.stats()['status']['count'] == 1
+    assert command(control, b'{"command": "nope"}\n')['error'].startswith('unknown command')
+
+
+def test_client_without_daemon_fails(tmp_path, capsys):
+    assert run_client_command(['--toggle', '--socket', str(tmp_path / 'none.sock')]) == 1
+    assert 'Start it with' in capsys.readouterr().out
+    assert run_client_command(['--layout', 'qwerty.json']) is None
@@ -0,0 +1,125 @@
+"""Keystroke dispatch on the worker thread and burst coalescing in front of it"""
+
+import threading
+
+from dispatch import BurstCoalescer, KeyDispatcher, KeyJob
+from injection import InjectionError, StubBackend
+
+
+class GatedBackend(StubBackend):
+    """Stub that holds every activation until the test opens the gate"""
+
+    def __init__(self):
+        super().__init__()
+        self.gate = threading.Event()
+
+    def activate(self, window):
+        self.gate.wait(2)
+        super().activate(window)
+        if window == 'bad':
+            raise InjectionError("BadWindow")
+
+
+def run(dispatcher):
+    dispatcher.backend.gate.set()
+    dispatcher.stop()
+
+
+def test_jobs_are_injected_in_order():
+    done = []
+    dispatcher = KeyDispatcher(GatedBackend(), lambda job, error: done.append((job, error)))
+    jobs = [KeyJob('1', 'type', 'hi'), KeyJob('1', 'key', 'BackSpace', count=3),
+            KeyJob('1', 'chord', ('Control_L', 'c')), KeyJob('1', 'key', 'Return')]
+    for job in jobs:
+        assert dispatcher.submit(job)
+    run(dispatcher)
+    assert [job for job, _ in done] == jobs
+    assert [entry for entry in dispatcher.backend.log if entry[0] != 'activate'] == [
+        ('type', 'hi'), ('key', 'BackSpace', 3), ('chord', ('Control_L', 'c')), ('key', 'Return')]
+
+
+def test_full_queue_drops_without_blocking():
+    dispatcher = KeyDispatcher(GatedBackend(), lambda job, error: None, maxsize=2)
+    accepted = [dispatcher.submit(KeyJob('1', 'type', str(i))) for i in range(5)]
+    # One job is held by the worker, two wait in the queue
+    assert accepted.count(True) in (2, 3)
+    assert dispatcher.dropped == accepted.count(False)
+    run(dispatcher)
+
+
+def test_errors_are_reported_and_later_jobs_still_run():
+    done = []
+    dispatcher = KeyDispatcher(GatedBackend(), lambda job, error: done.append((job.window, error)))
+    dispatcher.submit(KeyJob('bad', 'type', 'x'))
+    dispatcher.submit(KeyJob('1', 'type', 'y'))
+    run(dispatcher)
+    assert isinstance(done[0][1], InjectionError)
+    assert done[1] == ('1', None)
+
+
+class ManualTimers:
+    """schedule/cancel for the coalescer, fired by hand"""
+
+    def __init__(self):
+        self.timers = {}
+        self.next_id = 0
+
+    def schedule(self, ms, callback):
+        self.next_id += 1
+        self.timers[self.next_id] = callback
+        return self.next_id
+
+    def cancel(self, timer):
+        self.timers.pop(timer, None)
+
+    def fire(self):
+        for timer in list(self.timers):
+            self.timers.pop(timer)()
+
+
+def make_coalescer(window_ms=30, max_chars=64):
+    jobs = []
+    timers = ManualTimers()
+    coalescer = BurstCoalescer(lambda job: jobs.append(job) or True, timers.schedule, timers.cancel,
+                               window_ms=window_ms, max_chars=max_chars)
+    return coalescer, timers, jobs
+
+
+def test_burst_becomes_one_injection():
+    coalescer, timers, jobs = make_coalescer()
+    for char in 'hello':
+        coalescer.add('1', char)
+    assert not jobs and len(timers.timers) == 1
+    timers.fire()
+    assert [(job.window, job.kind, job.payload) for job in jobs] == [('1', 'type', 'hello')]
+    assert coalescer.stats()['chars_per_injection'] == 5
+
+
+def test_flush_keeps_order_with_other_keys_and_targets():
+    coalescer, timers, jobs = make_coalescer()
+    coalescer.add('1', 'a')
+    coalescer.add('2', 'b')
+    coalescer.flush('special')
+    assert [(job.window, job.payload) for job in jobs] == [('1', 'a'), ('2', 'b')]
+    assert not timers.timers
+
+
+def test_full_buffer_and_disabled_window():
+    coalescer, timers, jobs = make_coalescer(max_chars=3)
+    for char in 'abcd':
+        coalescer.add('1', char)
+    assert [job.payload for job in jobs] == ['abc'] and coalescer.pending() == 1
+    coalescer, timers, jobs = make_coalescer(window_ms=0)
+    coalescer.add('1', 'a')
+    coalescer.add('1', 'b')
+    assert [job.payload for job in jobs] == ['a', 'b'] and not timers.timers
+
+
+
+def test_retract_takes_back_buffered_characters():
+    coalescer, timers, jobs = make_coalescer()
+    for char in 'btw':
+        coalescer.add('1', char)
+    assert coalescer.retract(5) == 3
+    coalescer.flush()
+    assert not jobs
@@ -0,0 +1,80 @@
+"""Broadcasting keys to several windows, each with its own worker"""
+
+import threading
+
+from dispatch import KeyJob
+from fanout import FanoutDispatcher
+from injection import StubBackend
+
+
+class Fanout:
+    """A FanoutDispatcher on stub backends, collecting what it reports"""
+
+    def __init__(self, dead=()):
+        self.backends = []
+        self.done = []
+        self.dead = []
+        self.finished = threading.Condition()
+        self.dispatcher = FanoutDispatcher(self.backend, self.on_done, self.dead.append)
+        self.dead_windows = set(dead)
+
+    def backend(self):
+        backend = StubBackend()
+        backend.dead_windows = self.dead_windows
+        self.backends.append(backend)
+        return backend
+
+    def on_done(self, job, error):
+        with self.finished:
+            self.done.append((job.payload, error))
+            self.finished.notify()
+
+    def wait(self, count):
+        with self.finished:
+            self.finished.wait_for(lambda: len(self.done) >= count, timeout=2)
+
+
+def delivered(backend):
+    return [entry[1:4] for entry in backend.log]
+
+
+def test_every_target_gets_every_key_in_order():
+    fanout = Fanout()
+    dispatcher = fanout.dispatcher
+    assert dispatcher.add_target(1, 'one') and dispatcher.add_target(2, 'two')
+    assert not dispatcher.add_target('1')
+    for text in ('a', 'b', 'c'):
+        assert dispatcher.submit(KeyJob(None, 'type', text))
+    dispatcher.submit(KeyJob(None, 'key', 'Return'))
+    fanout.wait(4)
+    dispatcher.stop()
+    assert fanout.done == [('a', None), ('b', None), ('c', None), ('Return', None)]
+    for window, backend in zip(('1', '2'), fanout.backends):
+        assert delivered(backend) == [(window, 'type', 'a'), (window, 'type', 'b'),
+                                      (window, 'type', 'c'), (window, 'key', 'Return')]
+    assert dispatcher.stats()['targets']['2']['sent'] == 4
+
+
+def test_destroyed_target_is_reported_once_and_skipped():
+    fanout = Fanout(dead={'2'})
+    dispatcher = fanout.dispatcher
+    dispatcher.add_target(1)
+    dispatcher.add_target(2)
+    dispatcher.submit(KeyJob(None, 'type', 'a'))
+    dispatcher.submit(KeyJob(None, 'type', 'b'))
+    fanout.wait(2)
+    dispatcher.stop()
+    assert fanout.dead == ['2']
+    # The first job reports the failure; later ones aren't even tried
+    assert str(fanout.done[0][1]) == 'BadWindow: 2' and fanout.done[1] == ('b', None)
+    assert delivered(fanout.backends[0]) == [('1', 'type', 'a'), ('1', 'type', 'b')]
+    assert dispatcher.stats()['targets']['2']['failures'] == 1
+
+
+def test_no_targets_means_nothing_is_queued():
+    dispatcher = Fanout().dispatcher
+    assert not dispatcher.submit(KeyJob(None, 'type', 'a'))
+    dispatcher.add_target(1)
+    assert dispatcher.remove_target(1) and not dispatcher.remove_target(1)
+    assert not dispatcher.submit(KeyJob(None, 'type', 'a'))
+    assert dispatcher.stats()['dropped'] == 2
@@ -0,0 +1,51 @@
+"""Drag and resize apply at most one geometry change per frame"""
+
+from types import SimpleNamespace
+
+import pytest
+
+
+def motion(x, y):
+    return SimpleNamespace(x_root=x, y_root=y)
+
+
+@pytest.fixture
+def window(keyboard, fake_root):
+    kb = keyboard
+    kb.root = fake_root
+    kb.is_minimized = False
+    kb._geometry_job = None
+    kb._pending_size = kb._pending_position = None
+    kb.font_widths = []
+    kb.update_font_size = kb.font_widths.append
+    return kb
+
+
+def test_drag_events_within_a_frame_move_once(window):
+    window.start_drag(motion(10, 10))
+    for step in range(1, 20):
+        window.do_drag(motion(10 + step, 10 + 2 * step))
+    assert window.root.geometries == [] and len(window.root.timers) == 1
+    window.root.run_timers()
+    assert window.root.geometries == ['+119+238']
+    assert window.font_widths == []
+
+
+def test_resize_and_drag_share_one_geometry_call(window):
+    window.start_resize(motion(0, 0))
+    window.do_resize(motion(50, 30))
+    window.do_resize(motion(80, -500))
+    window.start_drag(motion(0, 0))
+    window.do_drag(motion(5, 5))
+    window.root.run_timers()
+    # Never smaller than 500x150
+    assert window.root.geometries == ['1000x150+105+205']
+    assert window.font_widths == [1000]
+
+
+def test_pending_geometry_is_dropped_when_cancelled(window):
+    window.start_drag(motion(0, 0))
+    window.do_drag(motion(5, 5))
+    window.cancel_pending_geometry()
+    window.root.run_timers()
+    assert window.root.geometries == [] and window._pending_position is None
@@ -0,0 +1,107 @@
+"""Idle hibernation, its monitor, and staying awake while API or fan-out keys are sent"""
+
+import time
+import tkinter
+
+import pytest
+
+import hibernation
+from dispatch import KeyJob
+from hibernation import ACTIVE, HIBERNATED, HibernationMonitor, count_widgets
+
+
+class FakeDispatcher:
+    def submit(self, job):
+        return True
+
+
+class FakeFanout:
+    workers = {}
+
+
+class FakeScriptServer:
+    connected = True
+
+    def busy(self):
+        return self.connected
+
+
+@pytest.fixture
+def idle_keyboard(keyboard):
+    kb = keyboard
+    # A Tcl interpreter runs the same event loop as Tk, without a display
+    kb.root = tkinter.Tcl()
+    kb.visible = False
+    kb.is_minimized = False
+    kb.idle_hibernate_ms = 1000
+    kb.last_input = time.monotonic() - 10
+    kb._idle_timer = None
+    kb.hibernations = 0
+    kb.hibernate = lambda: setattr(kb, 'hibernations', kb.hibernations + 1)
+    yield kb
+    kb.cancel_hibernation()
+
+
+def test_submitted_jobs_count_as_input(idle_keyboard):
+    kb = idle_keyboard
+    # The real submit_job, which API and fan-out keys go through
+    del kb.submit_job
+    kb.dispatcher = FakeDispatcher()
+    kb.fanout = FakeFanout()
+    kb.jobs_submitted = 0
+    kb.update_queue_indicator = lambda: None
+    assert kb.submit_job(KeyJob('1', 'type', 'x'))
+    kb._idle_check()
+    assert kb.hibernations == 0 and kb._idle_timer is not None
+
+
+def test_no_hibernation_while_a_script_is_connected(idle_keyboard):
+    kb = idle_keyboard
+    kb.script_server = FakeScriptServer()
+    kb._idle_check()
+    assert kb.hibernations == 0 and kb._idle_timer is not None
+
+    kb.script_server.connected = False
+    kb.last_input = time.monotonic() - 10
+    kb.cancel_hibernation()
+    kb._idle_check()
+    assert kb.hibernations == 1
+
+
+class FakeWidget:
+    def __init__(self, *children):
+        self.children = children
+
+    def winfo_children(self):
+        return self.children
+
+
+def test_count_widgets_includes_the_root():
+    assert count_widgets(FakeWidget(FakeWidget(), FakeWidget(FakeWidget()))) == 4
+
+
+def test_monitor_splits_time_and_wakeups_by_state(monkeypatch):
+    clock = [100.0]
+    wakeups = [0]
+    monkeypatch.setattr(hibernation.time, 'monotonic', lambda: clock[0])
+    monkeypatch.setattr(hibernation, 'process_wakeups', lambda: wakeups[0])
+    monitor = HibernationMonitor()
+    monitor.sample(50000, 120)
+    clock[0] += 60
+    wakeups[0] += 30
+    monitor.enter(HIBERNATED, 20000, 3)
+    clock[0] += 120
+    wakeups[0] += 2
+    stats = monitor.stats()
+    assert stats['state'] == HIBERNATED and stats['hibernations'] == 1
+    assert stats[ACTIVE] == {'seconds': 60.0, 'wakeups': 30, 'wakeups_per_min': 30.0,
+                             'rss_kb': 50000, 'widgets': 120}
+    assert stats[HIBERNATED]['wakeups_per_min'] == 1.0
+    assert stats[HIBERNATED]['widgets'] == 3 and 'rebuild_ms' not in stats
+
+    monitor.enter(ACTIVE, 48000, 40, rebuild_ms=12.3456)
+    monitor.enter(HIBERNATED, 20000, 3)
+    monitor.enter(ACTIVE, 48000, 40, rebuild_ms=8.0)
+    stats = monitor.stats()
+    assert stats['hibernations'] == 2
+    assert stats['rebuild_ms'] == {'last': 8.0, 'max': 12.346, 'count': 2}
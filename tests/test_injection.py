@@ -0,0 +1,166 @@
+"""Backend key taps against a simulated keymap or a recording xdotool, no display needed"""
+
+import subprocess
+
+from injection import XdotoolBackend, XTestBackend
+from x11 import LOCK_MASK, MAPPING_KEYBOARD, MAPPING_NOTIFY
+
+# keycode -> (level 1 keysym, level 2 keysym), as on a US keymap
+KEYMAP = {
+    38: (ord('a'), ord('A')),
+    10: (ord('1'), ord('!')),
+    50: (0xffe1, 0xffe1),   # Shift_L
+    66: (0xffe5, 0xffe5),   # Caps_Lock
+}
+SHIFT_KEYCODE = 50
+CAPS_KEYCODE = 66
+
+
+class FakeServer:
+    """Turns faked key events into characters the way X does for the ALPHABETIC key type"""
+
+    def __init__(self):
+        self.keymap = dict(KEYMAP)
+        self.shift = False
+        self.lock = False
+        self.typed = ''
+        self.events = []
+
+    def remap(self, keycode, new_keycode):
+        """Move a key to another keycode, as xmodmap or a layout switch would"""
+        self.keymap[new_keycode] = self.keymap.pop(keycode)
+        self.events.append((MAPPING_NOTIFY, MAPPING_KEYBOARD))
+
+    # libX11
+    def XKeysymToKeycode(self, display, keysym):
+        for keycode, syms in self.keymap.items():
+            if keysym in syms:
+                return keycode
+        return 0
+
+    def XkbKeycodeToKeysym(self, display, keycode, group, level):
+        return self.keymap[keycode][level]
+
+    def XStringToKeysym(self, name):
+        return {b'Caps_Lock': 0xffe5, b'Shift_L': 0xffe1}.get(name, 0)
+
+    def XFlush(self, display):
+        pass
+
+    def XSync(self, display, discard):
+        pass
+
+    def XPending(self, display):
+        return len(self.events)
+
+    def XNextEvent(self, display, event):
+        event._obj.type, event._obj.xmapping.request = self.events.pop(0)
+
+    def XRefreshKeyboardMapping(self, event):
+        pass
+
+    # libXtst
+    def XTestFakeKeyEvent(self, display, keycode, press, delay):
+        if keycode == SHIFT_KEYCODE:
+            self.shift = press
+        elif keycode == CAPS_KEYCODE:
+            if press:
+                self.lock = not self.lock
+        elif press:
+            low, high = self.keymap[keycode]
+            letter = chr(low).isalpha()
+            shifted = self.shift != self.lock if letter else self.shift
+            self.typed += chr(high if shifted else low)
+
+    # XConnection
+    def modifier_state(self):
+        return LOCK_MASK if self.lock else 0
+
+
+def make_backend(server):
+    backend = XTestBackend.__new__(XTestBackend)
+    backend._xtst = backend._xlib = backend.conn = server
+    backend.display = 1
+    backend._shift_keycode = SHIFT_KEYCODE
+    backend._scratch_keycode = 0
+    backend._keycode_cache = {}
+    return backend
+
+
+def press(kb, backend, keycode, display):
+    """What the dispatcher does with the result of one key press"""
+    sent = kb.resolve_key(keycode, display)
+    if sent is None:
+        return
+    if len(sent) == 1:
+        backend.type_text(sent)
+    else:
+        backend.key(sent)
+
+
+def test_caps_lock_letter_is_uppercase(keyboard):
+    server = FakeServer()
+    backend = make_backend(server)
+    press(keyboard, backend, 'Caps_Lock', 'Caps')
+    assert server.lock
+    press(keyboard, backend, 'a', 'a')
+    press(keyboard, backend, '1', '1')
+    assert server.typed == 'A1'
+
+
+def test_caps_lock_off_again_types_lowercase(keyboard):
+    server = FakeServer()
+    backend = make_backend(server)
+    for keycode, display in [('Caps_Lock', 'Caps'), ('a', 'a'), ('Caps_Lock', 'Caps'), ('a', 'a')]:
+        press(keyboard, backend, keycode, display)
+    assert server.typed == 'Aa'
+
+
+def test_shift_without_caps_lock(keyboard):
+    server = FakeServer()
+    backend = make_backend(server)
+    for keycode, display in [('Shift_L', 'Shift'), ('a', 'a'), ('a', 'a'), ('Shift_L', 'Shift'), ('1', '1')]:
+        press(keyboard, backend, keycode, display)
+    assert server.typed == 'Aa!'
+
+
+def test_repeated_letter_key_with_caps_lock():
+    server = FakeServer()
+    backend = make_backend(server)
+    server.lock = True
+    backend.key('A', repeat=3)
+    assert server.typed == 'AAA'
+
+
+class FakeResult:
+    returncode = 0
+    stderr = ''
+
+
+def record_xdotool(monkeypatch):
+    calls = []
+    monkeypatch.setattr(subprocess, 'run', lambda args, **kwargs: calls.append(args) or FakeResult())
+    return calls
+
+
+def test_xdotool_chord_with_plus_key(monkeypatch):
+    calls = record_xdotool(monkeypatch)
+    backend = XdotoolBackend()
+    backend.chord(('Control_L', '+'))
+    backend.deliver(7, 'chord', ('Control_L', 'Shift_L', '-'))
+    backend.chord(('Alt_L', 'Return'))
+    assert calls == [
+        ['xdotool', 'key', '--clearmodifiers', 'Control_L+plus'],
+        ['xdotool', 'key', '--window', '7', 'Control_L+Shift_L+minus'],
+        ['xdotool', 'key', '--clearmodifiers', 'Alt_L+Return'],
+    ]
+
+
+def test_remapped_key_is_looked_up_again():
+    server = FakeServer()
+    backend = make_backend(server)
+    backend.type_text('a')
+    server.remap(38, 24)
+    backend.type_text('a')
+    backend.key('a')
+    assert server.typed == 'aaa'
@@ -0,0 +1,86 @@
+"""Keystroke journal files"""
+
+import os
+from types import SimpleNamespace
+
+import pytest
+
+from journal import JournalWriter, Replayer, load_journals, read_journal
+from modifiers import LATCHED
+
+
+@pytest.mark.parametrize('fmt', ['jsonl', 'binary'])
+def test_journal_round_trip(tmp_path, fmt):
+    path = str(tmp_path / f'keys.{fmt}')
+    writer = JournalWriter(path, fmt)
+    writer.record('a', 'a', (False, False, ()))
+    writer.record('Shift_L', 'Shift', (False, False, ()))
+    writer.record('t', 't', (True, True, (('Control_L', LATCHED),)))
+    writer.close()
+    entries = read_journal(path)
+    assert [(e.keycode, e.display) for e in entries] == [('a', 'a'), ('Shift_L', 'Shift'), ('t', 't')]
+    assert entries[2].state == (True, True, (('Control_L', LATCHED),))
+    assert entries[0].t <= entries[1].t <= entries[2].t
+
+
+@pytest.mark.parametrize('fmt', ['jsonl', 'binary'])
+def test_journal_files_are_private(tmp_path, fmt):
+    path = str(tmp_path / 'keys.log')
+    previous = os.umask(0o022)
+    try:
+        writer = JournalWriter(path, fmt, max_bytes=200, backups=2)
+        for _ in range(50):
+            writer.record('a', 'a', (False, False, ()))
+        writer.close()
+    finally:
+        os.umask(previous)
+    assert writer.rotations
+    for name in ('keys.log', 'keys.log.1', 'keys.log.2'):
+        assert os.stat(tmp_path / name).st_mode & 0o777 == 0o600
+    # Only the newest backups are kept
+    assert not os.path.exists(tmp_path / 'keys.log.3')
+
+
+def test_redacted_journal_keeps_named_keys_only(tmp_path):
+    path = str(tmp_path / 'keys.jsonl')
+    writer = JournalWriter(path, redact=True)
+    writer.record('p', 'p', (False, False, ()))
+    writer.record('BackSpace', 'Backspace', (False, False, ()))
+    writer.close()
+    assert [e.keycode for e in read_journal(path)] == ['x', 'BackSpace']
+
+
+def write_session(path, keys):
+    writer = JournalWriter(path)
+    for key in keys:
+        writer.record(key, key, (False, False, ()))
+    writer.close()
+
+
+def test_sessions_are_joined_into_one_timeline(tmp_path):
+    first, second = str(tmp_path / 'keys.jsonl.1'), str(tmp_path / 'keys.jsonl')
+    write_session(first, 'ab')
+    write_session(second, 'cd')
+    entries = load_journals([first, second])
+    assert [e.keycode for e in entries] == list('abcd')
+    assert [e.t for e in entries] == sorted(e.t for e in entries)
+
+
+def test_replay_at_full_speed_feeds_every_press(tmp_path, keyboard, fake_root):
+    path = str(tmp_path / 'keys.jsonl')
+    write_session(path, 'hello')
+    kb = keyboard
+    kb.root = fake_root
+    kb.dispatcher = SimpleNamespace(jobs=SimpleNamespace(maxsize=64), dropped=0)
+    kb.queue_depth = lambda: 0
+    kb.tracer = None
+    kb.jobs_submitted = kb.jobs_finished = 0
+    kb.presses = []
+    kb.on_key_press = lambda keycode, display: kb.presses.append(keycode)
+    reports = []
+    replayer = Replayer(kb, read_journal(path), speed=0, on_finish=reports.append)
+    replayer.start()
+    fake_root.run_timers()
+    assert kb.presses == list('hello')
+    assert reports[0]['presses'] == 5 and reports[0]['state_mismatches'] == 0
+    assert kb.coalescer.flushes == ['exit']
@@ -0,0 +1,77 @@
+"""Precomputed key state tables and repaints of only the options that changed"""
+
+import pytest
+
+from modifiers import LATCHED
+
+THEME = {'key_bg': 'grey', 'key_fg': 'white', 'active_bg': 'silver',
+         'shift_bg': 'blue', 'caps_bg': 'green'}
+KEYS = [('a', 'a'), ('1', '1'), ('Shift', 'Shift_L'), ('Caps', 'Caps_Lock'), ('Ctrl', 'Control_L'),
+        ('Enter', 'Return')]
+
+
+class FakeButton:
+    def __init__(self):
+        self.configures = []
+
+    def configure(self, **options):
+        self.configures.append(options)
+
+
+@pytest.fixture
+def keys(keyboard):
+    kb = keyboard
+    # The real repaint, not the fixture's no-op
+    del kb.update_key_display
+    kb.themes = {'dark': THEME, 'light': dict(THEME, key_bg='white', key_fg='black')}
+    kb.current_theme = 'dark'
+    kb.key_labels = {}
+    kb.buttons = {key: FakeButton() for key in KEYS}
+    kb.applied_options = {key: {} for key in KEYS}
+    kb.configure_count = 0
+    kb.build_state_tables()
+    kb.update_key_display()
+    return kb
+
+
+def text(kb, display):
+    key = next(key for key in KEYS if key[0] == display)
+    return kb.applied_options[key]['text']
+
+
+def test_every_base_state_is_precomputed(keys):
+    assert len(keys.state_tables) == 2 * 2 * 2
+    assert keys.last_repaint_configures == len(KEYS)
+
+
+def test_shift_repaints_only_the_keys_it_changes(keys):
+    keys.shift_active = True
+    keys.update_key_display()
+    assert (text(keys, 'a'), text(keys, '1')) == ('A', '!')
+    # a, 1 and the Shift key itself; Caps, Ctrl and Enter look the same
+    assert keys.last_repaint_configures == 3
+    assert keys.buttons[('a', 'a')].configures[-1] == {'text': 'A'}
+    keys.update_key_display()
+    assert keys.last_repaint_configures == 0
+
+
+def test_caps_lock_only_changes_letters(keys):
+    keys.caps_active = True
+    keys.update_key_display()
+    assert (text(keys, 'a'), text(keys, '1')) == ('A', '1')
+    assert keys.last_repaint_configures == 2
+
+
+def test_theme_switch_recolors_every_key(keys):
+    keys.current_theme = 'light'
+    keys.update_key_display()
+    assert keys.last_repaint_configures == len(KEYS)
+    assert keys.buttons[('Enter', 'Return')].configures[-1] == {'bg': 'white', 'fg': 'black'}
+
+
+def test_latched_modifier_table_is_built_on_first_use(keys):
+    keys.modifiers.state['Control_L'] = LATCHED
+    keys.update_key_display()
+    assert keys.last_repaint_configures == 1
+    assert keys.applied_options[('Ctrl', 'Control_L')]['bg'] == 'blue'
+    assert len(keys.state_tables) == 2 * 2 * 2 + 1
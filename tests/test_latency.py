@@ -0,0 +1,59 @@
+"""Per-keypress latency traces and the ring buffer they are kept in"""
+
+import csv
+import json
+
+from latency import KeyTrace, LatencyTracer, percentile
+
+
+def finished_trace(keycode, total_ms, restored=True):
+    trace = KeyTrace(keycode)
+    trace.press = 0.0
+    trace.resolved = 0.001
+    trace.dequeued = 0.002
+    trace.activated = 0.003
+    trace.injected = 0.004
+    trace.restored = total_ms / 1000 if restored else None
+    return trace
+
+
+def test_stage_durations():
+    durations = finished_trace('a', 10).durations()
+    assert [round(d, 6) for d in durations] == [1, 1, 1, 1, 6, 10]
+    assert finished_trace('a', 10, restored=False).durations()[-2:] == (None, None)
+
+
+def test_percentiles_are_nearest_rank():
+    values = list(range(1, 101))
+    assert [percentile(values, p) for p in (50, 95, 99, 100)] == [50, 95, 99, 100]
+    assert percentile([], 50) is None
+
+
+def test_ring_buffer_keeps_the_newest_samples():
+    tracer = LatencyTracer(size=3)
+    for i in range(5):
+        tracer.record(finished_trace(str(i), 10 + i))
+    assert len(tracer) == 3 and tracer.count == 5
+    assert [row['key'] for row in tracer.samples()] == ['2', '3', '4']
+    summary = tracer.summary()
+    assert summary['samples'] == 3 and summary['total']['max_ms'] == 14
+
+
+def test_skipped_stages_are_left_out_of_the_summary():
+    tracer = LatencyTracer(size=4)
+    tracer.record(finished_trace('a', 10, restored=False))
+    assert tracer.summary()['restore']['p50_ms'] is None
+    assert tracer.samples()[0]['total_ms'] is None
+    assert tracer.overlay_text() == 'lat: -'
+
+
+def test_dump_as_json_and_csv(tmp_path):
+    tracer = LatencyTracer(size=4)
+    tracer.record(finished_trace('a', 10))
+    tracer.dump(str(tmp_path / 'metrics.json'))
+    report = json.loads((tmp_path / 'metrics.json').read_text())
+    assert report['summary']['total']['p50_ms'] == 10
+    tracer.dump(str(tmp_path / 'metrics.csv'))
+    with open(tmp_path / 'metrics.csv', newline='') as f:
+        rows = list(csv.DictReader(f))
+    assert rows[0]['key'] == 'a' and float(rows[0]['total_ms']) == 10
@@ -0,0 +1,70 @@
+"""Compiling layout files and caching the result"""
+
+import json
+import os
+
+import pytest
+
+import layout_engine
+from layout_engine import DEFAULT_LAYOUT, LayoutError, compile_layout, load_layout
+
+
+@pytest.fixture(autouse=True)
+def cache_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(layout_engine, 'CACHE_DIR', str(tmp_path / 'cache'))
+    monkeypatch.setattr(layout_engine, '_memory_cache', {})
+    return tmp_path / 'cache'
+
+
+def layout(rows, **extra):
+    return dict({'columns': 10, 'layers': {'main': {'rows': rows}, 'sym': {'rows': [['!']]}}}, **extra)
+
+
+def test_shipped_layout_compiles():
+    qwerty = load_layout(DEFAULT_LAYOUT)
+    assert qwerty.default_layer in qwerty.layers
+    main = qwerty.layers[qwerty.default_layer]
+    keys = {key.text: key for key in main.keys}
+    assert keys['q'].keysym == 'q' and keys['Enter'].keysym == 'Return'
+    # Every layer a key switches to exists
+    assert all(key.layer in qwerty.layers for layer in qwerty.layers.values()
+               for key in layer.keys if key.layer)
+
+
+def test_keys_are_placed_on_the_grid():
+    compiled = compile_layout(layout([['a', {'gap': 1}, {'text': 'Enter', 'keysym': 'Return', 'span': 4},
+                                       {'text': '123', 'layer': 'sym'}]]))
+    keys = compiled.layers['main'].keys
+    assert [(key.text, key.col, key.span) for key in keys] == [('a', 0, 2), ('Enter', 3, 4), ('123', 7, 2)]
+    assert keys[2].keysym == 'layer:sym' and compiled.default_layer == 'main'
+
+
+@pytest.mark.parametrize('data, message', [
+    (layout([[{'text': 'x', 'layer': 'nope'}]]), 'unknown layer'),
+    (layout([['a', 'a']]), 'duplicate key'),
+    (layout([list('abcdef')]), 'spans 12 of 10 columns'),
+    (layout([['a']], default_layer='nope'), 'not defined'),
+])
+def test_malformed_layouts_are_refused(data, message):
+    with pytest.raises(LayoutError, match=message):
+        compile_layout(data)
+
+
+def test_compiled_layout_is_cached_until_the_file_changes(tmp_path, cache_dir):
+    path = tmp_path / 'layout.json'
+    path.write_text(json.dumps(layout([['a']])))
+    first = load_layout(str(path))
+    assert os.listdir(cache_dir)
+    layout_engine._memory_cache.clear()
+    assert load_layout(str(path)) == first
+
+    path.write_text(json.dumps(layout([['a', 'b']])))
+    os.utime(path, ns=(0, os.stat(path).st_mtime_ns + 1))
+    assert [key.text for key in load_layout(str(path)).layers['main'].keys] == ['a', 'b']
+
+
+def test_unparsable_file_is_a_layout_error(tmp_path):
+    path = tmp_path / 'layout.json'
+    path.write_text('{"layers": {"main": {}}}')
+    with pytest.raises(LayoutError):
+        load_layout(str(path))
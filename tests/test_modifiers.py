@@ -0,0 +1,54 @@
+"""Sticky Ctrl/Alt/Win modifiers sent as single chords"""
+
+import pytest
+
+from injection import parse_chord
+from modifiers import LATCHED, LOCKED, StickyModifiers
+
+
+def test_tap_cycles_latched_locked_off():
+    modifiers = StickyModifiers()
+    modifiers.tap('Control_L')
+    assert modifiers.state == {'Control_L': LATCHED}
+    modifiers.tap('Control_L')
+    assert modifiers.state == {'Control_L': LOCKED}
+    modifiers.tap('Control_L')
+    assert not modifiers
+
+
+def test_latch_is_used_up_and_lock_is_kept():
+    modifiers = StickyModifiers()
+    modifiers.tap('Alt_L')
+    modifiers.tap('Control_L')
+    modifiers.tap('Control_L')
+    # Modifiers go first in a fixed order, Shift last before the key
+    assert modifiers.compose('t', shift=True) == ('Control_L', 'Alt_L', 'Shift_L', 't')
+    assert modifiers.compose('c') == ('Control_L', 'c')
+    assert modifiers.stats() == {'chords': 2, 'latches': 2, 'locks': 1}
+
+
+def test_key_with_modifiers_is_one_chord(keyboard):
+    kb = keyboard
+    assert kb.resolve_key('Control_L', 'Ctrl') is None
+    assert kb.resolve_key('Shift_L', 'Shift') is None
+    assert kb.resolve_key('c', 'c') == ('Control_L', 'Shift_L', 'c')
+    # Shift and the latch are both used up by the chord
+    assert not kb.shift_active and not kb.modifiers
+    assert kb.resolve_key('c', 'c') == 'c'
+    kb.resolve_key('Super_L', 'Win')
+    assert kb.resolve_key(' ', 'Space') == ('Super_L', 'space')
+
+
+@pytest.mark.parametrize('spec, keysyms', [
+    ('ctrl+alt+t', ('Control_L', 'Alt_L', 't')),
+    (['Control_L', 'Return'], ('Control_L', 'Return')),
+    ('super + l', ('Super_L', 'l')),
+])
+def test_parse_chord(spec, keysyms):
+    assert parse_chord(spec) == keysyms
+
+
+@pytest.mark.parametrize('spec', ['', 'ctrl+', []])
+def test_parse_chord_refuses_empty_keys(spec):
+    with pytest.raises(ValueError):
+        parse_chord(spec)
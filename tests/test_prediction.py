@@ -0,0 +1,114 @@
+"""Word index files and learned words"""
+
+import sys
+
+import pytest
+
+import floating_keyboard
+from prediction import WordIndex, WordPredictor, create_predictor, load_index
+
+WORDS = {'hello': 50, 'help': 40, 'helmet': 5, 'world': 30, 'word': 20}
+
+
+def write_word_list(tmp_path):
+    path = tmp_path / 'words.txt'
+    path.write_text(''.join(f'{word}\t{freq}\n' for word, freq in WORDS.items()))
+    return str(path)
+
+
+def test_completions_are_ranked_by_frequency(tmp_path):
+    index = WordIndex.build(WORDS)
+    assert index.complete('he', 3) == [('hello', 50), ('help', 40), ('helmet', 5)]
+    assert index.complete('wor', 1) == [('world', 30)]
+    assert index.complete('x') == []
+    # A saved index answers the same
+    path = str(tmp_path / 'words.idx')
+    index.save(path)
+    loaded = WordIndex.load(path)
+    assert loaded.complete('he', 3) == index.complete('he', 3)
+    loaded.close()
+
+
+def test_suggestions_follow_the_typed_word():
+    predictor = WordPredictor(WordIndex.build(WORDS), k=2)
+    for key in 'wo':
+        predictor.feed(key)
+    assert predictor.suggestions() == ['world', 'word']
+    predictor.feed('BackSpace')
+    predictor.feed('BackSpace')
+    assert predictor.suggestions() == []
+    for key in 'helm':
+        predictor.feed(key)
+    assert predictor.suggestions() == ['helmet']
+    assert predictor.pick('helmet') == 'et'
+
+
+def test_learned_words_come_first():
+    predictor = WordPredictor(WordIndex.build(WORDS), k=2)
+    for key in 'helium ':
+        predictor.feed(key)
+    for key in 'he':
+        predictor.feed(key)
+    assert predictor.suggestions() == ['helium', 'hello']
+    # Editing keys lose track of the word
+    predictor.feed('Left')
+    assert predictor.word == '' and predictor.suggestions() == []
+
+def test_truncated_index_is_rejected(tmp_path):
+    path = str(tmp_path / 'words.idx')
+    WordIndex.build(WORDS).save(path)
+    data = open(path, 'rb').read()
+    for length in (1, 20, len(data) // 2, len(data) - 1):
+        with open(path, 'wb') as f:
+            f.write(data[:length])
+        with pytest.raises(ValueError):
+            WordIndex.load(path)
+
+
+def test_truncated_index_is_rebuilt(tmp_path):
+    words_path = write_word_list(tmp_path)
+    index_path = str(tmp_path / 'words.idx')
+    index, timings = load_index(words_path, index_path)
+    index.close()
+    assert 'build_ms' in timings
+    data = open(index_path, 'rb').read()
+    # Cut inside the offset table, where casting the view used to raise TypeError
+    with open(index_path, 'wb') as f:
+        f.write(data[:len(data) // 3 + 1])
+
+    index, timings = load_index(words_path, index_path)
+    assert 'build_ms' in timings
+    assert [word for word, _ in index.complete('hel', 2)] == ['hello', 'help']
+    index.close()
+
+    index, timings = load_index(words_path, index_path)
+    assert 'load_ms' in timings
+    index.close()
+
+
+def test_learned_words_stay_in_memory_by_default(tmp_path):
+    predictor = create_predictor(write_word_list(tmp_path), persist_index=False)
+    predictor.learn('secret')
+    predictor.save_user_words()
+    predictor.close()
+    assert predictor.user_words_path is None
+    assert sorted(p.name for p in tmp_path.iterdir()) == ['words.txt']
+
+
+def test_learned_words_file_is_private(tmp_path):
+    learn_path = tmp_path / 'learned.json'
+    learn_path.write_text('{}')
+    learn_path.chmod(0o644)
+    predictor = create_predictor(write_word_list(tmp_path), persist_index=False,
+                                 learn_path=str(learn_path))
+    predictor.learn('hello')
+    predictor.save_user_words()
+    predictor.close()
+    assert learn_path.stat().st_mode & 0o777 == 0o600
+    assert WordPredictor(user_words_path=str(learn_path)).user_words == {'hello': 1}
+
+
+@pytest.mark.parametrize('argv, predict', [([], False), (['--predict'], True)])
+def test_suggestions_are_opt_in(monkeypatch, argv, predict):
+    monkeypatch.setattr(sys, 'argv', ['floating_keyboard.py'] + argv)
+    assert floating_keyboard.parse_args().predict is predict
@@ -0,0 +1,84 @@
+"""Batched auto-repeat of a held key"""
+
+import pytest
+
+
+@pytest.fixture
+def held(keyboard, fake_root):
+    kb = keyboard
+    kb.root = fake_root
+    kb.target_window = '1'
+    kb.predictor = kb.snippets = None
+    kb.repeat_delay_ms = 400
+    kb.repeat_interval_ms = 40
+    kb.swipe_consumed = False
+    kb._repeat_timer = kb._repeat_key = kb._repeat_fired = kb._repeat_sent = kb._repeat_job = None
+    kb._repeat_pending = 0
+    kb.repeats_sent = kb.repeat_injections = 0
+    kb.presses = []
+
+    def on_key_press(keycode, display):
+        kb.presses.append(keycode)
+        kb.last_sent = keycode
+    kb.on_key_press = on_key_press
+    kb.send_key = lambda keysym: kb.presses.append(keysym)
+    return kb
+
+
+def test_held_key_repeats_in_batches(held):
+    held.start_repeat('BackSpace', 'Backspace')
+    assert not held.presses
+    held.root.run_timers()
+    # The press itself goes out once the delay has passed
+    assert held.presses == ['BackSpace']
+    held.root.run_timers()
+    assert [(job.payload, job.count) for job in held.jobs] == [('BackSpace', 1)]
+    # Ticks while that batch is being injected pile up
+    for _ in range(3):
+        held.root.run_timers()
+    assert len(held.jobs) == 1 and held._repeat_pending == 3
+    held._repeat_job = None
+    held.flush_repeats()
+    assert [job.count for job in held.jobs] == [1, 3]
+
+
+def test_release_sends_pending_repeats_and_no_second_press(held):
+    held.start_repeat('Delete', 'Del')
+    for _ in range(3):
+        held.root.run_timers()
+    held.stop_repeat()
+    assert [job.count for job in held.jobs] == [1, 1] and not held.root.timers
+    held.tap_key('Delete', 'Del')
+    assert held.presses == ['Delete']
+
+
+def test_quick_tap_does_not_repeat(held):
+    held.start_repeat('a', 'a')
+    held.stop_repeat()
+    held.tap_key('a', 'a')
+    assert held.presses == ['a'] and not held.jobs and not held.root.timers
+
+
+def test_characters_repeat_through_the_coalescer(held):
+    held.start_repeat('x', 'x')
+    for _ in range(3):
+        held.root.run_timers()
+    assert held.presses == ['x', 'x', 'x'] and not held.jobs
+
+
+def test_repeats_without_target_are_dropped(keyboard):
+    kb = keyboard
+    kb._repeat_sent = 'BackSpace'
+    kb._repeat_job = None
+    kb.repeat_injections = 0
+
+    kb._repeat_pending = 3
+    kb.flush_repeats()
+    assert kb._repeat_pending == 0 and not kb.jobs
+
+    # Repeats after a target is picked go out on their own, not with the dropped ones
+    kb.target_window = '1'
+    kb._repeat_pending = 1
+    kb.flush_repeats()
+    assert [(job.payload, job.count) for job in kb.jobs] == [('BackSpace', 1)]
+    assert kb._repeat_pending == 0
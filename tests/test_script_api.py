@@ -0,0 +1,139 @@
+"""Scripting API request handling, without sockets or a display"""
+
+import json
+from collections import deque
+
+import pytest
+
+import script_api
+from script_api import ScriptServer
+
+
+@pytest.fixture
+def server(keyboard):
+    server = ScriptServer.__new__(ScriptServer)
+    server.keyboard = keyboard
+    server.connections = {}
+    server.pending = deque()
+    server.queued = 0
+    server.in_flight = None
+    server.requests = server.injections = server.errors = server.max_batch = 0
+    server.replies = []
+    server._reply = lambda conn, reply: server.replies.append(reply)
+    return server
+
+
+class FakeConnection:
+    requests = 0
+
+
+def submit(server, request):
+    server.submit_line(FakeConnection(), json.dumps(request).encode())
+
+
+def queued(server):
+    return [(batch.kind, ''.join(batch.payload) if batch.kind == 'type' else batch.payload, batch.count)
+            for batch in server.pending]
+
+
+def test_pipelined_requests_share_one_injection(server):
+    kb = server.keyboard
+    kb.target_window = '1'
+    for i, text in enumerate(['hello', ' ', 'world']):
+        submit(server, {'id': i, 'text': text})
+    server.pump()
+    assert [(job.kind, job.payload) for job in kb.jobs] == [('type', 'hello world')]
+    # Acknowledged together once the batch has been injected
+    assert not server.replies
+    server._on_injected(kb.jobs[0], None)
+    assert server.replies == [{'id': i, 'ok': True} for i in range(3)]
+    assert server.stats()['requests_per_injection'] == 3
+
+
+def test_chords_split_batches_in_order(server):
+    kb = server.keyboard
+    kb.target_window = '1'
+    submit(server, {'id': 1, 'text': 'ab'})
+    submit(server, {'id': 2, 'chord': 'ctrl+s'})
+    submit(server, {'id': 3, 'text': 'c'})
+    assert queued(server) == [('type', 'ab', 2), ('chord', ('Control_L', 's'), 1), ('type', 'c', 1)]
+    server.pump()
+    server._on_injected(kb.jobs[-1], RuntimeError('BadWindow'))
+    assert server.replies == [{'id': 1, 'ok': False, 'error': 'BadWindow'}]
+    assert [job.kind for job in kb.jobs] == ['type', 'chord']
+
+
+def test_keys_without_a_target_fail(server):
+    submit(server, {'id': 1, 'text': 'x'})
+    server.pump()
+    assert server.replies == [{'id': 1, 'ok': False, 'error': 'no target window'}]
+
+def test_repeated_caps_lock_keeps_state_in_step(server):
+    submit(server, {'id': 1, 'key': 'Caps_Lock', 'repeat': 3})
+    assert server.keyboard.caps_active
+    assert queued(server) == [('key', 'Caps_Lock', 3)]
+    submit(server, {'id': 2, 'key': 'Caps_Lock', 'repeat': 2})
+    assert server.keyboard.caps_active
+    assert queued(server) == [('key', 'Caps_Lock', 5)]
+
+
+def test_repeated_letter_with_shift_releases_shift_after_first(server):
+    submit(server, {'id': 1, 'key': 'Shift_L'})
+    submit(server, {'id': 2, 'key': 'a', 'repeat': 3})
+    assert not server.keyboard.shift_active
+    assert queued(server)[-1] == ('type', 'Aaa', 3)
+    # The request is acknowledged once, by its last injection
+    assert [acks for batch in server.pending for _, acks in batch.acks] == [1, 2]
+
+
+def test_repeat_over_limit_is_refused(server):
+    submit(server, {'id': 1, 'text': 'x', 'repeat': 10 ** 9})
+    submit(server, {'id': 2, 'key': 'x', 'repeat': 10 ** 9})
+    assert server.replies[-1]['id'] == 2 and not server.replies[-1]['ok']
+    assert server.queued == 1
+    assert queued(server) == [('type', 'x', 1)]
+
+
+def test_queue_is_bounded(server):
+    chunk = 'y' * script_api.MAX_BATCH_CHARS
+    for i in range(script_api.MAX_QUEUED // len(chunk)):
+        submit(server, {'id': i, 'text': chunk})
+    assert not server.replies
+    submit(server, {'id': 'full', 'text': 'z'})
+    assert server.replies == [{'id': 'full', 'ok': False, 'error': server.replies[0]['error']}]
+    assert server.queued == script_api.MAX_QUEUED
+    # Once the queue drains (here: refused for lack of a target) there is room again
+    server.pump()
+    assert server.queued == 0 and not server.pending
+    submit(server, {'id': 'again', 'text': 'z'})
+    assert server.queued == 1
+
+
+def test_fields_of_the_wrong_type_are_refused(server):
+    conn = FakeConnection()
+    for i, line in enumerate([b'{"id": 1, "key": "a", "repeat": Infinity}',
+                              b'{"id": 2, "key": "a", "repeat": true}',
+                              b'{"id": 3, "key": "a", "repeat": 2.5}',
+                              b'{"id": 4, "chord": [1, 2]}',
+                              b'{"id": 5, "text": null}',
+                              b'{"id": 6, "key": ["a"]}',
+                              b'[1, 2]',
+                              b'[' * 100000], 1):
+        server.submit_line(conn, line)
+        assert len(server.replies) == i and not server.replies[-1]['ok']
+    assert not server.pending and server.queued == 0
+
+
+def test_hibernated_keyboard_wakes_before_keys_go_out(server):
+    kb = server.keyboard
+    kb.hibernated = True
+    kb.target_window = 'stale'
+
+    def wake():
+        # The restarted window tracker reports the window that is active now
+        kb.hibernated = False
+        kb.target_window = 'active'
+    kb.wake = wake
+    submit(server, {'id': 1, 'text': 'hi'})
+    server.pump()
+    assert [(job.window, job.payload) for job in kb.jobs] == [('active', 'hi')]
@@ -0,0 +1,27 @@
+"""SIGUSR1 metric dumps reach an idle Tk event loop"""
+
+import os
+import signal
+import tkinter
+
+
+def test_sigusr1_wakes_idle_event_loop(keyboard):
+    kb = keyboard
+    # A Tcl interpreter runs the same event loop as Tk, without a display
+    kb.root = tkinter.Tcl()
+    kb._signal_pipe = None
+    dumps = []
+    kb.dump_metrics = lambda: dumps.append(True)
+    kb.watch_signals()
+    timed_out = []
+    timer = kb.root.after(2000, lambda: timed_out.append(True))
+    try:
+        os.kill(os.getpid(), signal.SIGUSR1)
+        # Blocks in Tcl until an event source fires, like an idle mainloop
+        while not dumps and not timed_out:
+            kb.root.tk.dooneevent(0)
+    finally:
+        kb.root.after_cancel(timer)
+        kb.unwatch_signals()
+    assert dumps and not timed_out
+    assert signal.getsignal(signal.SIGUSR1) == signal.SIG_DFL
@@ -0,0 +1,99 @@
+"""Snippet loading, abbreviation matching and expansion"""
+
+import json
+import os
+import time
+
+import pytest
+
+import snippets
+from snippets import SnippetStore, expansion
+
+
+@pytest.fixture
+def store(tmp_path):
+    path = tmp_path / 'snippets.json'
+    path.write_text(json.dumps({';addr': '221B Baker Street',
+                                ';sig': {'text': 'Kind regards', 'label': 'Signature'},
+                                'x;sig': 'Other'}))
+    store = SnippetStore(str(path))
+    store.refresh()
+    return store
+
+
+def feed(store, text):
+    return [store.feed(key) for key in text]
+
+
+def test_expansion_keeps_the_common_prefix():
+    assert expansion(';addr', '221B') == (5, '221B')
+    assert expansion('teh', 'the') == (2, 'he')
+    assert expansion('btw', 'btw.') == (0, '.')
+
+
+def test_abbreviation_expands_only_at_a_word_start(store):
+    assert feed(store, 'hi ;sig')[-1] == ';sig'
+    assert store.typed == ''
+    assert feed(store, 'hi;sig')[-1] is None
+    store.reset()
+    # The longest abbreviation ending the typed text wins
+    assert feed(store, ' x;sig')[-1] == 'x;sig'
+
+
+def test_backspace_and_other_keys(store):
+    assert feed(store, ';sx')[-1] is None
+    assert store.feed('BackSpace') is None
+    assert store.feed('i') is None and store.feed('g') == ';sig'
+    feed(store, ';si')
+    store.feed('Shift_L')
+    assert store.feed('g') == ';sig'
+    feed(store, ';si')
+    store.feed('Return')
+    assert store.feed('g') is None
+
+
+def test_menu_sorted_by_label(store):
+    assert store.menu() == [(';addr', ';addr'), ('Signature', ';sig'), ('x;sig', 'x;sig')]
+
+
+def test_reload_when_the_file_changes(store, monkeypatch):
+    monkeypatch.setattr(snippets, 'CHECK_INTERVAL', 0)
+    with open(store.path, 'w') as f:
+        json.dump({';a': 'alpha', ';b': 7}, f)
+    os.utime(store.path, ns=(1, 1))
+    store.refresh()
+    assert store.snippets == {';a': 'alpha'} and store.loads == 2
+    os.remove(store.path)
+    store.refresh()
+    assert len(store) == 0 and store.loads == 3
+
+
+def test_bad_file_keeps_the_loaded_snippets(store, capsys):
+    with open(store.path, 'w') as f:
+        f.write('[1, 2')
+    store.refresh(force=True)
+    assert len(store) == 3 and 'Error loading snippets' in capsys.readouterr().out
+    with pytest.raises(ValueError):
+        store.load(['not', 'a', 'dict'])
+
+
+def test_injected_stats(store):
+    store.injected(0.0, 5, error='no window')
+    assert store.stats()['expansions'] == 0
+    store.injected(time.perf_counter(), 12)
+    stats = store.stats()
+    assert stats['expansions'] == 1 and stats['expanded_chars'] == 12
+    assert 'expansion_ms' in stats
+
+
+def test_keyboard_expands_without_resending_buffered_characters(keyboard, store):
+    kb = keyboard
+    kb.target_window = '1'
+    kb.snippets = store
+    kb.predictor = None
+    # Three of the four abbreviation characters were still in the coalescer
+    kb.coalescer.retract = lambda count: min(count, 3)
+    kb.expand_snippet(';sig')
+    assert [(job.kind, job.payload) for job in kb.jobs] == [('type', '\bKind regards')]
+    kb.jobs[0].callback(kb.jobs[0], None)
+    assert store.expansions == 1
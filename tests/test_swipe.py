@@ -0,0 +1,52 @@
+"""Swipe path-to-word decoding on the shipped layout"""
+
+import pytest
+
+np = pytest.importorskip('numpy')
+
+from layout_engine import DEFAULT_LAYOUT, load_layout  # noqa: E402
+from swipe import POINTS, SwipeDecoder, resample  # noqa: E402
+
+LEXICON = [('hello', 50), ('help', 40), ('hill', 20), ('world', 30), ('word', 20), ('wet', 10),
+           ('the', 90), ('tree', 15)]
+
+
+@pytest.fixture(scope='module')
+def decoder():
+    layout = load_layout(DEFAULT_LAYOUT)
+    decoder = SwipeDecoder(layout.layers[layout.default_layer])
+    decoder.start(LEXICON)
+    assert decoder.ready.wait(5)
+    yield decoder
+    decoder.close()
+
+
+def path_through(decoder, word):
+    """Pointer path (layout grid units) straight through the centres of word's keys"""
+    keys = {key.text: key for key in decoder.layer.keys}
+    return [(keys[c].col + keys[c].span / 2, keys[c].row + 0.5) for c in word]
+
+
+def test_resample_spaces_points_evenly():
+    # A repeated pointer position doesn't count
+    points, length = resample([(0, 0), (0, 0), (2, 0), (6, 0)])
+    assert len(points) == POINTS and length == 6
+    assert np.allclose(np.diff(points[:, 0]), 6 / (POINTS - 1)) and not points[:, 1].any()
+
+
+@pytest.mark.parametrize('word', ['hello', 'world', 'the', 'wet'])
+def test_path_through_a_word_decodes_to_it(decoder, word):
+    assert decoder.decode(path_through(decoder, word))[0] == word
+
+
+def test_alternates_share_the_path_ends(decoder):
+    words = decoder.decode(path_through(decoder, 'word'))
+    assert words[0] == 'word' and set(words) <= {'word', 'world', 'wet'}
+
+
+def test_released_templates_decode_nothing_until_rebuilt(decoder):
+    decoder.release()
+    assert decoder.decode(path_through(decoder, 'hello')) == []
+    decoder.rebuild()
+    assert decoder.ready.wait(5)
+    assert decoder.decode(path_through(decoder, 'hello'))[0] == 'hello'
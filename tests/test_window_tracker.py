@@ -0,0 +1,140 @@
+"""Active-window tracking and the focus cache, from X events on a fake X connection"""
+
+import pytest
+
+from dispatch import KeyDispatcher, KeyJob
+from injection import StubBackend
+from window_tracker import ActiveWindowTracker, FocusCache
+from x11 import (CONFIGURE_NOTIFY, DESTROY_NOTIFY, FOCUS_IN, FOCUS_OUT, NOTIFY_INFERIOR,
+                 PROPERTY_NOTIFY, XEvent)
+
+ACTIVE_ATOM = 300
+KEYBOARD = 10
+
+
+class FakeXlib:
+    def __init__(self):
+        self.selected = {}
+
+    def XSelectInput(self, display, window, mask):
+        self.selected[window] = mask
+
+    def XFlush(self, display):
+        pass
+
+
+class FakeConnection:
+    display = 1
+
+    def __init__(self):
+        self.xlib = FakeXlib()
+        self.active = None
+        self.names = {}
+
+    def get_active_window(self):
+        return self.active
+
+    def window_name(self, window):
+        return self.names.get(window, '')
+
+
+@pytest.fixture
+def tracker():
+    tracker = ActiveWindowTracker.__new__(ActiveWindowTracker)
+    tracker.conn = FakeConnection()
+    tracker.exclude = {KEYBOARD}
+    tracker.changes_seen = []
+    tracker.on_change = lambda window, name: tracker.changes_seen.append((window, name))
+    tracker.focus = FocusCache()
+    tracker.current = None
+    tracker.current_name = ''
+    tracker.events = tracker.changes = 0
+    tracker._watched = None
+    tracker._active_atom = ACTIVE_ATOM
+    return tracker
+
+
+def event(kind, window=0, atom=0, detail=0):
+    ev = XEvent()
+    ev.type = kind
+    if kind == PROPERTY_NOTIFY:
+        ev.xproperty.atom = atom
+    elif kind in (FOCUS_IN, FOCUS_OUT):
+        ev.xfocus.window = window
+        ev.xfocus.detail = detail
+    else:
+        ev.xany.window = window
+    return ev
+
+
+def activate(tracker, window):
+    tracker.conn.active = window
+    tracker._handle(event(PROPERTY_NOTIFY, atom=ACTIVE_ATOM))
+
+
+def test_active_window_changes_are_reported_once(tracker):
+    tracker.conn.names = {20: 'Editor', 30: 'Terminal'}
+    activate(tracker, 20)
+    activate(tracker, 20)
+    # Other root properties changing don't count
+    tracker._handle(event(PROPERTY_NOTIFY, atom=ACTIVE_ATOM + 1))
+    activate(tracker, 30)
+    assert tracker.changes_seen == [(20, 'Editor'), (30, 'Terminal')]
+    assert tracker.current == 30 and tracker.changes == 2
+
+
+def test_keyboard_itself_is_never_the_target(tracker):
+    activate(tracker, 20)
+    activate(tracker, KEYBOARD)
+    assert tracker.current == 20 and tracker.changes_seen == [(20, '')]
+    # Focus follows the real active window all the same
+    assert tracker.focus.focused == KEYBOARD
+
+
+def test_events_are_watched_on_the_active_window_only(tracker):
+    activate(tracker, 20)
+    activate(tracker, 30)
+    assert tracker.conn.xlib.selected[20] == 0
+    assert tracker.conn.xlib.selected[30] == ActiveWindowTracker.WATCH_MASK
+
+
+
+def test_focus_and_stacking_events_update_the_focus_cache(tracker):
+    focus = tracker.focus
+    tracker._handle(event(FOCUS_IN, 20))
+    tracker._handle(event(FOCUS_OUT, 20, detail=NOTIFY_INFERIOR))
+    assert focus.focused == 20
+    tracker._handle(event(FOCUS_OUT, 20))
+    assert focus.focused is None
+    tracker._handle(event(FOCUS_IN, 20))
+    tracker._handle(event(DESTROY_NOTIFY, 20))
+    assert focus.focused is None
+    focus.obscured = False
+    tracker._handle(event(CONFIGURE_NOTIFY, 20))
+    assert focus.obscured
+
+
+def test_activation_and_raise_are_skipped_while_still_valid():
+    focus = FocusCache()
+    # Unknown at first: activate and raise
+    assert focus.needs_activation('20') and focus.needs_raise()
+    focus.focus_in(20)
+    assert not focus.needs_activation('20') and not focus.needs_raise()
+    assert focus.needs_activation('30')
+    focus.forget()
+    assert focus.needs_activation('20') and focus.needs_raise()
+    assert focus.stats() == {'activations': 3, 'activations_avoided': 1,
+                             'raises': 2, 'raises_avoided': 1}
+
+
+def test_dispatcher_activates_only_when_focus_moved():
+    focus = FocusCache()
+    backend = StubBackend()
+    dispatcher = KeyDispatcher(backend, lambda job, error: None, focus=focus)
+    dispatcher.inject(KeyJob('20', 'type', 'a'))
+    focus.focus_in(20)
+    dispatcher.inject(KeyJob('20', 'type', 'b'))
+    focus.focus_lost(20)
+    dispatcher.inject(KeyJob('20', 'type', 'c'))
+    dispatcher.stop()
+    assert [entry for entry in backend.log if entry[0] == 'activate'] == [('activate', '20')] * 2
@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+"""
+Event-driven active-window tracking for the Floating On-Screen Keyboard.
+
+Instead of running `xdotool getactivewindow` (and a window-tree name search
+for our own id), a background thread keeps a persistent X connection,
+subscribes to PropertyNotify on the root window and re-reads
+_NET_ACTIVE_WINDOW only when the window manager changes it. The current
+target is cached in `current`, so the key path never touches X to find it.
+
+The tracker also watches FocusIn/FocusOut and structure events on the
+active window and keeps a FocusCache up to date, so the dispatcher can skip
+re-activating a window that still has focus and the keyboard can skip
+re-raising itself when nothing was stacked over it.
+"""
+
+import ctypes
+import os
+import select
+import threading
+
+from x11 import (CONFIGURE_NOTIFY, DESTROY_NOTIFY, FOCUS_CHANGE_MASK, FOCUS_IN, FOCUS_OUT,
+                 NOTIFY_INFERIOR, PROPERTY_CHANGE_MASK, PROPERTY_NOTIFY,
+                 STRUCTURE_NOTIFY_MASK, UNMAP_NOTIFY, XConnection, XEvent)
+
+
+class FocusCache:
+    """Last known input focus and keyboard stacking, updated only from X events
+
+    `focused` is the window we saw gain focus (None when unknown) and
+    `obscured` is True unless the keyboard is known to be fully visible.
+    Both start unknown, so the first key always activates and raises.
+    """
+
+    def __init__(self):
+        self.focused = None
+        self.obscured = True
+        self.activations = 0
+        self.activations_avoided = 0
+        self.raises = 0
+        self.raises_avoided = 0
+
+    def needs_activation(self, window):
+        """False (and counted as avoided) when window already has focus"""
+        if self.focused is not None and self.focused == int(window):
+            self.activations_avoided += 1
+            return False
+        self.activations += 1
+        return True
+
+    def needs_raise(self):
+        """False (and counted as avoided) when nothing is stacked over the keyboard"""
+        if not self.obscured:
+            self.raises_avoided += 1
+            return False
+        self.raises += 1
+        self.obscured = False
+        return True
+
+    def focus_in(self, window):
+        self.focused = window
+
+    def focus_lost(self, window):
+        if self.focused == window:
+            self.focused = None
+
+    def forget(self):
+        """Back to unknown, when nothing is watching X events any more"""
+        self.focused = None
+        self.obscured = True
+
+    def stats(self):
+        return {
+            'activations': self.activations,
+            'activations_avoided': self.activations_avoided,
+            'raises': self.raises,
+            'raises_avoided': self.raises_avoided,
+        }
+
+
+class ActiveWindowTracker:
+    """Follows _NET_ACTIVE_WINDOW on a background thread, ignoring our own windows"""
+
+    # Events selected on the active window to keep the FocusCache valid
+    WATCH_MASK = FOCUS_CHANGE_MASK | STRUCTURE_NOTIFY_MASK
+
+    def __init__(self, on_change, exclude=(), focus=None, display_name=None):
+        self.conn = XConnection(display_name)
+        self.exclude = {int(w) for w in exclude}
+        # Called as on_change(window, name) whenever the external active window changes
+        self.on_change = on_change
+        self.focus = focus if focus is not None else FocusCache()
+        self.current = None
+        self.current_name = ''
+        self.events = 0
+        self.changes = 0
+        self._watched = None
+
+        self._active_atom = self.conn.atom('_NET_ACTIVE_WINDOW')
+        self._wake_r, self._wake_w = os.pipe()
+        self.conn.xlib.XSelectInput(self.conn.display, self.conn.root_window, PROPERTY_CHANGE_MASK)
+        self.conn.xlib.XFlush(self.conn.display)
+
+        # Pick up whatever is active right now before waiting for changes
+        self._refresh()
+        self._thread = threading.Thread(target=self._run, name='active-window-tracker', daemon=True)
+        self._thread.start()
+
+    def _watch(self, window):
+        """Move our focus/structure subscription to the newly active window"""
+        if window == self._watched:
+            return
+        xlib = self.conn.xlib
+        if self._watched:
+            xlib.XSelectInput(self.conn.display, self._watched, 0)
+        if window:
+            xlib.XSelectInput(self.conn.display, window, self.WATCH_MASK)
+        xlib.XFlush(self.conn.display)
+        self._watched = window
+
+    def _refresh(self):
+        window = self.conn.get_active_window()
+        # The focus cache follows the real active window, even if it is ours
+        self.focus.focus_in(window)
+        self._watch(window)
+        if not window or window in self.exclude or window == self.current:
+            return
+        self.current = window
+        self.current_name = self.conn.window_name(window)
+        self.changes += 1
+        self.on_change(window, self.current_name)
+
+    def _handle(self, event):
+        kind = event.type
+        if kind == PROPERTY_NOTIFY:
+            if event.xproperty.atom == self._active_atom:
+                self._refresh()
+        elif kind == FOCUS_IN:
+            self.focus.focus_in(event.xfocus.window)
+        elif kind == FOCUS_OUT:
+            # Focus moving into a child of the window keeps it focused
+            if event.xfocus.detail != NOTIFY_INFERIOR:
+                self.focus.focus_lost(event.xfocus.window)
+        elif kind in (UNMAP_NOTIFY, DESTROY_NOTIFY):
+            self.focus.focus_lost(event.xany.window)
+        elif kind == CONFIGURE_NOTIFY:
+            # The target moved or was restacked and may now cover the keyboard
+            self.focus.obscured = True
+
+    def _run(self):
+        xlib = self.conn.xlib
+        display = self.conn.display
+        fd = self.conn.fileno()
+        event = XEvent()
+        try:
+            while True:
+                # Drain everything Xlib already buffered before sleeping in select()
+                while xlib.XPending(display):
+                    xlib.XNextEvent(display, ctypes.byref(event))
+                    self.events += 1
+                    self._handle(event)
+                ready, _, _ = select.select([fd, self._wake_r], [], [])
+                if self._wake_r in ready:
+                    break
+        finally:
+            self.conn.close()
+            os.close(self._wake_r)
+
+    def stop(self, timeout=1.0):
+        """Stop the tracker thread and close its X connection"""
+        try:
+            os.write(self._wake_w, b'x')
+        except OSError:
+            return
+        self._thread.join(timeout)
+        os.close(self._wake_w)
@@ -0,0 +1,342 @@
+#!/usr/bin/env python3
+"""
+Minimal ctypes bindings to libX11 for the Floating On-Screen Keyboard.
+
+Only what the XTest injection backend and the active-window tracker need:
+a display connection, atoms, window properties, a few event types and the
+last X error seen on each of our connections.
+Each XConnection is owned by exactly one thread at a time (the dispatcher
+worker or the tracker), so no Xlib-level locking is required.
+"""
+
+import ctypes
+import ctypes.util
+
+
+class XError(Exception):
+    """Raised when libX11 is missing or the display cannot be opened"""
+
+
+# Event types and masks
+KEY_PRESS = 2
+KEY_RELEASE = 3
+FOCUS_IN = 9
+FOCUS_OUT = 10
+DESTROY_NOTIFY = 17
+UNMAP_NOTIFY = 18
+CONFIGURE_NOTIFY = 22
+PROPERTY_NOTIFY = 28
+CLIENT_MESSAGE = 33
+MAPPING_NOTIFY = 34
+KEY_PRESS_MASK = 1 << 0
+KEY_RELEASE_MASK = 1 << 1
+STRUCTURE_NOTIFY_MASK = 1 << 17
+SUBSTRUCTURE_NOTIFY_MASK = 1 << 19
+SUBSTRUCTURE_REDIRECT_MASK = 1 << 20
+FOCUS_CHANGE_MASK = 1 << 21
+PROPERTY_CHANGE_MASK = 1 << 22
+
+# Caps Lock bit of a key/pointer state mask
+LOCK_MASK = 1 << 1
+
+# FocusIn/FocusOut detail: focus moved between a window and its descendants
+NOTIFY_INFERIOR = 2
+
+# MappingNotify request: the keysyms bound to keycodes changed
+MAPPING_KEYBOARD = 1
+
+CURRENT_TIME = 0
+ANY_PROPERTY_TYPE = 0
+
+
+class XAnyEvent(ctypes.Structure):
+    # For StructureNotify events `window` is the watched (event) window
+    _fields_ = [
+        ('type', ctypes.c_int),
+        ('serial', ctypes.c_ulong),
+        ('send_event', ctypes.c_int),
+        ('display', ctypes.c_void_p),
+        ('window', ctypes.c_ulong),
+    ]
+
+
+class XKeyEvent(ctypes.Structure):
+    _fields_ = [
+        ('type', ctypes.c_int),
+        ('serial', ctypes.c_ulong),
+        ('send_event', ctypes.c_int),
+        ('display', ctypes.c_void_p),
+        ('window', ctypes.c_ulong),
+        ('root', ctypes.c_ulong),
+        ('subwindow', ctypes.c_ulong),
+        ('time', ctypes.c_ulong),
+        ('x', ctypes.c_int),
+        ('y', ctypes.c_int),
+        ('x_root', ctypes.c_int),
+        ('y_root', ctypes.c_int),
+        ('state', ctypes.c_uint),
+        ('keycode', ctypes.c_uint),
+        ('same_screen', ctypes.c_int),
+    ]
+
+
+class XFocusChangeEvent(ctypes.Structure):
+    _fields_ = [
+        ('type', ctypes.c_int),
+        ('serial', ctypes.c_ulong),
+        ('send_event', ctypes.c_int),
+        ('display', ctypes.c_void_p),
+        ('window', ctypes.c_ulong),
+        ('mode', ctypes.c_int),
+        ('detail', ctypes.c_int),
+    ]
+
+
+class XClientMessageEvent(ctypes.Structure):
+    _fields_ = [
+        ('type', ctypes.c_int),
+        ('serial', ctypes.c_ulong),
+        ('send_event', ctypes.c_int),
+        ('display', ctypes.c_void_p),
+        ('window', ctypes.c_ulong),
+        ('message_type', ctypes.c_ulong),
+        ('format', ctypes.c_int),
+        ('data', ctypes.c_long * 5),
+    ]
+
+
+class XPropertyEvent(ctypes.Structure):
+    _fields_ = [
+        ('type', ctypes.c_int),
+        ('serial', ctypes.c_ulong),
+        ('send_event', ctypes.c_int),
+        ('display', ctypes.c_void_p),
+        ('window', ctypes.c_ulong),
+        ('atom', ctypes.c_ulong),
+        ('time', ctypes.c_ulong),
+        ('state', ctypes.c_int),
+    ]
+
+
+class XMappingEvent(ctypes.Structure):
+    _fields_ = [
+        ('type', ctypes.c_int),
+        ('serial', ctypes.c_ulong),
+        ('send_event', ctypes.c_int),
+        ('display', ctypes.c_void_p),
+        ('window', ctypes.c_ulong),
+        ('request', ctypes.c_int),
+        ('first_keycode', ctypes.c_int),
+        ('count', ctypes.c_int),
+    ]
+
+
+class XEvent(ctypes.Union):
+    _fields_ = [
+        ('type', ctypes.c_int),
+        ('xany', XAnyEvent),
+        ('xkey', XKeyEvent),
+        ('xfocus', XFocusChangeEvent),
+        ('xclient', XClientMessageEvent),
+        ('xproperty', XPropertyEvent),
+        ('xmapping', XMappingEvent),
+        ('pad', ctypes.c_long * 24),
+    ]
+
+
+_xlib = None
+
+
+def load_x11():
+    """Load libX11 once and declare the functions we call"""
+    global _xlib
+    if _xlib is not None:
+        return _xlib
+    path = ctypes.util.find_library('X11')
+    if not path:
+        raise XError("libX11 not found")
+    xlib = ctypes.cdll.LoadLibrary(path)
+
+    dpy = ctypes.c_void_p
+    ulong = ctypes.c_ulong
+
+    xlib.XOpenDisplay.argtypes = [ctypes.c_char_p]
+    xlib.XOpenDisplay.restype = dpy
+    xlib.XCloseDisplay.argtypes = [dpy]
+    xlib.XConnectionNumber.argtypes = [dpy]
+    xlib.XDefaultRootWindow.argtypes = [dpy]
+    xlib.XDefaultRootWindow.restype = ulong
+    xlib.XInternAtom.argtypes = [dpy, ctypes.c_char_p, ctypes.c_int]
+    xlib.XInternAtom.restype = ulong
+    xlib.XStringToKeysym.argtypes = [ctypes.c_char_p]
+    xlib.XStringToKeysym.restype = ulong
+    xlib.XKeysymToKeycode.argtypes = [dpy, ulong]
+    xlib.XKeysymToKeycode.restype = ctypes.c_ubyte
+    xlib.XkbKeycodeToKeysym.argtypes = [dpy, ctypes.c_ubyte, ctypes.c_int, ctypes.c_int]
+    xlib.XkbKeycodeToKeysym.restype = ulong
+    xlib.XDisplayKeycodes.argtypes = [dpy, ctypes.POINTER(ctypes.c_int), ctypes.POINTER(ctypes.c_int)]
+    xlib.XGetKeyboardMapping.argtypes = [dpy, ctypes.c_ubyte, ctypes.c_int, ctypes.POINTER(ctypes.c_int)]
+    xlib.XGetKeyboardMapping.restype = ctypes.POINTER(ulong)
+    xlib.XChangeKeyboardMapping.argtypes = [dpy, ctypes.c_int, ctypes.c_int, ctypes.POINTER(ulong), ctypes.c_int]
+    xlib.XSendEvent.argtypes = [dpy, ulong, ctypes.c_int, ctypes.c_long, ctypes.POINTER(XEvent)]
+    xlib.XSetInputFocus.argtypes = [dpy, ulong, ctypes.c_int, ulong]
+    xlib.XSelectInput.argtypes = [dpy, ulong, ctypes.c_long]
+    xlib.XPending.argtypes = [dpy]
+    xlib.XNextEvent.argtypes = [dpy, ctypes.POINTER(XEvent)]
+    xlib.XRefreshKeyboardMapping.argtypes = [ctypes.POINTER(XMappingEvent)]
+    xlib.XGetWindowProperty.argtypes = [
+        dpy, ulong, ulong, ctypes.c_long, ctypes.c_long, ctypes.c_int, ulong,
+        ctypes.POINTER(ulong), ctypes.POINTER(ctypes.c_int), ctypes.POINTER(ulong),
+        ctypes.POINTER(ulong), ctypes.POINTER(ctypes.c_void_p)]
+    xlib.XQueryPointer.argtypes = [dpy, ulong, ctypes.POINTER(ulong), ctypes.POINTER(ulong)] + \
+        [ctypes.POINTER(ctypes.c_int)] * 4 + [ctypes.POINTER(ctypes.c_uint)]
+    xlib.XFree.argtypes = [ctypes.c_void_p]
+    xlib.XFlush.argtypes = [dpy]
+    xlib.XSync.argtypes = [dpy, ctypes.c_int]
+    xlib.XSetErrorHandler.argtypes = [_ERROR_HANDLER]
+    xlib.XSetErrorHandler.restype = _ERROR_HANDLER
+
+    # Errors on windows that vanished mid-request (BadWindow) must not kill the
+    # process. Errors on displays we don't own (Tk's) go to the previous handler.
+    global _previous_handler
+    _previous_handler = xlib.XSetErrorHandler(_error_handler)
+    _xlib = xlib
+    return xlib
+
+
+class XErrorEvent(ctypes.Structure):
+    _fields_ = [
+        ('type', ctypes.c_int),
+        ('display', ctypes.c_void_p),
+        ('resourceid', ctypes.c_ulong),
+        ('serial', ctypes.c_ulong),
+        ('error_code', ctypes.c_ubyte),
+        ('request_code', ctypes.c_ubyte),
+        ('minor_code', ctypes.c_ubyte),
+    ]
+
+
+# X error code for a window id that no longer exists
+BAD_WINDOW = 3
+
+_ERROR_HANDLER = ctypes.CFUNCTYPE(ctypes.c_int, ctypes.c_void_p, ctypes.c_void_p)
+_previous_handler = None
+_our_displays = set()
+# Last error code per display of ours, collected with XConnection.take_error()
+_last_errors = {}
+
+
+@_ERROR_HANDLER
+def _error_handler(display, error_event):
+    if display in _our_displays:
+        _last_errors[display] = ctypes.cast(error_event, ctypes.POINTER(XErrorEvent))[0].error_code
+        return 0
+    if not _previous_handler:
+        return 0
+    return _previous_handler(display, error_event)
+
+
+class XConnection:
+    """One open X display connection with property helpers"""
+
+    def __init__(self, display_name=None):
+        self.xlib = load_x11()
+        name = display_name.encode() if display_name else None
+        self.display = self.xlib.XOpenDisplay(name)
+        if not self.display:
+            raise XError("Cannot open X display")
+        _our_displays.add(self.display)
+        self.root_window = self.xlib.XDefaultRootWindow(self.display)
+        self._atoms = {}
+
+    def atom(self, name):
+        value = self._atoms.get(name)
+        if value is None:
+            value = self.xlib.XInternAtom(self.display, name.encode(), False)
+            self._atoms[name] = value
+        return value
+
+    def _get_property(self, window, atom):
+        """Raw property read, returns (format, nitems, pointer) - caller frees the pointer"""
+        actual_type = ctypes.c_ulong()
+        actual_format = ctypes.c_int()
+        nitems = ctypes.c_ulong()
+        bytes_after = ctypes.c_ulong()
+        prop = ctypes.c_void_p()
+        status = self.xlib.XGetWindowProperty(
+            self.display, window, atom, 0, 1024, False, ANY_PROPERTY_TYPE,
+            ctypes.byref(actual_type), ctypes.byref(actual_format), ctypes.byref(nitems),
+            ctypes.byref(bytes_after), ctypes.byref(prop))
+        if status != 0 or not prop.value:
+            return 0, 0, None
+        return actual_format.value, nitems.value, prop
+
+    def get_window_property(self, window, atom):
+        """Return a format-32 window property as a list of ints"""
+        fmt, nitems, prop = self._get_property(window, atom)
+        if prop is None:
+            return []
+        try:
+            if fmt != 32:
+                return []
+            values = ctypes.cast(prop, ctypes.POINTER(ctypes.c_ulong))
+            return [values[i] for i in range(nitems)]
+        finally:
+            self.xlib.XFree(prop)
+
+    def get_window_text(self, window, atom):
+        """Return a format-8 (string) window property, '' if unset"""
+        fmt, nitems, prop = self._get_property(window, atom)
+        if prop is None:
+            return ''
+        try:
+            if fmt != 8:
+                return ''
+            return ctypes.string_at(prop, nitems).decode('utf-8', 'replace')
+        finally:
+            self.xlib.XFree(prop)
+
+    def window_name(self, window):
+        """Title of a window (_NET_WM_NAME, falling back to WM_NAME)"""
+        return (self.get_window_text(window, self.atom('_NET_WM_NAME'))
+                or self.get_window_text(window, self.atom('WM_NAME')))
+
+    def get_active_window(self):
+        """Window id the window manager reports as active, or None"""
+        values = self.get_window_property(self.root_window, self.atom('_NET_ACTIVE_WINDOW'))
+        return values[0] if values and values[0] else None
+
+    def wm_supports(self, atom_name):
+        """Check whether the window manager lists an atom in _NET_SUPPORTED"""
+        return self.atom(atom_name) in self.get_window_property(self.root_window,
+                                                                self.atom('_NET_SUPPORTED'))
+
+    def modifier_state(self):
+        """Modifier and lock bits currently set on the server (e.g. LOCK_MASK)"""
+        windows = [ctypes.c_ulong() for _ in range(2)]
+        coords = [ctypes.c_int() for _ in range(4)]
+        mask = ctypes.c_uint()
+        self.xlib.XQueryPointer(self.display, self.root_window,
+                                *[ctypes.byref(v) for v in windows + coords], ctypes.byref(mask))
+        return mask.value
+
+    def take_error(self):
+        """Error code of the last failed request on this connection (then cleared), or None"""
+        return _last_errors.pop(self.display, None)
+
+    def window_exists(self, window):
+        """False once window has been destroyed"""
+        self.take_error()
+        self.get_window_text(window, self.atom('WM_NAME'))
+        self.xlib.XSync(self.display, False)
+        return self.take_error() != BAD_WINDOW
+
+    def fileno(self):
+        return self.xlib.XConnectionNumber(self.display)
+
+    def close(self):
+        if self.display:
+            self.xlib.XCloseDisplay(self.display)
+            _our_displays.discard(self.display)
+            _last_errors.pop(self.display, None)
+            self.display = None